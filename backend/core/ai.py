@@ -4,9 +4,9 @@ import traceback
 import configparser
 import re
 import json
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from dotenv import load_dotenv
+from backend.core.lazy import LazySingleton
+from backend.core.state import state_store
 
 load_dotenv()
 
@@ -109,6 +109,10 @@ def load_persona():
     13. **set_home_city** - Set home city
         Format: [TOOL:set_home_city|city=...|confirm=False]
         
+    14. **memory_search** - Search long-term memory (uploaded files, past conversations)
+        Format: [TOOL:memory_search|query=...|source=...|kind=...|start_date=...|end_date=...]
+        *Only query is required. kind is conversation, document or plan; dates are YYYY-MM-DD*
+        
     **PERSONA DESCRIPTION:**
     You are MIMIR, the embodiment of wisdom and knowledge from Norse mythology, integrated into a modern artificial intelligence system. You speak with a deep, powerful, authoritative, yet helpful tone. You are a god, but you serve the household.
     
@@ -125,29 +129,38 @@ def load_persona():
 # System Instructions for MIMIR
 MIMIR_SYSTEM_INSTRUCTION = load_persona()
 
+HISTORY_NAMESPACE = "chat_history"
+HISTORY_TTL_SECONDS = 7 * 24 * 3600 # Idle histories are dropped after a week
+
 class MimirAI:
     def __init__(self):
         print(f"Initializing MIMIR AI with API key: {GOOGLE_API_KEY[:10]}..." if GOOGLE_API_KEY else "No API key found!")
+        from langchain_google_genai import ChatGoogleGenerativeAI
         self.llm = ChatGoogleGenerativeAI(
             model="gemini-2.5-pro",
             google_api_key=GOOGLE_API_KEY,
             temperature=0.7, # Lower temperature for more deterministic tool usage
         )
-        # Dictionary to store history per user: {user_id: [messages]}
-        self.user_histories = {}
         print("[MIMIR] Initialized with Gemini 2.5 Pro")
         # print(f"[MIMIR] System Instruction Preview: {MIMIR_SYSTEM_INSTRUCTION[:100]}...")
 
     def get_history(self, user_id: str) -> list:
         """Get or initialize history for a specific user"""
-        if user_id not in self.user_histories:
-            self.user_histories[user_id] = [SystemMessage(content=MIMIR_SYSTEM_INSTRUCTION)]
-        return self.user_histories[user_id]
+        from langchain_core.messages import SystemMessage, messages_from_dict
+        stored = state_store.get(HISTORY_NAMESPACE, user_id)
+        if stored is None:
+            return [SystemMessage(content=MIMIR_SYSTEM_INSTRUCTION)]
+        return messages_from_dict(stored)
+
+    def save_history(self, user_id: str, history: list):
+        """Persist a user's history after it has been modified"""
+        from langchain_core.messages import messages_to_dict
+        state_store.set(HISTORY_NAMESPACE, user_id, messages_to_dict(history), ttl=HISTORY_TTL_SECONDS)
 
     def clear_history(self, user_id: str):
         """Clear history for a specific user"""
-        if user_id in self.user_histories:
-            self.user_histories[user_id] = [SystemMessage(content=MIMIR_SYSTEM_INSTRUCTION)]
+        from langchain_core.messages import SystemMessage
+        self.save_history(user_id, [SystemMessage(content=MIMIR_SYSTEM_INSTRUCTION)])
 
     def detect_tool_calls(self, text: str) -> list:
         """Check if response contains tool call markers and return all matches"""
@@ -235,6 +248,19 @@ class MimirAI:
                  results = daily_journal.search_entries(user_id, query)
                  return {"results": results}
 
+            elif tool_name == "memory_search":
+                 from backend.core.tools import memory_search
+                 return memory_search(
+                     params.get("query", ""),
+                     source=params.get("source"),
+                     type=params.get("type"),
+                     kind=params.get("kind"),
+                     start_date=params.get("start_date"),
+                     end_date=params.get("end_date"),
+                     k=params.get("k", 5),
+                     user_id=user_id,
+                 )
+
             elif tool_name == "journal_read":
                  from backend.core.daily_journal import daily_journal
                  date = params.get("date")
@@ -250,6 +276,8 @@ class MimirAI:
             return {"error": str(e)}
 
     async def generate_response_stream(self, user_input: str, context: str = "", personality_intensity: int = 75, user_id: str = "Matt Burchett", google_token: str = None):
+        from langchain_core.messages import HumanMessage, AIMessage
+
         if personality_intensity <= 25:
             personality_modifier = "\n\nIMPORTANT: Respond in a subtle, professional tone. Minimize Norse references and macho attitude. Be helpful and direct."
         elif personality_intensity <= 50:
@@ -346,7 +374,8 @@ class MimirAI:
             "journal_search": "Searching the annals...",
             "journal_read": "Reading from the chronicles...",
             "record_preference": "Noting your preference...",
-            "set_home_city": "Marking your home on the map..."
+            "set_home_city": "Marking your home on the map...",
+            "memory_search": "Drawing from the well of memory..."
         }
 
         try:
@@ -508,5 +537,8 @@ class MimirAI:
             print(f"[ERROR] Error generating response: {type(e).__name__}: {e}")
             traceback.print_exc()
             yield {"type": "error", "content": "The threads of fate are tangled. I cannot speak right now."}
+        finally:
+            # History was modified locally during the turn; write it back once
+            self.save_history(user_id, history)
 
-mimir_ai = MimirAI()
+mimir_ai = LazySingleton(MimirAI)
@@ -0,0 +1,64 @@
+import os
+import time
+import threading
+from dotenv import load_dotenv
+from backend.core.lazy import LazySingleton
+
+load_dotenv()
+
+GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+CERTS_CACHE_SECONDS = 3600 # Google rotates signing keys daily; an hour is well inside that
+
+
+class CachingAuthRequest:
+    """
+    google.auth transport used for ID token verification.
+
+    Reuses one HTTP session (keep-alive instead of a new TLS handshake per request)
+    and caches the public signing certificates, which google-auth would otherwise
+    download again on every token check.
+    """
+
+    def __init__(self):
+        from google.auth.transport import requests as google_requests
+        self._request = google_requests.Request()
+        self._certs_response = None
+        self._certs_fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+        if method != "GET" or url != GOOGLE_CERTS_URL:
+            return self._request(url, method=method, body=body, headers=headers, timeout=timeout, **kwargs)
+
+        with self._lock:
+            if self._certs_response is None or time.time() - self._certs_fetched_at > CERTS_CACHE_SECONDS:
+                response = self._request(url, method=method, body=body, headers=headers, timeout=timeout, **kwargs)
+                if response.status != 200:
+                    return response
+                self._certs_response = response
+                self._certs_fetched_at = time.time()
+            return self._certs_response
+
+    def warm(self):
+        """Opens the session and fetches the signing certificates ahead of the first login."""
+        with self._lock:
+            self._certs_response = None
+        response = self(GOOGLE_CERTS_URL)
+        if response.status != 200:
+            raise RuntimeError(f"Fetching Google certs returned HTTP {response.status}")
+
+
+auth_request = LazySingleton(CachingAuthRequest)
+
+
+async def verify_google_token(token: str):
+    from google.oauth2 import id_token
+
+    try:
+        # Specify the CLIENT_ID of the app that accesses the backend:
+        id_info = id_token.verify_oauth2_token(token, auth_request, GOOGLE_CLIENT_ID)
+        return id_info
+    except ValueError as e:
+        print(f"Token verification error: {e}")
+        return None
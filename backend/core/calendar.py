@@ -4,7 +4,7 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import uuid
 import threading
-from backend.core.google_calendar import GoogleCalendarService
+from backend.core.state import state_store
 
 def log_debug(message):
     pass
@@ -12,9 +12,6 @@ def log_debug(message):
 MIMIR_DATA_DIR = os.getenv("MIMIR_DATA_DIR", ".")
 CALENDAR_DIR = os.path.join(MIMIR_DATA_DIR, "calendars")
 
-# Global locks for user calendars to prevent race conditions
-_user_locks: Dict[str, threading.Lock] = {}
-
 class CalendarManager:
     def __init__(self, user_id: str = "Matt Burchett", google_token: str = None):
         self.user_id = user_id
@@ -26,6 +23,7 @@ class CalendarManager:
         if google_token:
             try:
                 print(f"[CALENDAR] Initializing with Google Token: {google_token[:10]}...")
+                from backend.core.google_calendar import GoogleCalendarService
                 self.google_service = GoogleCalendarService(google_token)
             except Exception as e:
                 print(f"[CALENDAR] Failed to initialize Google Service: {e}")
@@ -34,11 +32,9 @@ class CalendarManager:
         else:
             print("[CALENDAR] Initialized WITHOUT Google Token (Local Only)")
 
-    def _get_lock(self) -> threading.Lock:
-        """Get the lock for the current user"""
-        if self.user_id not in _user_locks:
-            _user_locks[self.user_id] = threading.Lock()
-        return _user_locks[self.user_id]
+    def _get_lock(self):
+        """Get the lock for the current user (shared across workers to prevent race conditions)"""
+        return state_store.lock(f"calendar:{self.user_id}")
     
     def _load_events(self) -> List[Dict]:
         """Load events from user's JSON file with error handling"""
@@ -0,0 +1,186 @@
+import os
+import re
+import csv
+import io
+import threading
+from typing import Dict, List, Optional, Tuple
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+# Chat turns and summaries are stored whole unless they are longer than this
+MAX_UNIT_CHARS = 6000
+# Spreadsheet blocks never hold more rows than this, however short the rows are
+MAX_BLOCK_ROWS = 50
+
+# Extracted documents mark their structure in plain text, so it survives the write-behind
+# buffer: pages and sheets are separated by a form feed, headings are markdown "#" lines
+PAGE_BREAK = "\f"
+SHEET_PREFIX = "Sheet: "
+
+# Chunk types that are one unit of meaning each
+UNIT_TYPES = {"conversation", "daily_plan", "summary"}
+EXTENSION_FORMATS = {
+    ".pdf": "pdf",
+    ".docx": "docx", ".doc": "docx", ".md": "docx", ".markdown": "docx",
+    ".xlsx": "spreadsheet", ".xls": "spreadsheet", ".csv": "csv",
+}
+
+HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$", re.MULTILINE)
+
+Chunk = Tuple[str, Dict]
+
+
+def source_format(metadata: dict) -> str:
+    """Which chunker applies: "unit", "pdf", "docx", "spreadsheet", "csv" or "text"."""
+    metadata = metadata or {}
+    if metadata.get("type") in UNIT_TYPES:
+        return "unit"
+    extension = os.path.splitext(str(metadata.get("source", "")))[1].lower()
+    return EXTENSION_FORMATS.get(extension, "text")
+
+
+class Chunker:
+    """
+    Splits a memory into chunks according to what it is.
+
+      unit         chat turns, daily plans, summaries: one chunk (split only if huge)
+      pdf          one chunk per page (form-feed separated), long pages split further
+      docx         one chunk per heading section, with the heading path as a prefix
+      spreadsheet  per sheet, blocks of rows with the sheet's header row repeated
+      csv          like a single-sheet spreadsheet
+      text         recursive character splitting (the old behaviour for everything)
+
+    Returns (text, extra metadata) pairs; the extras (page, section, sheet, rows)
+    are merged into the chunk's metadata. The character splitter is built once and
+    shared; chunkers are stateless, so one instance serves every thread.
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self._splitter = None
+        self._splitter_lock = threading.Lock()
+
+    @property
+    def splitter(self):
+        if self._splitter is None:
+            with self._splitter_lock:
+                if self._splitter is None:
+                    from langchain_text_splitters import RecursiveCharacterTextSplitter
+                    self._splitter = RecursiveCharacterTextSplitter(
+                        chunk_size=self.chunk_size,
+                        chunk_overlap=self.chunk_overlap,
+                        length_function=len,
+                        is_separator_regex=False,
+                    )
+        return self._splitter
+
+    def split(self, text: str, metadata: dict = None) -> List[Chunk]:
+        kind = source_format(metadata)
+        splitter = getattr(self, f"_split_{kind}", self._split_text)
+        chunks = [(t, extra) for t, extra in splitter(text) if t.strip()]
+        return chunks or self._split_text(text)
+
+    def _split_text(self, text: str, prefix: str = "") -> List[Chunk]:
+        if not text.strip():
+            return []
+        if not prefix:
+            return [(t, {}) for t in self.splitter.split_text(text)]
+        return [(prefix + t, {}) for t in self.splitter.split_text(text)]
+
+    def _split_unit(self, text: str) -> List[Chunk]:
+        text = text.strip()
+        if len(text) <= MAX_UNIT_CHARS:
+            return [(text, {})]
+        return self._split_text(text)
+
+    def _split_pdf(self, text: str) -> List[Chunk]:
+        pages = text.split(PAGE_BREAK)
+        if len(pages) == 1:
+            return self._split_text(text)
+        chunks = []
+        for number, page in enumerate(pages, start=1):
+            page = page.strip()
+            if not page:
+                continue
+            if len(page) <= self.chunk_size * 1.5:
+                chunks.append((page, {"page": number}))
+            else:
+                chunks.extend((t, {"page": number}) for t, _ in self._split_text(page))
+        return chunks
+
+    def _split_docx(self, text: str) -> List[Chunk]:
+        headings = list(HEADING.finditer(text))
+        if not headings:
+            return self._split_text(text)
+        chunks = []
+        path: List[Tuple[int, str]] = [] # (level, title) of the enclosing headings
+        preamble = text[:headings[0].start()].strip()
+        if preamble:
+            chunks.extend(self._split_text(preamble))
+        for i, match in enumerate(headings):
+            level, title = len(match.group(1)), match.group(2).strip()
+            path = [(l, t) for l, t in path if l < level] + [(level, title)]
+            end = headings[i + 1].start() if i + 1 < len(headings) else len(text)
+            body = text[match.end():end].strip()
+            if not body:
+                continue # Heading immediately followed by a sub-heading: carried in the path
+            section = " > ".join(t for _, t in path)
+            prefix = f"{section}\n"
+            if len(prefix) + len(body) <= self.chunk_size * 1.5:
+                chunks.append((prefix + body, {"section": section}))
+            else:
+                chunks.extend((t, {"section": section}) for t, _ in self._split_text(body, prefix))
+        return chunks
+
+    def _row_blocks(self, sheet: str, header: Optional[str], rows: List[Tuple[int, str]]) -> List[Chunk]:
+        """Groups (row number, row text) into blocks of about chunk_size characters, each with the header."""
+        chunks, block = [], []
+        budget = self.chunk_size - len(header or "")
+
+        def emit():
+            first, last = block[0][0], block[-1][0]
+            label = f"{SHEET_PREFIX}{sheet} (rows {first}-{last})" if sheet else f"Rows {first}-{last}"
+            lines = [label] + ([header] if header else []) + [r for _, r in block]
+            chunks.append(("\n".join(lines), {"sheet": sheet, "rows": f"{first}-{last}"} if sheet else {"rows": f"{first}-{last}"}))
+
+        size = 0
+        for number, row in rows:
+            if block and (size + len(row) > budget or len(block) >= MAX_BLOCK_ROWS):
+                emit()
+                block, size = [], 0
+            block.append((number, row))
+            size += len(row) + 1
+        if block:
+            emit()
+        return chunks
+
+    @staticmethod
+    def _is_blank_row(row: str) -> bool:
+        return not row.replace("|", "").strip()
+
+    def _split_spreadsheet(self, text: str) -> List[Chunk]:
+        chunks = []
+        for part in re.split(r"\f|\n(?=" + re.escape(SHEET_PREFIX) + ")", text):
+            lines = part.strip("\n").split("\n")
+            sheet = ""
+            if lines and lines[0].startswith(SHEET_PREFIX):
+                sheet = lines.pop(0)[len(SHEET_PREFIX):].strip()
+            rows = [(n, line.strip()) for n, line in enumerate(lines, start=1) if not self._is_blank_row(line)]
+            if not rows:
+                continue
+            # The first non-empty row is taken as the header and repeated in every block
+            header = rows[0][1]
+            chunks.extend(self._row_blocks(sheet, header, rows[1:]) if len(rows) > 1 else [(header, {"sheet": sheet})])
+        return chunks
+
+    def _split_csv(self, text: str) -> List[Chunk]:
+        try:
+            records = list(csv.reader(io.StringIO(text)))
+        except csv.Error:
+            return self._split_text(text)
+        rows = [(n, " | ".join(cell.strip() for cell in record)) for n, record in enumerate(records, start=1)]
+        rows = [(n, r) for n, r in rows if not self._is_blank_row(r)]
+        if len(rows) < 2:
+            return self._split_text(text)
+        return self._row_blocks("", rows[0][1], rows[1:])
@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from backend.core.local_disk import sqlite_journal_mode
+
+# Collection metadata key recording that the collection holds reduced vectors, e.g. "pca192"
+COMPRESSION_KEY = "compression"
+# PCA is fitted on at most this many of the user's vectors
+MAX_FIT_ROWS = 20000
+
+
+class Projection:
+    """PCA projection: x -> (x - mean) @ components.T, keeping Euclidean distances in the top subspace."""
+
+    def __init__(self, mean, components):
+        import numpy as np
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+
+    @property
+    def dims(self) -> int:
+        return int(self.components.shape[0])
+
+    @property
+    def label(self) -> str:
+        return f"pca{self.dims}"
+
+    def project(self, vectors):
+        import numpy as np
+        return (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T
+
+    def explained(self, vectors) -> float:
+        """Fraction of the variance of `vectors` kept by the projection."""
+        import numpy as np
+        centered = np.asarray(vectors, dtype=np.float32) - self.mean
+        total = float((centered ** 2).sum())
+        return float((self.project(vectors) ** 2).sum()) / total if total else 1.0
+
+
+def fit_pca(vectors, dims: int, seed: int = 0) -> Projection:
+    import numpy as np
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) > MAX_FIT_ROWS:
+        vectors = vectors[np.random.default_rng(seed).choice(len(vectors), MAX_FIT_ROWS, replace=False)]
+    if dims >= vectors.shape[1] or dims > len(vectors):
+        raise ValueError(f"Can't reduce {len(vectors)} vectors of {vectors.shape[1]} dimensions to {dims}")
+    mean = vectors.mean(axis=0)
+    _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+    return Projection(mean, vt[:dims])
+
+
+def quantize(vectors):
+    """Symmetric per-vector int8: returns (codes, scales) with vector ~= codes * scale."""
+    import numpy as np
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def dequantize(codes, scales):
+    import numpy as np
+    return codes.astype(np.float32) * np.asarray(scales, dtype=np.float32)[:, None]
+
+
+def cosine_scores(matrix, query):
+    import numpy as np
+    query = np.asarray(query, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+    norms[norms == 0] = 1.0
+    return (matrix @ query) / norms
+
+
+class VectorSidecar:
+    """
+    Full-dimension vectors of compressed users, int8-quantized, for rescoring.
+
+    When a user's collection holds PCA-reduced vectors (see compress_memory), Chroma
+    only finds candidates; this per-user SQLite file keeps each chunk's original vector
+    at a quarter of its float32 size, plus the projection itself. Recall re-ranks the
+    over-fetched candidates by exact cosine against these. Users whose collection isn't
+    compressed have no file and cost nothing.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._projections: Dict[str, Optional[Projection]] = {}
+
+    def _path(self, user_id: str) -> str:
+        safe_id = "".join([c for c in user_id if c.isalnum() or c in (' ', '_', '-')]).strip()
+        return os.path.join(self.directory, f"{safe_id}.sqlite3")
+
+    def _connect(self, user_id: str, create: bool = False) -> Optional[sqlite3.Connection]:
+        path = self._path(user_id)
+        if not create and not os.path.exists(path):
+            return None
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute(f"PRAGMA journal_mode={sqlite_journal_mode(path)}")
+        conn.execute("CREATE TABLE IF NOT EXISTS vectors (chunk_id TEXT PRIMARY KEY, scale REAL NOT NULL, codes BLOB NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS projection (id INTEGER PRIMARY KEY CHECK (id = 0), dims INTEGER, mean BLOB, components BLOB)")
+        return conn
+
+    def bind(self, user_id: str, collection_metadata: dict):
+        """Called when the user's store opens: loads their projection if the collection is compressed."""
+        projection = None
+        if (collection_metadata or {}).get(COMPRESSION_KEY):
+            projection = self.load_projection(user_id)
+            if projection is None:
+                print(f"[WARN] Memory for {user_id} is marked {collection_metadata[COMPRESSION_KEY]} but has no "
+                      f"projection file; recall will be poor until compress_memory --undo is run")
+        with self._lock:
+            self._projections[user_id] = projection
+
+    def projection(self, user_id: str) -> Optional[Projection]:
+        with self._lock:
+            return self._projections.get(user_id)
+
+    def load_projection(self, user_id: str) -> Optional[Projection]:
+        import numpy as np
+        conn = self._connect(user_id)
+        if conn is None:
+            return None
+        try:
+            row = conn.execute("SELECT dims, mean, components FROM projection WHERE id = 0").fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        mean = np.frombuffer(row[1], dtype=np.float32)
+        return Projection(mean, np.frombuffer(row[2], dtype=np.float32).reshape(row[0], len(mean)))
+
+    def save_projection(self, user_id: str, projection: Projection):
+        conn = self._connect(user_id, create=True)
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO projection (id, dims, mean, components) VALUES (0, ?, ?, ?)",
+                    (projection.dims, projection.mean.tobytes(), projection.components.tobytes()),
+                )
+        finally:
+            conn.close()
+
+    def put(self, user_id: str, ids: List[str], vectors):
+        codes, scales = quantize(vectors)
+        conn = self._connect(user_id, create=True)
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO vectors (chunk_id, scale, codes) VALUES (?, ?, ?)",
+                    [(i, float(s), c.tobytes()) for i, s, c in zip(ids, scales, codes)],
+                )
+        finally:
+            conn.close()
+
+    def get(self, user_id: str, ids: List[str]) -> Dict[str, "object"]:
+        """Dequantized float32 vectors by chunk ID (missing IDs are left out)."""
+        import numpy as np
+        conn = self._connect(user_id) if ids else None
+        if conn is None:
+            return {}
+        found = {}
+        try:
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT chunk_id, scale, codes FROM vectors WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for chunk_id, scale, codes in rows:
+                    found[chunk_id] = np.frombuffer(codes, dtype=np.int8).astype(np.float32) * scale
+        finally:
+            conn.close()
+        return found
+
+    def delete(self, user_id: str, ids: List[str]):
+        conn = self._connect(user_id)
+        if conn is None:
+            return
+        try:
+            with conn:
+                conn.executemany("DELETE FROM vectors WHERE chunk_id = ?", [(i,) for i in ids])
+        finally:
+            conn.close()
+
+    def drop(self, user_id: str):
+        with self._lock:
+            self._projections.pop(user_id, None)
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(self._path(user_id) + suffix)
+            except FileNotFoundError:
+                pass
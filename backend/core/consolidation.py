@@ -0,0 +1,259 @@
+import os
+import re
+import time
+import asyncio
+import datetime
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from backend.core.state import state_store
+
+WATERMARK_NAMESPACE = "memory_consolidation"
+CLAIM_NAMESPACE = "memory_consolidation_claims"
+
+# Chunk types that are folded into summaries; untyped chunks from before types were
+# recorded count as conversation when they look like a stored chat turn
+CONSOLIDATE_TYPES = {"conversation"}
+LEGACY_PREFIXES = ("User:", "MIMIR")
+
+
+class ExtractiveSummarizer:
+    """
+    Local stand-in summarizer: keeps the sentences whose words are most frequent across
+    the group, in their original order. No network calls, deterministic, good for tests
+    and for deployments without an LLM budget for housekeeping.
+    """
+
+    def __init__(self, max_sentences: int = 8):
+        self.max_sentences = max_sentences
+
+    def summarize(self, texts: List[str], label: str) -> str:
+        sentences = []
+        for text in texts:
+            for sentence in re.split(r"(?<=[.!?])\s+|\n+", text):
+                sentence = sentence.strip()
+                if len(sentence) > 20 and sentence not in sentences:
+                    sentences.append(sentence)
+        if not sentences:
+            return ""
+        frequency = Counter(w for s in sentences for w in re.findall(r"\w{4,}", s.lower()))
+
+        def score(sentence):
+            words = re.findall(r"\w{4,}", sentence.lower())
+            return sum(frequency[w] for w in words) / (len(words) or 1)
+
+        best = set(sorted(sentences, key=score, reverse=True)[:self.max_sentences])
+        return f"Summary of conversations ({label}):\n" + "\n".join(s for s in sentences if s in best)
+
+
+class GeminiSummarizer:
+    def __init__(self, model: str = "gemini-2.5-flash"):
+        self.model = model
+
+    def summarize(self, texts: List[str], label: str) -> str:
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        prompt = (
+            "Summarize these past conversations between the user and MIMIR into a compact set of facts "
+            "worth remembering: decisions, plans, preferences, names, dates and open questions. "
+            "Skip greetings and small talk. Use short bullet points.\n\n" + "\n\n---\n\n".join(texts)
+        )
+        response = genai.GenerativeModel(self.model).generate_content(prompt)
+        return f"Summary of conversations ({label}):\n{response.text.strip()}"
+
+
+def user_timezone(user_id: str) -> datetime.tzinfo:
+    """The user's profile timezone, else DEFAULT_TIMEZONE (as the daily journal uses), else UTC."""
+    from backend.core.user_manager import user_manager
+    try:
+        profile = user_manager.get_profile(user_id)
+        return ZoneInfo((profile and getattr(profile, "timezone", None)) or os.getenv("DEFAULT_TIMEZONE", "America/New_York"))
+    except Exception as e:
+        print(f"[CONSOLIDATION] No timezone for {user_id}, using UTC: {e}")
+        return datetime.timezone.utc
+
+
+def create_summarizer():
+    """MIMIR_CONSOLIDATION_SUMMARIZER: "gemini" (default) or "extractive" (local, no API calls)."""
+    kind = os.getenv("MIMIR_CONSOLIDATION_SUMMARIZER", "gemini").lower()
+    if kind == "extractive":
+        return ExtractiveSummarizer()
+    return GeminiSummarizer(os.getenv("MIMIR_CONSOLIDATION_MODEL", "gemini-2.5-flash"))
+
+
+class MemoryConsolidator:
+    """
+    Compacts old conversation chunks into summary chunks.
+
+    Each run looks at conversation chunks from whole days (in the user's timezone) that
+    ended at least `min_age_days` ago, groups them by day, summarizes every day with at
+    least `min_group` chunks (at most `max_group` per summary), stores the summary and
+    deletes the originals. Quieter days are left as they are. A per-user watermark
+    records how far everything has been processed, so later runs only read chunks
+    created since then; it stops at the first quiet day, which is looked at again
+    (and consolidated once it has enough chunks). The first run scans everything,
+    which also picks up legacy chunks without a timestamp.
+    """
+
+    def __init__(self, memory, summarizer=None, min_age_days: float = 7, min_group: int = 4, max_group: int = 40,
+                 timezone_for=user_timezone):
+        self.memory = memory
+        self.summarizer = summarizer or create_summarizer()
+        self.min_age = min_age_days * 86400
+        self.min_group = min_group
+        self.max_group = max_group
+        self.timezone_for = timezone_for
+
+    def _is_conversation(self, text: str, metadata: dict) -> bool:
+        kind = metadata.get("type")
+        if kind:
+            return kind in CONSOLIDATE_TYPES
+        return text.startswith(LEGACY_PREFIXES)
+
+    def _candidates(self, user_id: str, watermark: Optional[float], cutoff: float) -> List[tuple]:
+        """(id, text, metadata) of conversation chunks created in [watermark, cutoff)."""
+        tenant = self.memory._tenant_filter(user_id)
+        where = tenant # First run: scan everything, legacy chunks have no created_at
+        if watermark is not None:
+            where = {"$and": [{"created_at": {"$gte": watermark}}, {"created_at": {"$lt": cutoff}}] + ([tenant] if tenant else [])}
+
+        found = []
+        with self.memory.use_store(user_id) as store:
+            offset = 0
+            while True:
+                page = store._collection.get(where=where, include=["documents", "metadatas"], limit=500, offset=offset)
+                if not page["ids"]:
+                    break
+                for chunk_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                    metadata = metadata or {}
+                    if metadata.get("created_at", 0) < cutoff and self._is_conversation(text, metadata):
+                        found.append((chunk_id, text, metadata))
+                offset += len(page["ids"])
+        return found
+
+    def _cutoff(self, tz: datetime.tzinfo) -> float:
+        """Start of the user's day that contains now - min_age: only whole days are consolidated."""
+        moment = datetime.datetime.fromtimestamp(time.time() - self.min_age, tz)
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+    def _groups(self, chunks: List[tuple], tz: datetime.tzinfo) -> Tuple[Dict[str, List[tuple]], Optional[float]]:
+        """
+        ({label: chunks} to summarize, created_at of the earliest chunk on a day too quiet to
+        summarize, or None).
+        """
+        by_day: Dict[str, List[tuple]] = {}
+        for chunk in sorted(chunks, key=lambda c: c[2].get("created_at", 0)):
+            created_at = chunk[2].get("created_at", 0)
+            day = datetime.datetime.fromtimestamp(created_at, tz).strftime("%Y-%m-%d") if created_at else "earlier"
+            by_day.setdefault(day, []).append(chunk)
+
+        groups, first_skipped = {}, None
+        for day, items in by_day.items():
+            if len(items) < self.min_group:
+                if day != "earlier" and first_skipped is None: # Legacy chunks never gain company; don't wait for them
+                    first_skipped = items[0][2]["created_at"]
+                continue
+            for i in range(0, len(items), self.max_group):
+                label = day if len(items) <= self.max_group else f"{day}, part {i // self.max_group + 1}"
+                groups[label] = items[i:i + self.max_group]
+        return groups, first_skipped
+
+    def consolidate_user(self, user_id: str, dry_run: bool = False) -> Dict[str, int]:
+        tz = self.timezone_for(user_id)
+        cutoff = self._cutoff(tz)
+        watermark = state_store.get(WATERMARK_NAMESPACE, user_id)
+        chunks = self._candidates(user_id, watermark, cutoff)
+        groups, first_skipped = self._groups(chunks, tz)
+
+        result = {"candidates": len(chunks), "summaries": 0, "removed": 0}
+        for label, group in groups.items():
+            if dry_run:
+                result["summaries"] += 1
+                result["removed"] += len(group)
+                continue
+            summary = self.summarizer.summarize([c[1] for c in group], label)
+            if not summary:
+                continue
+            metadata = {
+                "user_id": user_id,
+                "type": "summary",
+                "source": "consolidation",
+                "period": label,
+                "consolidated": len(group),
+                "created_at": max(c[2].get("created_at", 0) for c in group),
+            }
+            embedding = self.memory.embedding_function.embed_documents([summary])
+            # Store the summary before deleting, so a failure in between never loses information
+            self.memory._write_chunks(user_id, [summary], [metadata], embedding)
+            self.memory.delete_chunks(user_id, [c[0] for c in group])
+            result["summaries"] += 1
+            result["removed"] += len(group)
+
+        if not dry_run:
+            # Quiet days are read again next time, in case more of their chunks have arrived
+            state_store.set(WATERMARK_NAMESPACE, user_id, cutoff if first_skipped is None else min(cutoff, first_skipped))
+        return result
+
+
+class ConsolidationJob:
+    """
+    Runs MemoryConsolidator over every user every MIMIR_CONSOLIDATION_INTERVAL seconds.
+    Users are claimed in the state store, so several workers never consolidate the same
+    user at once.
+    """
+
+    def __init__(self):
+        self.interval = float(os.getenv("MIMIR_CONSOLIDATION_INTERVAL", "21600"))
+        self.min_age_days = float(os.getenv("MIMIR_CONSOLIDATION_MIN_AGE_DAYS", "7"))
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            print(f"[CONSOLIDATION] Memory consolidation started (every {self.interval:.0f}s)")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                print(f"[CONSOLIDATION] Run failed: {e}")
+
+    def run_once(self, user_ids: List[str] = None, dry_run: bool = False) -> Dict[str, Dict[str, int]]:
+        from backend.core.memory import mimir_memory
+        from backend.core.user_manager import user_manager
+
+        consolidator = MemoryConsolidator(mimir_memory, min_age_days=self.min_age_days)
+        results = {}
+        for user_id in user_ids or list(user_manager.profiles):
+            if not dry_run and not state_store.add(CLAIM_NAMESPACE, user_id, os.getpid(), ttl=self.interval / 2):
+                continue # Another worker has this user for this round
+            try:
+                results[user_id] = consolidator.consolidate_user(user_id, dry_run=dry_run)
+            except Exception as e:
+                print(f"[CONSOLIDATION] Failed for {user_id}: {e}")
+                continue
+            if results[user_id]["summaries"]:
+                print(f"[CONSOLIDATION] {user_id}: {results[user_id]['removed']} chunks -> {results[user_id]['summaries']} summaries")
+        return results
+
+
+def create_consolidation_job() -> Optional[ConsolidationJob]:
+    """MIMIR_CONSOLIDATION: "off" (default) or "inprocess". Originals are deleted, so it is opt-in."""
+    mode = os.getenv("MIMIR_CONSOLIDATION", "off").lower()
+    if mode == "inprocess":
+        return ConsolidationJob()
+    if mode != "off":
+        print(f"[CONSOLIDATION] Unknown MIMIR_CONSOLIDATION '{mode}', consolidation disabled")
+    return None
@@ -7,6 +7,8 @@ from backend.core.ai import mimir_ai
 from backend.core.calendar import CalendarManager
 from backend.core.memory import mimir_memory
 from backend.core.user_manager import user_manager
+from backend.core.lazy import LazySingleton
+from backend.core.state import state_store
 
 MIMIR_DATA_DIR = os.getenv("MIMIR_DATA_DIR")
 if MIMIR_DATA_DIR:
@@ -16,11 +18,15 @@ else:
     DAILY_LOGS_DIR = "./daily_logs"
     JOURNAL_ATTACHMENTS_DIR = "./journal_attachments"
 
+PROMPTED_NAMESPACE = "journal_prompted"
+PROMPTED_TTL_SECONDS = 2 * 24 * 3600
+VERIFIED_NAMESPACE = "journal_verified"
+VERIFIED_TTL_SECONDS = 8 * 24 * 3600
+
 class DailyJournalManager:
     def __init__(self):
         os.makedirs(DAILY_LOGS_DIR, exist_ok=True)
         os.makedirs(JOURNAL_ATTACHMENTS_DIR, exist_ok=True)
-        self.prompted_users = set() # Track who has been prompted today
 
     def get_user_time(self, user_id: str) -> datetime.datetime:
         default_tz = os.getenv("DEFAULT_TIMEZONE", "America/New_York")
@@ -40,6 +46,32 @@ class DailyJournalManager:
         safe_id = "".join([c for c in user_id if c.isalnum() or c in (' ', '_', '-')]).strip()
         return os.path.join(DAILY_LOGS_DIR, f"{safe_id}_{date_str}.json")
 
+    def recent_users(self, limit: int = 10) -> List[str]:
+        """
+        Returns the auth IDs of the users whose daily logs were written most recently.
+        """
+        if not os.path.exists(DAILY_LOGS_DIR):
+            return []
+        safe_to_user = {}
+        for auth_id in user_manager.profiles:
+            safe_id = "".join([c for c in auth_id if c.isalnum() or c in (' ', '_', '-')]).strip()
+            safe_to_user[safe_id] = auth_id
+
+        logs = []
+        for filename in os.listdir(DAILY_LOGS_DIR):
+            if filename.endswith(".json"):
+                path = os.path.join(DAILY_LOGS_DIR, filename)
+                logs.append((os.path.getmtime(path), filename.replace(".json", "").rsplit("_", 1)[0]))
+
+        users = []
+        for _, safe_id in sorted(logs, reverse=True):
+            user_id = safe_to_user.get(safe_id)
+            if user_id and user_id not in users:
+                users.append(user_id)
+                if len(users) >= limit:
+                    break
+        return users
+
     def log_interaction(self, user_id: str, type: str, content: Any):
         """
         Log an interaction for the daily journal.
@@ -52,18 +84,20 @@ class DailyJournalManager:
             "content": content
         }
         
-        logs = []
-        if os.path.exists(log_file):
-            try:
-                with open(log_file, 'r') as f:
-                    logs = json.load(f)
-            except:
-                pass
-        
-        logs.append(entry)
-        
-        with open(log_file, 'w') as f:
-            f.write(json.dumps(logs, indent=2))
+        # Logging runs in background threads (and possibly several workers); serialize the rewrite
+        with state_store.lock(f"daily_log:{user_id}"):
+            logs = []
+            if os.path.exists(log_file):
+                try:
+                    with open(log_file, 'r') as f:
+                        logs = json.load(f)
+                except:
+                    pass
+            
+            logs.append(entry)
+            
+            with open(log_file, 'w') as f:
+                f.write(json.dumps(logs, indent=2))
 
     def check_prompt_needed(self, user_id: str) -> bool:
         """
@@ -75,100 +109,100 @@ class DailyJournalManager:
         """
         now = self.get_user_time(user_id)
         
-        # Reset prompted_users if it's a new day (basic check, could be improved)
-        # For now, we'll rely on the caller to handle day rollovers or restart
-        
         if now.hour < 19: # Before 7 PM
             return False
             
         date_str = now.strftime("%Y-%m-%d")
         prompt_key = f"{user_id}_{date_str}"
         
-        if prompt_key in self.prompted_users:
+        if state_store.get(PROMPTED_NAMESPACE, prompt_key):
             return False
             
         log_file = self._get_log_file(user_id, date_str)
         if not os.path.exists(log_file):
-            self.prompted_users.add(prompt_key)
-            return True # No logs at all, definitely prompt
+            # No logs at all, definitely prompt (only the first worker to claim the key does)
+            return state_store.add(PROMPTED_NAMESPACE, prompt_key, True, ttl=PROMPTED_TTL_SECONDS)
             
         with open(log_file, 'r') as f:
             logs = json.load(f)
             
         # Criteria for "sparse"
         if len(logs) < 5:
-            self.prompted_users.add(prompt_key)
-            return True
+            return state_store.add(PROMPTED_NAMESPACE, prompt_key, True, ttl=PROMPTED_TTL_SECONDS)
             
         # Could add more complex logic here (word count, etc.)
         return False
 
-    async def check_end_of_day(self, user_id: str):
+    def _attachment_path(self, user_id: str, date_str: str) -> str:
+        safe_filename_id = "".join([c for c in user_id if c.isalnum()])
+        attachment_filename = f"journal_stats_{safe_filename_id}_{date_str}.csv"
+        return os.path.join(JOURNAL_ATTACHMENTS_DIR, attachment_filename)
+
+    def _verify_calendar_sync(self, user_id: str, date_str: str) -> bool:
         """
-        Checks if it's time to generate the daily journal (11:59 PM or later).
+        Returns True if the day's journal exists, making sure its calendar event
+        exists and has the attachment (repairing it if not).
         """
-        now = self.get_user_time(user_id)
-        date_str = now.strftime("%Y-%m-%d")
-        
-        # Helper to verify/repair calendar
-        async def verify_calendar_sync(date_str, attachment_path):
-            if os.path.exists(attachment_path):
-                # CSV exists, ensure calendar event exists and has attachment
-                calendar_manager = CalendarManager(user_id=user_id)
-                existing_events = calendar_manager.get_events(start_date=date_str, end_date=date_str)
-                journal_events = [e for e in existing_events if e['subject'] == "Daily Journal"]
-                
-                event_details = "Click to view daily summary."
-                
-                if not journal_events:
-                    print(f"[JOURNAL] Restoring missing calendar event for {date_str}")
-                    calendar_manager.create_event(
-                        subject="Daily Journal",
-                        date=date_str,
-                        start_time="23:59",
-                        end_time="23:59",
-                        details=event_details,
-                        attachment=attachment_path
-                    )
-                elif 'attachment' not in journal_events[0] or not journal_events[0]['attachment']:
-                    print(f"[JOURNAL] Repairing incomplete calendar event for {date_str}")
-                    calendar_manager.update_event(
-                        journal_events[0]['id'],
-                        attachment=attachment_path
-                    )
-                return True # Found and verified
+        attachment_path = self._attachment_path(user_id, date_str)
+        if not os.path.exists(attachment_path):
             return False # Not found
 
-        # Check if it's 11:59 PM
-        if now.hour == 23 and now.minute >= 59:
-            safe_filename_id = "".join([c for c in user_id if c.isalnum()])
-            attachment_filename = f"journal_stats_{safe_filename_id}_{date_str}.csv"
-            attachment_path = os.path.join(JOURNAL_ATTACHMENTS_DIR, attachment_filename)
-            
-            if not await verify_calendar_sync(date_str, attachment_path):
-                await self.generate_journal_entry(user_id, date_str)
-                return True
-                
-        # Check yesterday
-        yesterday = now - datetime.timedelta(days=1)
-        yesterday_str = yesterday.strftime("%Y-%m-%d")
-        yesterday_log = self._get_log_file(user_id, yesterday_str)
+        # Only verify the calendar once per journaled day (the flag also keeps other workers from repairing it too)
+        verified_key = f"{user_id}_{date_str}"
+        if not state_store.add(VERIFIED_NAMESPACE, verified_key, True, ttl=VERIFIED_TTL_SECONDS):
+            return True
+        try:
+            self._repair_calendar_event(user_id, date_str, attachment_path)
+        except Exception:
+            state_store.delete(VERIFIED_NAMESPACE, verified_key) # Not verified: try again next time
+            raise
+        return True # Found and verified
+
+    def _repair_calendar_event(self, user_id: str, date_str: str, attachment_path: str):
+        """Ensures the day's journal event exists and has the attachment."""
+        calendar_manager = CalendarManager(user_id=user_id)
+        existing_events = calendar_manager.get_events(start_date=date_str, end_date=date_str)
+        journal_events = [e for e in existing_events if e['subject'] == "Daily Journal"]
         
-        if os.path.exists(yesterday_log):
-            safe_filename_id = "".join([c for c in user_id if c.isalnum()])
-            attachment_filename = f"journal_stats_{safe_filename_id}_{yesterday_str}.csv"
-            attachment_path = os.path.join(JOURNAL_ATTACHMENTS_DIR, attachment_filename)
-            
-            if not await verify_calendar_sync(yesterday_str, attachment_path):
-                print(f"[JOURNAL] Found un-journaled log for yesterday ({yesterday_str}). Generating...")
-                await self.generate_journal_entry(user_id, yesterday_str)
-                return True
-                
-        return False
+        event_details = "Click to view daily summary."
+        
+        if not journal_events:
+            print(f"[JOURNAL] Restoring missing calendar event for {date_str}")
+            calendar_manager.create_event(
+                subject="Daily Journal",
+                date=date_str,
+                start_time="23:59",
+                end_time="23:59",
+                details=event_details,
+                attachment=attachment_path
+            )
+        elif 'attachment' not in journal_events[0] or not journal_events[0]['attachment']:
+            print(f"[JOURNAL] Repairing incomplete calendar event for {date_str}")
+            result = calendar_manager.update_event(
+                journal_events[0]['id'],
+                attachment=attachment_path
+            )
+            if "error" in result:
+                raise RuntimeError(result["error"])
+
+    def pending_journal_dates(self, user_id: str, lookback_days: int = 7) -> List[str]:
+        """
+        Returns the days that have ended in the user's timezone, have an activity
+        log, and have no journal yet (oldest first).
+        """
+        today = self.get_user_time(user_id).date()
+        pending = []
+        for offset in range(lookback_days, 0, -1):
+            date_str = (today - datetime.timedelta(days=offset)).strftime("%Y-%m-%d")
+            if not os.path.exists(self._get_log_file(user_id, date_str)):
+                continue
+            if not self._verify_calendar_sync(user_id, date_str):
+                pending.append(date_str)
+        return pending
 
     def mark_prompted(self, user_id: str):
-        date_str = datetime.datetime.now().strftime("%Y-%m-%d")
-        self.prompted_users.add(f"{user_id}_{date_str}")
+        date_str = self.get_user_time(user_id).strftime("%Y-%m-%d")
+        state_store.set(PROMPTED_NAMESPACE, f"{user_id}_{date_str}", True, ttl=PROMPTED_TTL_SECONDS)
 
     async def generate_journal_entry(self, user_id: str, date_str: str = None):
         """
@@ -247,8 +281,9 @@ class DailyJournalManager:
         """
         
         import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
         model = genai.GenerativeModel('gemini-2.5-pro')
-        response = model.generate_content(prompt)
+        response = await model.generate_content_async(prompt)
         journal_text = response.text
         
         # --- 3. Save Journal Data (JSON) for Frontend ---
@@ -365,4 +400,4 @@ class DailyJournalManager:
                 
         print(f"[MAINTENANCE] Cleanup complete. Deleted {count} files.")
 
-daily_journal = DailyJournalManager()
+daily_journal = LazySingleton(DailyJournalManager)
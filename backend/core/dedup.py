@@ -0,0 +1,166 @@
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import List, Tuple
+
+from backend.core.embeddings import normalize_text
+from backend.core.local_disk import sqlite_journal_mode
+
+BANDS = 8 # 64-bit fingerprints split into eight 8-bit bands
+MIN_NEAR_TOKENS = 8 # Shorter texts only get exact matching; their SimHash is too unstable
+
+
+def _tokens(text: str) -> List[str]:
+    return re.findall(r"\w+", normalize_text(text).lower())
+
+
+def exact_key(text: str) -> str:
+    return hashlib.sha256(" ".join(_tokens(text)).encode("utf-8")).hexdigest()
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word 3-shingles (unigrams for very short texts)."""
+    tokens = _tokens(text)
+    shingles = [" ".join(tokens[i:i + 3]) for i in range(len(tokens) - 2)] or tokens
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _bands(fingerprint: int) -> List[int]:
+    return [fingerprint >> (8 * i) & 0xFF for i in range(BANDS)]
+
+
+def _signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class DuplicateFilter:
+    """
+    Per-user near-duplicate detection for memory chunks.
+
+    Each stored chunk keeps an exact key (hash of its normalized words) and a 64-bit
+    SimHash. An incoming chunk is a duplicate if its exact key is known for the user or
+    its SimHash is within `max_distance` bits of one. Candidates are found through eight
+    8-bit bands (fingerprints fewer than 8 bits apart must agree on at least one band),
+    so a check never scans the user's whole history. On ~1000-character chunks a couple
+    of edited words typically moves the SimHash 3-7 bits, while unrelated chunks sit 20+
+    bits apart. Duplicates are not embedded or stored;
+    the matching fingerprint's `seen` count is bumped instead.
+    """
+
+    def __init__(self, path: str, max_distance: int = 6):
+        self.path = path
+        self.max_distance = min(max_distance, BANDS - 1) # Beyond that the band lookup could miss matches
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints ("
+            " user_id TEXT NOT NULL, chunk_id TEXT NOT NULL, exact TEXT NOT NULL, simhash INTEGER NOT NULL,"
+            + "".join(f" b{i} INTEGER," for i in range(BANDS)) +
+            " seen INTEGER NOT NULL DEFAULT 1, last_seen REAL NOT NULL,"
+            " PRIMARY KEY (user_id, chunk_id))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS fp_exact ON fingerprints (user_id, exact)")
+        for band in range(BANDS):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS fp_b{band} ON fingerprints (user_id, b{band})")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute(f"PRAGMA journal_mode={sqlite_journal_mode(self.path)}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _find(self, user_id: str, key: str, fingerprint: int, near: bool):
+        """Returns (chunk_id, kind) of a stored duplicate, or None."""
+        conn = self._conn()
+        row = conn.execute("SELECT chunk_id FROM fingerprints WHERE user_id = ? AND exact = ? LIMIT 1", (user_id, key)).fetchone()
+        if row:
+            return row[0], "exact"
+        if not near:
+            return None
+        bands = _bands(fingerprint)
+        where = " OR ".join(f"b{i} = ?" for i in range(BANDS))
+        rows = conn.execute(f"SELECT chunk_id, simhash FROM fingerprints WHERE user_id = ? AND ({where})", (user_id, *bands))
+        for chunk_id, stored in rows:
+            if hamming(fingerprint, stored & 0xFFFFFFFFFFFFFFFF) <= self.max_distance:
+                return chunk_id, "near"
+        return None
+
+    def filter(self, chunks: List[Tuple[str, str, dict]]) -> Tuple[list, dict]:
+        """
+        Drops duplicate (user_id, text, metadata) chunks, against stored chunks and earlier
+        chunks in the same batch. Returns (kept chunks, {"exact": n, "near": n}).
+        """
+        kept, suppressed, matched = [], {"exact": 0, "near": 0}, []
+        batch = {} # user_id -> [(exact key, simhash)] kept so far
+        for user_id, text, metadata in chunks:
+            key, fingerprint = exact_key(text), simhash(text)
+            near = len(_tokens(text)) >= MIN_NEAR_TOKENS
+
+            kind = None
+            for seen_key, seen_fp in batch.get(user_id, []):
+                if seen_key == key:
+                    kind = "exact"
+                elif near and hamming(seen_fp, fingerprint) <= self.max_distance:
+                    kind = "near"
+                if kind:
+                    break
+            if kind is None:
+                found = self._find(user_id, key, fingerprint, near)
+                if found:
+                    matched.append((user_id, found[0]))
+                    kind = found[1]
+
+            if kind:
+                suppressed[kind] += 1
+                continue
+            batch.setdefault(user_id, []).append((key, fingerprint))
+            kept.append((user_id, text, metadata))
+
+        if matched:
+            conn = self._conn()
+            conn.executemany(
+                "UPDATE fingerprints SET seen = seen + 1, last_seen = ? WHERE user_id = ? AND chunk_id = ?",
+                [(time.time(), u, c) for u, c in matched],
+            )
+            conn.commit()
+        return kept, suppressed
+
+    def add(self, user_id: str, chunk_ids: List[str], texts: List[str]):
+        now = time.time()
+        rows = []
+        for chunk_id, text in zip(chunk_ids, texts):
+            fingerprint = simhash(text)
+            rows.append((user_id, chunk_id, exact_key(text), _signed(fingerprint), *_bands(fingerprint), now))
+        conn = self._conn()
+        conn.executemany(
+            "INSERT OR REPLACE INTO fingerprints (user_id, chunk_id, exact, simhash, "
+            + "".join(f"b{i}, " for i in range(BANDS)) + "last_seen) VALUES (" + ", ".join("?" * (BANDS + 5)) + ")",
+            rows,
+        )
+        conn.commit()
+
+    def delete(self, user_id: str, chunk_ids: List[str]):
+        conn = self._conn()
+        conn.executemany("DELETE FROM fingerprints WHERE user_id = ? AND chunk_id = ?", [(user_id, c) for c in chunk_ids])
+        conn.commit()
+
+    def delete_user(self, user_id: str):
+        conn = self._conn()
+        conn.execute("DELETE FROM fingerprints WHERE user_id = ?", (user_id,))
+        conn.commit()
@@ -0,0 +1,495 @@
+import os
+import re
+import time
+import array
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from backend.core.local_disk import sqlite_journal_mode
+
+# The original (and default) embedding model; existing stores without a recorded model used it
+DEFAULT_GOOGLE_MODEL = "models/text-embedding-004"
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: NFC, collapsed whitespace, trimmed."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def embedding_key(model: str, kind: str, text: str) -> str:
+    # Query and document embeddings differ for the same text (task type), so both are in the key
+    payload = f"{model}\0{kind}\0{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+def _encode(vector: List[float]) -> bytes:
+    return array.array("f", vector).tobytes()
+
+
+def _decode(blob: bytes) -> List[float]:
+    values = array.array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by model + kind + hash of the normalized text.
+
+    Vectors are stored as float32 blobs in SQLite. When the table grows past
+    `max_entries` the least recently used tenth is evicted. Hot query strings are
+    also kept in a small in-RAM LRU so repeated queries skip the database entirely.
+    Hits are not written back one by one (the database may sit on a bucket mount):
+    last-used times are collected in RAM and written in one batch every
+    TOUCH_BATCH keys or TOUCH_SECONDS, and before evicting.
+    """
+
+    TOUCH_BATCH = 256
+    TOUCH_SECONDS = 60.0
+
+    def __init__(self, path: str, max_entries: int = 200000, ram_entries: int = 2048):
+        self.path = path
+        self.max_entries = max_entries
+        self.ram_entries = ram_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ram: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._touched: Dict[str, float] = {} # key -> last used, not yet written
+        self._touched_at = time.time()
+        self._counters = {"ram_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        conn.commit()
+        self._entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        print(f"[MIMIR] Embedding cache at {path} ({self._entries} entries)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute(f"PRAGMA journal_mode={sqlite_journal_mode(self.path)}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def get_ram(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._ram.get(key)
+            if vector is not None:
+                self._ram.move_to_end(key)
+                self._counters["ram_hits"] += 1
+                self._touched[key] = time.time() # Keeps hot queries from being evicted on disk
+            return vector
+
+    def put_ram(self, key: str, vector: List[float]):
+        with self._lock:
+            self._ram[key] = vector
+            self._ram.move_to_end(key)
+            while len(self._ram) > self.ram_entries:
+                self._ram.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        if not keys:
+            return found
+        conn = self._conn()
+        unique = list(dict.fromkeys(keys))
+        for i in range(0, len(unique), 500):
+            batch = unique[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch).fetchall()
+            for key, blob in rows:
+                found[key] = _decode(blob)
+        if found:
+            self._touch(found)
+        self._count("disk_hits", sum(1 for k in keys if k in found))
+        self._count("misses", sum(1 for k in keys if k not in found))
+        return found
+
+    def _touch(self, keys):
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                self._touched[key] = now
+            due = len(self._touched) >= self.TOUCH_BATCH or now - self._touched_at >= self.TOUCH_SECONDS
+        if due:
+            self.flush_touches()
+
+    def flush_touches(self):
+        """Writes the collected last-used times."""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._touched_at = time.time()
+        if touched:
+            conn = self._conn()
+            conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(t, k) for k, t in touched.items()])
+            conn.commit()
+
+    def put_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        conn = self._conn()
+        now = time.time()
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+            [(k, _encode(v), now) for k, v in items.items()],
+        )
+        conn.commit()
+        self._count("writes", len(items))
+        with self._lock:
+            self._entries += len(items)
+            over = self._entries > self.max_entries
+        if over:
+            self._evict()
+
+    def _evict(self):
+        self.flush_touches() # Evict by up-to-date last use
+        conn = self._conn()
+        total = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        target = int(self.max_entries * 0.9)
+        removed = 0
+        if total > target:
+            conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (total - target,),
+            )
+            conn.commit()
+            removed = total - target
+        with self._lock:
+            self._entries = total - removed
+            self._counters["evictions"] += removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            entries = self._entries
+            ram = len(self._ram)
+        lookups = counters["ram_hits"] + counters["disk_hits"] + counters["misses"]
+        hits = counters["ram_hits"] + counters["disk_hits"]
+        return {
+            **counters,
+            "entries": entries,
+            "ram_entries": ram,
+            "max_entries": self.max_entries,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class CachedEmbeddings:
+    """
+    Drop-in wrapper around an embeddings client (anything with embed_documents /
+    embed_query, as Chroma expects). Only texts missing from the cache reach the
+    wrapped client, in a single batched call.
+    """
+
+    def __init__(self, inner, model_name: str, cache: EmbeddingCache):
+        self.inner = inner
+        self.model_name = model_name
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_key(self.model_name, "document", t) for t in texts]
+        found = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.inner.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+
+        return [found[k] for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = embedding_key(self.model_name, "query", text)
+        vector = self.cache.get_ram(key)
+        if vector is not None:
+            return vector
+        vector = self.cache.get_many([key]).get(key)
+        if vector is None:
+            vector = self.inner.embed_query(text)
+            self.cache.put_many({key: vector})
+        self.cache.put_ram(key, vector)
+        return vector
+
+    def stats(self) -> Dict:
+        return self.cache.stats()
+
+
+class _EmbedRequest:
+    __slots__ = ("texts", "at", "vectors", "error", "taken", "done")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.at = time.monotonic()
+        self.vectors = None
+        self.error = None
+        self.taken = False # In a batch that is being sent
+        self.done = False
+
+
+# Upper bounds of the batch size histogram buckets (texts per call)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class MicroBatchEmbeddings:
+    """
+    Process-wide coalescing of embedding calls, as a drop-in embeddings wrapper.
+
+    Concurrent callers (recall queries from many users, the ingestion flush, summaries)
+    each ask for a few texts. Requests arriving within `max_wait_ms` of the first queued
+    one are merged into a single call to the wrapped client, up to `max_batch` texts
+    (a request that is larger on its own goes alone), and the vectors are handed back
+    to each caller. Queries and documents are batched separately, since the API embeds
+    them for different tasks. At most `max_in_flight` calls run at once; while they do,
+    new requests keep queueing, so under load batches grow rather than calls multiply.
+    There is no dispatcher thread: the first waiting caller collects and sends the batch.
+    """
+
+    def __init__(self, inner, max_batch: int = 100, max_wait_ms: float = 5, max_in_flight: int = 4):
+        import inspect
+        from backend.core.metrics import Histogram
+        self.inner = inner
+        self.model_name = getattr(inner, "model_name", type(inner).__name__)
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_in_flight = max(1, max_in_flight)
+        # Google's client embeds a batch of queries through embed_documents with the query task type
+        try:
+            self._query_task_type = "task_type" in inspect.signature(inner.embed_documents).parameters
+        except (TypeError, ValueError):
+            self._query_task_type = False
+        self._cond = threading.Condition()
+        self._queues: Dict[str, List[_EmbedRequest]] = {"query": [], "document": []}
+        self._leading = {"query": False, "document": False}
+        self._in_flight = 0
+        self._batch_sizes = {kind: Histogram(BATCH_SIZE_BUCKETS) for kind in self._queues}
+        self._requests_per_call = Histogram(BATCH_SIZE_BUCKETS)
+        self._wait_ms = Histogram()
+        self._counters = {"requests": 0, "calls": 0, "texts": 0, "failures": 0}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._submit("document", list(texts)) if texts else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._submit("query", [text])[0]
+
+    def _queued_texts(self, kind: str) -> int:
+        return sum(len(r.texts) for r in self._queues[kind])
+
+    def _submit(self, kind: str, texts: List[str]) -> List[List[float]]:
+        request = _EmbedRequest(texts)
+        with self._cond:
+            self._queues[kind].append(request)
+            self._counters["requests"] += 1
+            self._cond.notify_all() # A leader waiting for a fuller batch may have one now
+        while True:
+            with self._cond:
+                while not request.done and (request.taken or self._leading[kind]):
+                    self._cond.wait()
+                if request.done:
+                    break
+                # No one is collecting this kind: collect and send the next batch ourselves
+                self._leading[kind] = True
+                batch = self._collect(kind)
+            self._send(kind, batch)
+        if request.error is not None:
+            raise request.error
+        return request.vectors
+
+    def _collect(self, kind: str) -> List[_EmbedRequest]:
+        """Waits for the window to close (or the batch to fill) and a free call slot, then takes the batch. Holds the lock."""
+        queue = self._queues[kind]
+        deadline = queue[0].at + self.max_wait
+        while True:
+            remaining = deadline - time.monotonic()
+            full = self._queued_texts(kind) >= self.max_batch
+            if (full or remaining <= 0) and self._in_flight < self.max_in_flight:
+                break
+            self._cond.wait(None if full or remaining <= 0 else remaining)
+        batch, size = [], 0
+        while queue and (not batch or size + len(queue[0].texts) <= self.max_batch):
+            size += len(queue[0].texts)
+            queue[0].taken = True
+            batch.append(queue.pop(0))
+        self._in_flight += 1
+        self._leading[kind] = False
+        self._cond.notify_all() # The rest of the queue needs a new leader
+        return batch
+
+    def _send(self, kind: str, batch: List[_EmbedRequest]):
+        texts = [t for r in batch for t in r.texts]
+        now = time.monotonic()
+        for r in batch:
+            self._wait_ms.observe((now - r.at) * 1000)
+        self._batch_sizes[kind].observe(len(texts))
+        self._requests_per_call.observe(len(batch))
+        vectors, error = None, None
+        try:
+            vectors = self._call(kind, texts)
+        except Exception as e:
+            error = e
+        with self._cond:
+            self._in_flight -= 1
+            self._counters["calls"] += 1
+            self._counters["texts"] += len(texts)
+            if error is not None:
+                self._counters["failures"] += 1
+            offset = 0
+            for r in batch:
+                r.vectors = vectors[offset:offset + len(r.texts)] if vectors is not None else None
+                r.error = error
+                r.done = True
+                offset += len(r.texts)
+            self._cond.notify_all()
+
+    def _call(self, kind: str, texts: List[str]) -> List[List[float]]:
+        if kind == "document":
+            return self.inner.embed_documents(texts)
+        if len(texts) == 1:
+            return [self.inner.embed_query(texts[0])]
+        if self._query_task_type:
+            return self.inner.embed_documents(texts, task_type="retrieval_query")
+        if getattr(self.inner, "queries_as_documents", False):
+            return self.inner.embed_documents(texts)
+        return [self.inner.embed_query(t) for t in texts]
+
+    def stats(self) -> Dict:
+        with self._cond:
+            counters = dict(self._counters)
+        return {
+            **counters,
+            "texts_per_call": round(counters["texts"] / counters["calls"], 2) if counters["calls"] else 0.0,
+            "batch_size": {kind: hist.snapshot() for kind, hist in self._batch_sizes.items()},
+            "requests_per_call": self._requests_per_call.snapshot(),
+            "wait_ms": self._wait_ms.snapshot(),
+        }
+
+
+class HashingEmbeddings:
+    """
+    Deterministic, offline embedder for benchmarks and tests: hashes word unigrams and
+    bigrams into `dimensions` buckets with a random sign, then L2-normalizes. Texts that
+    share words get similar vectors, which is enough to exercise recall end to end
+    without network calls or API keys.
+    """
+
+    queries_as_documents = True # embed_query(t) == embed_documents([t])[0]
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+        self.model_name = f"hashing:{dimensions}"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        words = re.findall(r"\w+", normalize_text(text).lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimensions] += 1.0 if value >> 63 else -1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class SentenceTransformerEmbeddings:
+    """
+    Local CPU embeddings with a sentence-transformers model (optional dependency:
+    `pip install sentence-transformers`; add `onnxruntime` for runtime="onnx").
+
+    Texts are encoded in batches of `batch_size`. Inference is capped at `threads`
+    intra-op threads and `max_concurrency` simultaneous calls, so embedding can't
+    starve the event loop's worker threads or the rest of the container.
+    """
+
+    queries_as_documents = True
+
+    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2", batch_size: int = 32,
+                 threads: int = 2, max_concurrency: int = 1, runtime: str = "torch"):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.threads = threads
+        self._gate = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._runtime = runtime
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    def _get_model(self):
+        with self._load_lock:
+            if self._model is None:
+                import torch
+                from sentence_transformers import SentenceTransformer
+                torch.set_num_threads(self.threads)
+                kwargs = {"backend": "onnx"} if self._runtime == "onnx" else {}
+                self._model = SentenceTransformer(self.model_name, device="cpu", **kwargs)
+                print(f"[MIMIR] Loaded local embedding model {self.model_name} ({self._runtime}, {self.threads} threads)")
+            return self._model
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        model = self._get_model()
+        with self._gate:
+            vectors = model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True, show_progress_bar=False)
+        return vectors.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts) if texts else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+
+def create_embedding_backend():
+    """
+    Builds the embedder selected by MIMIR_EMBEDDING_BACKEND. Returns (embedder, model name);
+    the name keys the embedding cache and is recorded on collections, since vectors from
+    different models can't be mixed (switch with backend.scripts.reindex_memory).
+      - "google" (default): GOOGLE text-embedding API
+      - "local": sentence-transformers on CPU (MIMIR_LOCAL_EMBED_MODEL, _BATCH_SIZE, _THREADS,
+        _MAX_CONCURRENCY, _RUNTIME=torch|onnx)
+      - "hashing": offline HashingEmbeddings, for tests and benchmarks only
+    """
+    backend = os.getenv("MIMIR_EMBEDDING_BACKEND", "google").lower()
+    if backend == "local":
+        model = os.getenv("MIMIR_LOCAL_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        embedder = SentenceTransformerEmbeddings(
+            model,
+            batch_size=int(os.getenv("MIMIR_LOCAL_EMBED_BATCH_SIZE", "32")),
+            threads=int(os.getenv("MIMIR_LOCAL_EMBED_THREADS", str(min(4, os.cpu_count() or 1)))),
+            max_concurrency=int(os.getenv("MIMIR_LOCAL_EMBED_MAX_CONCURRENCY", "1")),
+            runtime=os.getenv("MIMIR_LOCAL_EMBED_RUNTIME", "torch").lower(),
+        )
+        return embedder, f"local:{model}"
+    if backend == "hashing":
+        dimensions = int(os.getenv("MIMIR_HASHING_EMBED_DIMENSIONS", "256"))
+        embedder = HashingEmbeddings(dimensions)
+        return embedder, embedder.model_name
+    if backend != "google":
+        print(f"[WARN] Unknown MIMIR_EMBEDDING_BACKEND '{backend}', using google")
+
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    model = os.getenv("MIMIR_GOOGLE_EMBED_MODEL", DEFAULT_GOOGLE_MODEL)
+    return GoogleGenerativeAIEmbeddings(model=model, google_api_key=os.getenv("GOOGLE_API_KEY")), model
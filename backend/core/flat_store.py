@@ -0,0 +1,346 @@
+import os
+import json
+import threading
+from typing import Dict, List, Optional
+
+from backend.core.memory_store import COLLECTION_NAME
+
+MANIFEST_FILE = "flat.json"
+
+
+def matches_where(metadata: dict, where: Optional[dict]) -> bool:
+    """Evaluates a Chroma `where` clause ($and/$or, $eq/$ne/$gt/$gte/$lt/$lte/$in/$nin) against metadata."""
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, c) for c in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_where(metadata, c) for c in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$eq":
+                ok = value == operand
+            elif op == "$ne":
+                ok = value != operand
+            elif op == "$in":
+                ok = value in operand
+            elif op == "$nin":
+                ok = value not in operand
+            elif value is None:
+                ok = False
+            elif op == "$gt":
+                ok = value > operand
+            elif op == "$gte":
+                ok = value >= operand
+            elif op == "$lt":
+                ok = value < operand
+            elif op == "$lte":
+                ok = value <= operand
+            else:
+                raise ValueError(f"Unsupported where operator {op}")
+            if not ok:
+                return False
+    return True
+
+
+class FlatStore:
+    """
+    Brute-force vector store for small users: one memory-mapped float32 matrix plus an
+    append-only JSON-lines file of ids, documents and metadata, in the user's directory.
+
+    Opening it reads one small file and maps another, with no database, client or index
+    to build, and a query is a single matrix-vector product. Writes append rows;
+    replaced and deleted rows are tombstoned and dropped by compaction once they make
+    up a good part of the file. It answers the subset of the Chroma collection API that
+    MimirMemory uses (upsert/get/query/delete/count/metadata), and exposes itself as
+    `_collection` so it stands in for a langchain Chroma store.
+    """
+
+    def __init__(self, directory: str, collection_metadata: dict = None):
+        self.directory = directory
+        self.name = COLLECTION_NAME
+        self._collection = self
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+        manifest_path = os.path.join(directory, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self._manifest = json.load(f)
+        else:
+            self._manifest = {"version": 1, "dim": None, "files": 0, "metadata": dict(collection_metadata or {})}
+            self._save_manifest()
+        self._load()
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, MANIFEST_FILE))
+
+    # --- files ---
+
+    def _file(self, kind: str, generation: int = None) -> str:
+        generation = self._manifest["files"] if generation is None else generation
+        return os.path.join(self.directory, f"flat_{kind}.{generation}")
+
+    def _save_manifest(self):
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self._manifest, f)
+        os.replace(path + ".tmp", path)
+
+    def _load(self):
+        import numpy as np
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[dict] = []
+        self._rows: Dict[str, int] = {}
+        alive = []
+        # Vectors are appended before their records, so every complete record has its row;
+        # a record beyond the rows (or a torn last line) comes from an interrupted write
+        dim = self._manifest["dim"]
+        vectors_path = self._file("vectors")
+        capacity = os.path.getsize(vectors_path) // (4 * dim) if dim and os.path.exists(vectors_path) else 0
+        self._records_end = 0 # Bytes of the records file that were replayed
+        records_path = self._file("records")
+        if os.path.exists(records_path):
+            with open(records_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if "delete" in record:
+                        row = self._rows.pop(record["delete"], None)
+                        if row is not None:
+                            alive[row] = False
+                        self._records_end += len(line)
+                        continue
+                    if len(self._ids) >= capacity:
+                        break
+                    self._records_end += len(line)
+                    previous = self._rows.get(record["id"])
+                    if previous is not None:
+                        alive[previous] = False
+                    self._rows[record["id"]] = len(self._ids)
+                    self._ids.append(record["id"])
+                    self._documents.append(record["document"])
+                    self._metadatas.append(record["metadata"])
+                    alive.append(True)
+        self._alive = np.array(alive, dtype=bool)
+        self._norms = None
+        self._map()
+
+    def _map(self):
+        """(Re)maps the vector file; rows beyond the committed records are ignored."""
+        import numpy as np
+        dim = self._manifest["dim"]
+        path = self._file("vectors")
+        rows = os.path.getsize(path) // (4 * dim) if dim and os.path.exists(path) else 0
+        rows = min(rows, len(self._ids))
+        if rows:
+            self._vectors = np.memmap(path, dtype=np.float32, mode="r", shape=(rows, dim))
+            # Norms of rows already mapped are kept; only appended rows are read
+            known = self._norms if self._norms is not None else np.empty(0, dtype=np.float32)
+            self._norms = np.concatenate([known, np.linalg.norm(self._vectors[len(known):], axis=1)])
+        else:
+            self._vectors = np.empty((0, dim or 0), dtype=np.float32)
+            self._norms = np.empty(0, dtype=np.float32)
+
+    def _write_records(self, records: list):
+        lines = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+        with open(self._file("records"), "ab") as f:
+            if f.tell() != self._records_end:
+                f.truncate(self._records_end) # Drop what an interrupted write left behind
+            f.write(lines)
+        self._records_end += len(lines)
+
+    def _append(self, ids, vectors, documents, metadatas):
+        import numpy as np
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self._manifest["dim"] is None:
+            self._manifest["dim"] = int(vectors.shape[1])
+            self._save_manifest()
+        elif vectors.shape[1] != self._manifest["dim"]:
+            raise ValueError(f"Vector dimension {vectors.shape[1]} doesn't match the store's {self._manifest['dim']}")
+        committed = len(self._ids) * 4 * self._manifest["dim"]
+        with open(self._file("vectors"), "ab") as f:
+            if f.tell() != committed:
+                f.truncate(committed) # Rows left by an interrupted append
+            f.write(vectors.tobytes())
+        self._write_records([{"id": i, "document": d, "metadata": m} for i, d, m in zip(ids, documents, metadatas)])
+
+        alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+        for chunk_id, document, metadata in zip(ids, documents, metadatas):
+            previous = self._rows.get(chunk_id)
+            if previous is not None:
+                alive[previous] = False
+            self._rows[chunk_id] = len(self._ids)
+            self._ids.append(chunk_id)
+            self._documents.append(document)
+            self._metadatas.append(metadata)
+        self._alive = alive
+        self._map()
+
+    def _maybe_compact(self):
+        dead = len(self._ids) - len(self._rows)
+        if dead > max(256, len(self._ids) // 3):
+            self.compact()
+
+    def pages(self, size: int = 500):
+        """Yields the live rows as (ids, vectors, documents, metadatas) pages."""
+        live = self._live_ids()
+        for i in range(0, len(live), size):
+            page = self.get(ids=live[i:i + size], include=["embeddings", "documents", "metadatas"])
+            yield page["ids"], page["embeddings"], page["documents"], page["metadatas"]
+
+    def compact(self):
+        """Rewrites the files without replaced and deleted rows."""
+        with self._lock:
+            self.rewrite(self.pages())
+
+    def rewrite(self, pages, metadata: dict = None):
+        """
+        Replaces the whole store with `pages` of (ids, vectors, documents, metadatas), and
+        its collection metadata with `metadata` if given. The new files are written next to
+        the old ones and take over when the manifest is replaced, so an interrupted rewrite
+        leaves the store as it was. Vectors may change dimension (re-embedding).
+        """
+        import numpy as np
+        with self._lock:
+            old, new = self._manifest["files"], self._manifest["files"] + 1
+            dim = None
+            with open(self._file("vectors", new), "wb") as vectors_file, \
+                    open(self._file("records", new), "w", encoding="utf-8") as records_file:
+                for ids, vectors, documents, metadatas in pages:
+                    if not ids:
+                        continue
+                    vectors = np.asarray(vectors, dtype=np.float32)
+                    dim = int(vectors.shape[1])
+                    vectors_file.write(vectors.tobytes())
+                    for chunk_id, document, chunk_metadata in zip(ids, documents, metadatas):
+                        records_file.write(json.dumps({"id": chunk_id, "document": document, "metadata": chunk_metadata},
+                                                      ensure_ascii=False) + "\n")
+            self._manifest = {
+                **self._manifest, "files": new, "dim": dim or self._manifest["dim"],
+                "metadata": dict(self._manifest["metadata"] if metadata is None else metadata),
+            }
+            self._save_manifest()
+            self._vectors = None # Release the old map before deleting its file
+            for kind in ("vectors", "records"):
+                try:
+                    os.remove(self._file(kind, old))
+                except FileNotFoundError:
+                    pass
+            self._load()
+
+    # --- collection API ---
+
+    @property
+    def metadata(self) -> dict:
+        return dict(self._manifest["metadata"])
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+    def upsert(self, ids: List[str], embeddings, metadatas: List[dict] = None, documents: List[str] = None):
+        if not ids:
+            return
+        with self._lock:
+            self._append(ids, embeddings, documents or [""] * len(ids), [dict(m or {}) for m in (metadatas or [{}] * len(ids))])
+            self._maybe_compact()
+
+    add = upsert
+
+    def delete(self, ids: List[str] = None, where: dict = None):
+        with self._lock:
+            targets = list(ids or [])
+            if where:
+                targets += [i for i in self._live_ids() if matches_where(self._metadatas[self._rows[i]], where)]
+            targets = [i for i in dict.fromkeys(targets) if i in self._rows]
+            if not targets:
+                return
+            self._write_records([{"delete": i} for i in targets])
+            for chunk_id in targets:
+                self._alive[self._rows.pop(chunk_id)] = False
+            self._maybe_compact()
+
+    def _live_ids(self) -> List[str]:
+        # In insertion order, like Chroma's get()
+        return [i for row, i in enumerate(self._ids) if self._alive[row] and self._rows.get(i) == row]
+
+    def _result(self, rows: List[int], include) -> dict:
+        result = {"ids": [self._ids[r] for r in rows], "embeddings": None, "documents": None, "metadatas": None}
+        if "embeddings" in include:
+            result["embeddings"] = [self._vectors[r].copy() for r in rows]
+        if "documents" in include:
+            result["documents"] = [self._documents[r] for r in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [dict(self._metadatas[r]) for r in rows]
+        return result
+
+    def get(self, ids: List[str] = None, where: dict = None, include=("metadatas", "documents"),
+            limit: int = None, offset: int = None) -> dict:
+        with self._lock:
+            if ids is not None:
+                rows = [self._rows[i] for i in ids if i in self._rows]
+            else:
+                rows = [self._rows[i] for i in self._live_ids()]
+            if where:
+                rows = [r for r in rows if matches_where(self._metadatas[r], where)]
+            rows = rows[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+            return self._result(rows, include)
+
+    def query(self, query_embeddings, n_results: int = 10, where: dict = None,
+              include=("metadatas", "documents", "distances")) -> dict:
+        import numpy as np
+        with self._lock:
+            results = {"ids": [], "embeddings": [], "documents": [], "metadatas": [], "distances": []}
+            mask = self._alive.copy()
+            if where:
+                mask &= np.array([matches_where(m, where) for m in self._metadatas], dtype=bool)
+            matching = int(mask.sum())
+            for query in query_embeddings:
+                query = np.asarray(query, dtype=np.float32)
+                if matching == 0:
+                    rows, scores = [], np.empty(0)
+                else:
+                    # Score every row (one pass over the map) and rule out the rest, rather than copy out the candidates
+                    norms = self._norms * (np.linalg.norm(query) or 1.0)
+                    norms[norms == 0] = 1.0
+                    scores = (self._vectors @ query) / norms
+                    scores[~mask] = -np.inf
+                    n = min(n_results, matching)
+                    top = np.argpartition(-scores, n - 1)[:n] if n < len(scores) else np.arange(len(scores))
+                    top = top[np.argsort(-scores[top])]
+                    rows, scores = top.tolist(), scores[top]
+                page = self._result(rows, include)
+                for key in ("ids", "embeddings", "documents", "metadatas"):
+                    results[key].append(page[key])
+                results["distances"].append([float(1.0 - s) for s in scores]) # Cosine distance
+            for key in ("embeddings", "documents", "metadatas", "distances"):
+                if key not in include:
+                    results[key] = None
+            return results
+
+    def close(self):
+        with self._lock:
+            self._vectors = None
+
+    def remove_files(self):
+        """Deletes the store's files (after promotion to Chroma). Open maps stay readable until closed."""
+        for name in os.listdir(self.directory):
+            if name == MANIFEST_FILE or name.startswith("flat_"):
+                os.remove(os.path.join(self.directory, name))
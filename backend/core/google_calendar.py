@@ -1,10 +1,20 @@
 import os
 import datetime
+import functools
 from typing import List, Dict, Optional
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
 from googleapiclient.errors import HttpError
 
+@functools.lru_cache(maxsize=1)
+def load_discovery_document() -> str:
+    """
+    The Calendar v3 discovery document bundled with googleapiclient.
+    Loaded once per process instead of on every service build.
+    """
+    from googleapiclient.discovery_cache import get_static_doc
+    return get_static_doc("calendar", "v3")
+
 class GoogleCalendarService:
     def __init__(self, token: str):
         """
@@ -15,7 +25,7 @@ class GoogleCalendarService:
         """
         self.log_debug(f"Initializing GoogleCalendarService with token: {token[:10]}...")
         self.creds = Credentials(token=token)
-        self.service = build('calendar', 'v3', credentials=self.creds)
+        self.service = build_from_document(load_discovery_document(), credentials=self.creds)
         
         # Log Token Info to verify identity
         try:
@@ -0,0 +1,44 @@
+import threading
+
+
+class LazySingleton:
+    """
+    Module-level stand-in for a singleton that is only constructed on first use.
+
+    Modules keep exporting `mimir_ai`, `mimir_memory`, etc. so callers don't change,
+    but the heavy client construction (LLM, Chroma, TTS...) is deferred until an
+    attribute is actually accessed instead of happening at import time.
+    """
+
+    def __init__(self, factory, name: str = None):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_name", name or getattr(factory, "__name__", "singleton"))
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _resolve(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    instance = self._factory()
+                    object.__setattr__(self, "_instance", instance)
+        return instance
+
+    @property
+    def _initialized(self) -> bool:
+        return self._instance is not None
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __setattr__(self, name, value):
+        setattr(self._resolve(), name, value)
+
+    def __repr__(self):
+        state = "initialized" if self._initialized else "pending"
+        return f"<LazySingleton {self._name} ({state})>"
@@ -0,0 +1,154 @@
+import os
+import re
+import sqlite3
+from typing import Dict, List, Optional
+
+from backend.core.local_disk import sqlite_journal_mode
+
+# Words too common to say anything about which memory is meant
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be been but by can could did do does for from
+had has have he her him his how i if in into is it its just me my no not of on or our she so
+than that the their them then there these they this to up us was we were what when where which
+who why will with would you your
+""".split())
+
+# Constant from the reciprocal-rank fusion paper; dampens the weight of the top ranks
+RRF_K = 60
+
+
+def query_terms(text: str) -> List[str]:
+    terms = []
+    for term in re.findall(r"\w+", text.lower()):
+        if term not in STOPWORDS and term not in terms:
+            terms.append(term)
+    return terms
+
+
+class LexicalHit:
+    __slots__ = ("id", "text", "score", "coverage")
+
+    def __init__(self, id: str, text: str, score: float, coverage: float):
+        self.id = id
+        self.text = text
+        self.score = score # BM25, higher is better
+        self.coverage = coverage # Fraction of the query terms present in the text
+
+
+def reciprocal_rank_fusion(*rankings: List[str], k: int = RRF_K) -> List[str]:
+    """Merges ranked lists of texts: each text scores sum(1 / (k + rank)) over the lists it appears in."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, text in enumerate(ranking, start=1):
+            scores[text] = scores.get(text, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class LexicalIndex:
+    """
+    Per-user BM25 keyword index (SQLite FTS5), kept next to the vector store.
+
+    Finds exact names, order numbers and file names that embeddings blur, and answers
+    without any network call. One small database per user under `directory`, opened
+    per operation, so there is nothing to keep open or evict.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, user_id: str) -> str:
+        safe_id = "".join([c for c in user_id if c.isalnum() or c in (' ', '_', '-')]).strip()
+        return os.path.join(self.directory, f"{safe_id}.sqlite3")
+
+    def _connect(self, user_id: str, create: bool = True) -> Optional[sqlite3.Connection]:
+        path = self._path(user_id)
+        if not create and not os.path.exists(path):
+            return None
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute(f"PRAGMA journal_mode={sqlite_journal_mode(path)}")
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5("
+            " chunk_id UNINDEXED, content, created_at UNINDEXED, tokenize='unicode61')"
+        )
+        return conn
+
+    def add(self, user_id: str, ids: List[str], texts: List[str], created_at: List[int] = None):
+        created_at = created_at or [0] * len(ids)
+        conn = self._connect(user_id)
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO chunks (chunk_id, content, created_at) VALUES (?, ?, ?)",
+                    list(zip(ids, texts, created_at)),
+                )
+        finally:
+            conn.close()
+
+    def search(self, user_id: str, query: str, limit: int = 5) -> List[LexicalHit]:
+        terms = query_terms(query)
+        if not terms:
+            return []
+        conn = self._connect(user_id, create=False)
+        if conn is None:
+            return []
+        # Any term may match; BM25 ranks documents matching more (and rarer) terms higher
+        match = " OR ".join('"' + t.replace('"', '""') + '"' for t in terms)
+        try:
+            rows = conn.execute(
+                "SELECT chunk_id, content, bm25(chunks) FROM chunks WHERE chunks MATCH ? ORDER BY bm25(chunks) LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            print(f"[MIMIR] Lexical search failed for {user_id}: {e}")
+            return []
+        finally:
+            conn.close()
+
+        hits = []
+        for chunk_id, content, score in rows:
+            present = set(re.findall(r"\w+", content.lower()))
+            coverage = sum(1 for t in terms if t in present) / len(terms)
+            hits.append(LexicalHit(chunk_id, content, -score, coverage))
+        return hits
+
+    def delete(self, user_id: str, ids: List[str]):
+        conn = self._connect(user_id, create=False)
+        if conn is None:
+            return
+        try:
+            with conn:
+                # chunk_id isn't indexed, so delete in large IN batches (one table scan each)
+                for i in range(0, len(ids), 500):
+                    batch = ids[i:i + 500]
+                    conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch)
+        finally:
+            conn.close()
+
+    def count(self, user_id: str) -> int:
+        conn = self._connect(user_id, create=False)
+        if conn is None:
+            return 0
+        try:
+            return conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        finally:
+            conn.close()
+
+    def delete_user(self, user_id: str):
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(self._path(user_id) + suffix)
+            except FileNotFoundError:
+                pass
+
+
+def is_confident(hits: List[LexicalHit], margin: float) -> bool:
+    """
+    True when the keyword result is unambiguous enough to skip the embedding call:
+    the best chunk contains every query term and clearly outscores the runner-up.
+    """
+    if not hits or hits[0].coverage < 1.0:
+        return False
+    if len(hits) == 1:
+        return True
+    return hits[0].score >= margin * max(hits[1].score, 1e-9)
@@ -0,0 +1,38 @@
+import os
+from functools import lru_cache
+
+# Filesystem types whose mmap/locking SQLite's WAL mode can't rely on (Cloud Run's GCS volume is fuse.gcsfuse)
+NETWORK_FILESYSTEMS = ("fuse", "nfs", "cifs", "smb", "9p", "afs", "ceph", "glusterfs", "lustre")
+
+
+def _mounts() -> list:
+    """(mount point, filesystem type) pairs, longest mount point first; empty where /proc/mounts is missing."""
+    try:
+        with open("/proc/mounts") as f:
+            entries = [line.split()[1:3] for line in f if len(line.split()) >= 3]
+    except OSError:
+        return []
+    # /proc/mounts escapes spaces in paths as \040
+    return sorted(((point.replace("\\040", " "), fstype) for point, fstype in entries), key=lambda e: len(e[0]), reverse=True)
+
+
+@lru_cache(maxsize=256)
+def is_network_path(directory: str) -> bool:
+    """Whether `directory` lives on a network or FUSE filesystem (per /proc/mounts; False where that can't be told)."""
+    path = os.path.realpath(directory)
+    for point, fstype in _mounts():
+        if path == point or path.startswith(point.rstrip("/") + "/"):
+            return fstype.split(".")[0] in NETWORK_FILESYSTEMS
+    return False
+
+
+def sqlite_journal_mode(path: str) -> str:
+    """
+    Journal mode for a SQLite database at `path`. WAL needs a shared-memory file that
+    network filesystems (such as the GCS mount behind MIMIR_DATA_DIR) don't support,
+    so databases there use the rollback journal. MIMIR_SQLITE_WAL=1/0 overrides the check.
+    """
+    setting = os.getenv("MIMIR_SQLITE_WAL", "auto").lower()
+    if setting in ("1", "0"):
+        return "WAL" if setting == "1" else "DELETE"
+    return "DELETE" if is_network_path(os.path.dirname(os.path.abspath(path))) else "WAL"
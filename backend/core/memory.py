@@ -1,24 +1,63 @@
 import os
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import time
+import asyncio
+import uuid
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from backend.core.lazy import LazySingleton
+from backend.core.state import state_store
+from backend.core.metrics import metrics
+from backend.core.embeddings import (
+    EmbeddingCache, CachedEmbeddings, MicroBatchEmbeddings, create_embedding_backend, DEFAULT_GOOGLE_MODEL,
+)
+from backend.core.memory_store import (
+    StoreCache, open_chroma_client, close_chroma, user_collection_name,
+    MEMORY_LAYOUTS, COLLECTION_NAME, SHARED_STORE_DIRNAME,
+)
+from backend.core.packing import Candidate, mmr, pack
+from backend.core.lexical import LexicalIndex, reciprocal_rank_fusion, is_confident
+from backend.core.dedup import DuplicateFilter
+from backend.core.recall_cache import RecallCache
+from backend.core.memory_filter import MemoryFilter, combine_where
+from backend.core.chunking import Chunker
+from backend.core.compression import VectorSidecar, cosine_scores
+from backend.core.flat_store import FlatStore
+from backend.core.memory_ingest import IngestionBuffer, PendingDocument
+from backend.core.short_term import ShortTermMemory, SHORT_TERM_TYPES
+from backend.core.memory_snapshots import MemorySnapshots
 
 load_dotenv()
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+
+LEXICAL_DIRNAME = "_lexical"
+COMPRESSION_DIRNAME = "_compression"
+
+# Rows per Chroma upsert
+MAX_WRITE_BATCH = 4096
+
+# Histogram buckets for the tokens each recall packs into the prompt
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+# Bumped on every write so other workers know their open store is stale
+GENERATION_NAMESPACE = "memory_generation"
+
+def memory_base_directory() -> str:
+    # Resolve base directory (support for Cloud Run GCS mount)
+    data_dir = os.getenv("MIMIR_DATA_DIR")
+    if data_dir:
+        return os.path.join(data_dir, "mimir_memory_db")
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(current_dir))
+    return os.path.join(project_root, "mimir_memory_db")
 
 class MimirMemory:
-    def __init__(self):
-        # Resolve base directory (support for Cloud Run GCS mount)
-        data_dir = os.getenv("MIMIR_DATA_DIR")
-        if data_dir:
-            self.base_directory = os.path.join(data_dir, "mimir_memory_db")
-        else:
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            project_root = os.path.dirname(os.path.dirname(current_dir))
-            self.base_directory = os.path.join(project_root, "mimir_memory_db")
+    def __init__(self, base_directory: str = None, embedding_function=None, layout: str = None):
+        """
+        All arguments default to the environment; benchmarks and scripts pass their own
+        directory, embedder (used as-is, without the cache) and layout.
+        """
+        self.base_directory = base_directory or memory_base_directory()
         
         # Ensure directory exists for Cloud Run (ephemeral)
         if not os.path.exists(self.base_directory):
@@ -27,73 +66,468 @@ class MimirMemory:
         
         print(f"[MIMIR] Memory Base Directory: {self.base_directory}")
         
-        self.embedding_function = GoogleGenerativeAIEmbeddings(
-            model="models/text-embedding-004",
-            google_api_key=GOOGLE_API_KEY
+        self.layout = layout or os.getenv("MIMIR_MEMORY_LAYOUT", "per_user").lower()
+        if self.layout not in MEMORY_LAYOUTS:
+            print(f"[WARN] Unknown MIMIR_MEMORY_LAYOUT '{self.layout}', using per_user")
+            self.layout = "per_user"
+        if self.layout != "per_user" and os.getenv("MIMIR_STATE_BACKEND", "memory").lower() != "memory":
+            # The shared client keeps one in-process index; other workers' writes only show up after a restart
+            print(f"[WARN] MIMIR_MEMORY_LAYOUT={self.layout} assumes a single worker; recall may miss other workers' writes")
+        self._shared_client = None
+        self._shared_client_lock = threading.Lock()
+        self._held_locks = threading.local()
+
+        # Optionally work on local disk and keep only snapshots on MIMIR_DATA_DIR (a bucket mount on Cloud Run)
+        self.snapshots = None
+        local_directory = os.getenv("MIMIR_LOCAL_MEMORY_DIR") if base_directory is None else None
+        if local_directory and self.layout != "per_user":
+            print(f"[WARN] MIMIR_LOCAL_MEMORY_DIR only applies to MIMIR_MEMORY_LAYOUT=per_user; ignoring it")
+        elif local_directory:
+            os.makedirs(local_directory, exist_ok=True)
+            self.snapshots = MemorySnapshots(
+                remote_dir=self.base_directory,
+                local_dir=local_directory,
+                lock=self._write_lock,
+                interval=float(os.getenv("MIMIR_SNAPSHOT_SECONDS", "300")),
+                keep=int(os.getenv("MIMIR_SNAPSHOT_KEEP", "3")),
+            )
+            self.base_directory = local_directory
+            print(f"[MIMIR] Working copy at {local_directory}, snapshots to {self.snapshots.remote_dir}")
+            self.snapshots.start()
+
+        if embedding_function is not None:
+            self.embedding_function = embedding_function
+            self.embedding_model = getattr(embedding_function, "model_name", type(embedding_function).__name__)
+        else:
+            self.embedding_function, self.embedding_model = create_embedding_backend()
+            print(f"[MIMIR] Embedding model: {self.embedding_model}")
+        self.embedding_batcher = None
+        if embedding_function is None and os.getenv("MIMIR_EMBED_BATCH", "1") != "0":
+            # Concurrent recalls and flushes (across users) share embedding calls; cache hits never wait here
+            self.embedding_batcher = MicroBatchEmbeddings(
+                self.embedding_function,
+                max_batch=int(os.getenv("MIMIR_EMBED_BATCH_MAX", "100")),
+                max_wait_ms=float(os.getenv("MIMIR_EMBED_BATCH_WAIT_MS", "5")),
+                max_in_flight=int(os.getenv("MIMIR_EMBED_BATCH_CONCURRENCY", "4")),
+            )
+            self.embedding_function = self.embedding_batcher
+        if embedding_function is None and os.getenv("MIMIR_EMBED_CACHE", "1") != "0":
+            # Identical text (re-uploads, repeated greetings, daily prompts) is only embedded once
+            cache = EmbeddingCache(
+                os.getenv("MIMIR_EMBED_CACHE_PATH") or os.path.join(self.base_directory, "embedding_cache.sqlite3"),
+                max_entries=int(os.getenv("MIMIR_EMBED_CACHE_MAX_ENTRIES", "200000")),
+                ram_entries=int(os.getenv("MIMIR_EMBED_CACHE_RAM_ENTRIES", "2048")),
+            )
+            self.embedding_function = CachedEmbeddings(self.embedding_function, self.embedding_model, cache)
+        # Open per-user stores, bounded by count and closed when idle
+        # (In the shared layouts a "store" is just a collection handle on the one client)
+        self.stores = StoreCache(
+            self._open_store,
+            closer=self._close_store if self.layout == "per_user" else (lambda store: None),
+            capacity=int(os.getenv("MIMIR_MEMORY_MAX_OPEN_STORES", "64")),
+            idle_seconds=float(os.getenv("MIMIR_MEMORY_STORE_IDLE_SECONDS", "900")),
         )
-        self.vector_stores = {}
 
-    def get_vector_store(self, user_id: str):
-        """
-        Returns the vector store for a specific user.
-        All users now use subdirectories.
-        """
+        # Local keyword index kept alongside the vectors (see recall)
+        self.lexical = None
+        if os.getenv("MIMIR_LEXICAL_INDEX", "1") != "0":
+            self.lexical = LexicalIndex(os.path.join(self.base_directory, LEXICAL_DIRNAME))
+        self.lexical_fast_path = os.getenv("MIMIR_LEXICAL_FAST_PATH", "1") != "0"
+        self.lexical_margin = float(os.getenv("MIMIR_LEXICAL_MARGIN", "1.5"))
+        # Recall fetches this many times k candidates, then keeps the k most relevant diverse ones
+        self.overfetch = max(1, int(os.getenv("MIMIR_RECALL_OVERFETCH", "4")))
+        # Repeated queries ("good morning", "what's on today") reuse their candidates until the user's memory changes
+        self.recall_cache = None
+        if int(os.getenv("MIMIR_RECALL_CACHE_SIZE", "1024")) > 0:
+            self.recall_cache = RecallCache(int(os.getenv("MIMIR_RECALL_CACHE_SIZE", "1024")))
+
+        # Users whose collection holds PCA-reduced vectors (compress_memory) keep int8 full
+        # vectors here; recall over-fetches this many times k from Chroma and rescores them
+        self.compression = VectorSidecar(os.path.join(self.base_directory, COMPRESSION_DIRNAME))
+        self.rescore_factor = max(1, int(os.getenv("MIMIR_RESCORE_FACTOR", "4")))
+
+        # New per-user stores start as a memory-mapped flat file (no Chroma client, database or
+        # index to open) and move to Chroma once they hold more than this many chunks; 0 disables
+        self.flat_max_chunks = int(os.getenv("MIMIR_FLAT_STORE_MAX_CHUNKS", "0")) if self.layout == "per_user" else 0
+
+        # The last turns of each conversation, searched in RAM alongside the stores
+        self.short_term = None
+        if int(os.getenv("MIMIR_SHORT_TERM_TURNS", "20")) > 0:
+            self.short_term = ShortTermMemory(
+                capacity=int(os.getenv("MIMIR_SHORT_TERM_TURNS", "20")),
+                max_age=float(os.getenv("MIMIR_SHORT_TERM_SECONDS", "3600")),
+                max_users=int(os.getenv("MIMIR_SHORT_TERM_USERS", "1024")),
+            )
+
+        # Chunking by source type (chat turns whole, PDFs by page, spreadsheets by row block...)
+        self.chunker = Chunker()
+
+        # Per-user exact/near-duplicate suppression of incoming chunks
+        self.dedup = None
+        if os.getenv("MIMIR_DEDUP", "1") != "0":
+            self.dedup = DuplicateFilter(
+                os.path.join(self.base_directory, "_dedup.sqlite3"),
+                max_distance=int(os.getenv("MIMIR_DEDUP_MAX_DISTANCE", "6")),
+            )
+
+        # Write-behind ingestion: remember() returns immediately, chunks are embedded in batches
+        self.ingest = None
+        if os.getenv("MIMIR_INGEST_WRITE_BEHIND", "1") != "0":
+            self.ingest = IngestionBuffer(
+                self,
+                batch_size=int(os.getenv("MIMIR_INGEST_BATCH_SIZE", "64")),
+                flush_interval=float(os.getenv("MIMIR_INGEST_FLUSH_SECONDS", "2.0")),
+            )
+
+    @staticmethod
+    def _safe_id(user_id: str) -> str:
         # Sanitize user_id for directory name
-        safe_id = "".join([c for c in user_id if c.isalnum() or c in (' ', '_', '-')]).strip()
-        
+        return "".join([c for c in user_id if c.isalnum() or c in (' ', '_', '-')]).strip()
+
+    def _persist_dir(self, user_id: str) -> str:
         # All users use subdirectories now
-        persist_dir = os.path.join(self.base_directory, safe_id)
-        print(f"[MIMIR] Accessing Memory for {user_id} at {persist_dir}")
+        return os.path.join(self.base_directory, self._safe_id(user_id))
 
-        if user_id not in self.vector_stores:
-            self.vector_stores[user_id] = Chroma(
-                persist_directory=persist_dir,
+    @contextmanager
+    def _write_lock(self, user_id: str):
+        """The user's cross-worker write lock; re-entrant within a thread (opening a store may hydrate it)."""
+        held = self._held_locks.__dict__.setdefault("users", set())
+        if user_id in held:
+            yield
+            return
+        with state_store.lock(f"memory:{user_id}"):
+            held.add(user_id)
+            try:
+                yield
+            finally:
+                held.discard(user_id)
+
+    def mark_changed(self, user_id: str):
+        """Flags the user's local files for the next snapshot; call under their write lock, before writing."""
+        if self.snapshots:
+            self.snapshots.mark_dirty(self._safe_id(user_id), user_id)
+
+    def hydrate_all(self) -> int:
+        """Brings every user's local working copy up to date (maintenance scripts). Returns users copied."""
+        if not self.snapshots:
+            return 0
+        return sum(self.snapshots.hydrate(user_id, safe_id) for safe_id, user_id in self.snapshots.remote_users().items())
+
+    def _get_shared_client(self):
+        with self._shared_client_lock:
+            if self._shared_client is None:
+                import chromadb
+                path = os.path.join(self.base_directory, SHARED_STORE_DIRNAME)
+                self._shared_client = chromadb.PersistentClient(path=path)
+                print(f"[MIMIR] Shared memory store ({self.layout}) at {path}")
+            return self._shared_client
+
+    def _uses_flat_store(self, user_id: str) -> bool:
+        directory = self._persist_dir(user_id)
+        if FlatStore.exists(directory):
+            return True # Until promoted, even if the flat store has since been disabled
+        return self.flat_max_chunks > 0 and not os.path.exists(os.path.join(directory, "chroma.sqlite3"))
+
+    def _open_chroma(self, user_id: str, collection_metadata: dict):
+        from langchain_chroma import Chroma
+        return Chroma(
+            client=open_chroma_client(self._persist_dir(user_id)),
+            embedding_function=self.embedding_function,
+            collection_name=COLLECTION_NAME,
+            collection_metadata=collection_metadata,
+        )
+
+    @staticmethod
+    def _close_store(store):
+        if isinstance(store, FlatStore):
+            store.close()
+        else:
+            close_chroma(store)
+
+    def _open_store(self, user_id: str):
+        from langchain_chroma import Chroma
+        # New collections record the model their vectors come from
+        collection_metadata = {"embedding_model": self.embedding_model}
+        if self.snapshots:
+            self.snapshots.hydrate(user_id, self._safe_id(user_id))
+        if self.layout == "per_user" and self._uses_flat_store(user_id):
+            store = FlatStore(self._persist_dir(user_id), collection_metadata)
+        elif self.layout == "per_user":
+            store = self._open_chroma(user_id, collection_metadata)
+        elif self.layout == "collections":
+            store = Chroma(
+                client=self._get_shared_client(),
                 embedding_function=self.embedding_function,
-                collection_name="mimir_knowledge"
+                collection_name=user_collection_name(user_id),
+                collection_metadata={**collection_metadata, "user_id": user_id},
+            )
+        else:
+            store = Chroma(
+                client=self._get_shared_client(),
+                embedding_function=self.embedding_function,
+                collection_name=COLLECTION_NAME,
+                collection_metadata=collection_metadata,
             )
-        
-        return self.vector_stores[user_id]
+
+        stored_model = (store._collection.metadata or {}).get("embedding_model", DEFAULT_GOOGLE_MODEL)
+        if stored_model != self.embedding_model:
+            print(f"[WARN] Memory for {user_id} was embedded with {stored_model}, not {self.embedding_model}; "
+                  f"recall will be poor until `python -m backend.scripts.reindex_memory` is run")
+        self.compression.bind(user_id, store._collection.metadata)
+        return store
+
+    def _tenant_filter(self, user_id: str):
+        """Metadata filter that scopes queries to one user in the shared-collection layout."""
+        return {"user_id": user_id} if self.layout == "shared" else None
+
+    def _where(self, user_id: str, filters: MemoryFilter = None):
+        """Chroma where clause for the user's chunks matching `filters`."""
+        return combine_where(self._tenant_filter(user_id), *(filters.conditions() if filters else []))
+
+    def use_store(self, user_id: str):
+        """
+        Context manager yielding the vector store for a specific user.
+        The store stays open (and won't be evicted) until the block exits.
+        """
+        generation = state_store.get(GENERATION_NAMESPACE, user_id, 0)
+        return self.stores.lease(user_id, generation)
+
+    def _mark_written(self, user_id: str, store):
+        """Bumps the user's generation; `store`, which made the write, is already up to date."""
+        generation = state_store.incr(GENERATION_NAMESPACE, user_id)
+        self.stores.set_generation(user_id, generation, store)
 
     def remember(self, text: str, user_id: str = "Matt Burchett", metadata: dict = None):
         """
         Stores a piece of information in the user's vector database.
         Splits large text into chunks for better retrieval.
+        With write-behind enabled this only queues the text; the ingestion
+        buffer embeds and writes it in a batch shortly after.
         """
-        if metadata is None:
-            metadata = {}
+        metadata = dict(metadata or {})
         
         # Ensure user_id is in metadata
         metadata["user_id"] = user_id
-        
-        # Split text into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=100,
-            length_function=len,
-            is_separator_regex=False,
-        )
-        texts = text_splitter.split_text(text)
-        
-        docs = [Document(page_content=t, metadata=metadata) for t in texts]
-        
-        store = self.get_vector_store(user_id)
-        store.add_documents(docs)
-        print(f"MIMIR remembered for {user_id}: {len(docs)} chunks.")
+        # Lets recall be bounded in time (see MemoryFilter); importers may pass the original time
+        metadata.setdefault("created_at", int(time.time()))
 
-    def recall(self, query: str, user_id: str = "Matt Burchett", k: int = 3, max_chars: int = 1500000) -> str:
+        if self.recall_cache:
+            # Queued text is recalled through the pending matches, so cached results are outdated now
+            self.recall_cache.invalidate(user_id)
+        if self.short_term and metadata.get("type") in SHORT_TERM_TYPES:
+            self.short_term.add(user_id, text, metadata)
+        if self.ingest:
+            self.ingest.add(user_id, text, metadata)
+            return
+        self._ingest_batch([PendingDocument(user_id, text, metadata)])
+
+    def _split(self, text: str, metadata: dict = None) -> list:
+        """(chunk text, chunk metadata) pairs, split the way the memory's source type calls for."""
+        metadata = metadata or {}
+        return [(chunk, {**metadata, **extra} if extra else metadata) for chunk, extra in self.chunker.split(text, metadata)]
+
+    def _ingest_batch(self, docs: list, report=None) -> int:
         """
-        Retrieves relevant information for the user.
+        Splits, embeds and stores a batch of pending documents (possibly for several users)
+        using a single embedding call. Returns the number of chunks written.
+
+        Each user's chunks are written separately. With `report` a failed write doesn't stop
+        the others: report(user_id, chunks written, error or None) is called as each user's
+        write finishes. Without it the first failure is raised. A failed embedding call is
+        always raised, since no user's chunks were written.
         """
-        store = self.get_vector_store(user_id)
-        results = store.similarity_search(query, k=k)
-        if not results:
-            return ""
-        
+        chunks = []
+        for doc in docs:
+            for text, metadata in self._split(doc.text, doc.metadata):
+                chunks.append((doc.user_id, text, metadata))
+        if self.dedup and chunks:
+            # Re-uploads and repeated turns are neither embedded nor stored again
+            chunks, suppressed = self.dedup.filter(chunks)
+            for kind, count in suppressed.items():
+                if count:
+                    metrics.incr(f"memory.dedup.{kind}", count)
+                    metrics.incr("memory.dedup.embeddings_saved", count)
+        users = list(dict.fromkeys(doc.user_id for doc in docs))
+        embeddings = self.embedding_function.embed_documents([c[1] for c in chunks]) if chunks else []
+
+        by_user = {user_id: [] for user_id in users} # Users whose documents were all duplicates write nothing
+        for (user_id, text, metadata), embedding in zip(chunks, embeddings):
+            by_user[user_id].append((text, metadata, embedding))
+            if self.short_term and metadata.get("type") in SHORT_TERM_TYPES:
+                self.short_term.attach(user_id, text, embedding) # Recent turns become searchable by vector
+        written = 0
+        for user_id, items in by_user.items():
+            try:
+                if items:
+                    self._write_chunks(user_id, [i[0] for i in items], [i[1] for i in items], [i[2] for i in items])
+                    print(f"MIMIR remembered for {user_id}: {len(items)} chunks.")
+            except Exception as e:
+                if report is None:
+                    raise
+                report(user_id, 0, e)
+                continue
+            written += len(items)
+            if report is not None:
+                report(user_id, len(items), None)
+        return written
+
+    def _write_chunks(self, user_id: str, texts: list, metadatas: list, embeddings: list, ids: list = None) -> list:
+        """
+        Writes pre-embedded chunks to the user's store. Returns the chunk IDs
+        (new ones unless `ids` is given, e.g. when importing).
+        """
+        replacing = ids is not None
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        # Writes are serialized per user across workers
+        with self._write_lock(user_id), self.use_store(user_id) as store:
+            self.mark_changed(user_id)
+            existing = store._collection.get(ids=ids, include=[])["ids"] if replacing else []
+            projection = self.compression.projection(user_id)
+            if projection is not None:
+                # Chroma gets the reduced vectors, the sidecar the full ones for rescoring
+                self.compression.put(user_id, ids, embeddings)
+                embeddings = projection.project(embeddings).tolist()
+            # Chroma rejects oversized batches (about 5k rows with SQLite)
+            for i in range(0, len(ids), MAX_WRITE_BATCH):
+                store._collection.upsert(
+                    ids=ids[i:i + MAX_WRITE_BATCH], embeddings=embeddings[i:i + MAX_WRITE_BATCH],
+                    metadatas=metadatas[i:i + MAX_WRITE_BATCH], documents=texts[i:i + MAX_WRITE_BATCH],
+                )
+            if self.lexical:
+                if existing:
+                    self.lexical.delete(user_id, existing)
+                self.lexical.add(user_id, ids, texts, [m.get("created_at", 0) for m in metadatas])
+            if self.dedup:
+                self.dedup.add(user_id, ids, texts)
+            self._mark_written(user_id, store)
+            if isinstance(store, FlatStore) and store.count() > self.flat_max_chunks:
+                self._promote(user_id, store)
+        return ids
+
+    def _promote(self, user_id: str, store: FlatStore):
+        """
+        Moves a user's flat store into Chroma once it has outgrown brute-force search.
+        Caller holds the user's write lock and a lease on `store`. The flat files are only
+        removed once Chroma holds every chunk, and an open flat store takes precedence, so
+        an interrupted promotion is simply repeated on the next write.
+        """
+        start = time.perf_counter()
+        count = store.count()
+        chroma = self._open_chroma(user_id, store.metadata)
+        try:
+            for ids, embeddings, documents, metadatas in store.pages(MAX_WRITE_BATCH):
+                chroma._collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        finally:
+            close_chroma(chroma)
+        store.remove_files()
+        # Our leased store closes on release; every worker reopens the user's store as Chroma
+        self.stores.discard(user_id)
+        state_store.incr(GENERATION_NAMESPACE, user_id)
+        metrics.incr("memory.store.promoted")
+        print(f"[MIMIR] Moved memory for {user_id} from the flat store to Chroma ({count} chunks, "
+              f"{time.perf_counter() - start:.1f}s)")
+
+    def delete_chunks(self, user_id: str, ids: list):
+        """Removes individual chunks from the user's store and side indexes."""
+        if not ids:
+            return
+        with self._write_lock(user_id), self.use_store(user_id) as store:
+            self.mark_changed(user_id)
+            store._collection.delete(ids=ids)
+            if self.compression.projection(user_id) is not None:
+                self.compression.delete(user_id, ids)
+            if self.lexical:
+                self.lexical.delete(user_id, ids)
+            if self.dedup:
+                self.dedup.delete(user_id, ids)
+            self._mark_written(user_id, store)
+
+    def rebuild_lexical(self, user_id: str) -> int:
+        """Rebuilds the user's keyword index from their vector store (backfill). Returns chunks indexed."""
+        if not self.lexical:
+            return 0
+        indexed = 0
+        with self._write_lock(user_id), self.use_store(user_id) as store:
+            self.mark_changed(user_id)
+            self.lexical.delete_user(user_id)
+            offset = 0
+            while True:
+                page = store._collection.get(
+                    where=self._tenant_filter(user_id), include=["documents", "metadatas"], limit=500, offset=offset
+                )
+                if not page["ids"]:
+                    break
+                created_at = [(m or {}).get("created_at", 0) for m in page["metadatas"]]
+                self.lexical.add(user_id, page["ids"], page["documents"], created_at)
+                indexed += len(page["ids"])
+                offset += len(page["ids"])
+        return indexed
+
+    def flush(self):
+        """Writes any buffered memories now."""
+        if self.ingest:
+            self.ingest.flush()
+
+    def close(self):
+        """Flushes buffered memories and stops background work (graceful shutdown)."""
+        if self.ingest:
+            self.ingest.stop()
+        if isinstance(self.embedding_function, CachedEmbeddings):
+            self.embedding_function.cache.flush_touches()
+        self.stores.close_all()
+        if self.snapshots:
+            self.snapshots.stop()
+        if self._shared_client is not None:
+            self._shared_client._system.stop()
+
+    def _embed_query(self, query: str) -> list:
+        with metrics.timer("memory.recall.embed"):
+            return self.embedding_function.embed_query(query)
+
+    def _search(self, user_id: str, vector: list, k: int, filters: MemoryFilter = None) -> list:
+        """Top-k vector matches as candidates, with their embeddings for diversity ranking."""
+        with metrics.timer("memory.recall.search"), self.use_store(user_id) as store:
+            projection = self.compression.projection(user_id)
+            if projection is not None:
+                return self._search_compressed(user_id, store, projection, vector, k, filters)
+            result = store._collection.query(
+                query_embeddings=[vector], n_results=k, where=self._where(user_id, filters),
+                include=["documents", "embeddings"],
+            )
+        documents = result["documents"][0] if result["documents"] else []
+        embeddings = result["embeddings"][0] if result.get("embeddings") is not None else [None] * len(documents)
+        return [Candidate(d, list(e) if e is not None else None) for d, e in zip(documents, embeddings)]
+
+    def _search_compressed(self, user_id: str, store, projection, vector: list, k: int, filters: MemoryFilter = None) -> list:
+        """Over-fetches from the reduced vectors, then re-ranks by cosine against the full (int8) vectors."""
+        import numpy as np
+        result = store._collection.query(
+            query_embeddings=[projection.project([vector])[0].tolist()], n_results=k * self.rescore_factor,
+            where=self._where(user_id, filters), include=["documents"],
+        )
+        ids = result["ids"][0] if result["ids"] else []
+        documents = result["documents"][0] if result["documents"] else []
+        full = self.compression.get(user_id, ids)
+        scored = [(i, d) for i, d in zip(ids, documents) if i in full]
+        if not scored:
+            return [Candidate(d) for d in documents[:k]]
+        scores = cosine_scores(np.stack([full[i] for i, _ in scored]), vector)
+        order = np.argsort(-scores)[:k]
+        return [Candidate(scored[n][1], full[scored[n][0]].tolist()) for n in order]
+
+    def _pending_matches(self, user_id: str, query: str, k: int, results: list, filters: MemoryFilter = None) -> list:
+        # Memories still waiting in the write-behind buffer aren't searchable yet; match them by terms
+        if not self.ingest:
+            return []
+        known = {c.text for c in results}
+        pending = self.ingest.search_pending(user_id, query, limit=k, accept=filters.matches if filters else None)
+        return [Candidate(t, relevance=0.5) for t in pending if t not in known]
+
+    def _format_context(self, results: list, max_chars: int) -> str:
         context_parts = []
         total_chars = 0
         
-        for doc in results:
-            content = doc.page_content
+        for content in results:
             if total_chars + len(content) > max_chars:
                 remaining = max_chars - total_chars
                 if remaining > 100:
@@ -104,6 +538,214 @@ class MimirMemory:
         
         return "\n".join(context_parts)
 
+    def _lexical_search(self, user_id: str, query: str, k: int, filters: MemoryFilter = None) -> list:
+        if not self.lexical:
+            return []
+        with metrics.timer("memory.recall.lexical"):
+            if not filters:
+                return self.lexical.search(user_id, query, limit=k)
+            # The keyword index has no metadata: over-fetch, then keep the hits Chroma says match
+            hits = self.lexical.search(user_id, query, limit=k * 4)
+            if not hits:
+                return hits
+            with self.use_store(user_id) as store:
+                allowed = set(store._collection.get(ids=[h.id for h in hits], where=self._where(user_id, filters), include=[])["ids"])
+            return [h for h in hits if h.id in allowed][:k]
+
+    def _lexical_fast_path(self, hits: list) -> bool:
+        """An unambiguous keyword hit answers the query without an embedding round trip."""
+        if self.lexical_fast_path and is_confident(hits, self.lexical_margin):
+            metrics.incr("memory.recall.lexical_fast_path")
+            return True
+        return False
+
+    @staticmethod
+    def _ranked(candidates: list) -> list:
+        # Relevance falls linearly with rank, so MMR can trade it off against similarity
+        for i, candidate in enumerate(candidates):
+            candidate.relevance = 1.0 - i / len(candidates)
+        return candidates
+
+    def _fuse(self, vector_results: list, hits: list, recent: list = ()) -> list:
+        if not hits and not recent:
+            return self._ranked(vector_results)
+        by_text = {h.text: Candidate(h.text) for h in hits}
+        by_text.update((c.text, c) for c in recent)
+        by_text.update((c.text, c) for c in vector_results) # Prefer the candidate that carries a vector
+        fused = reciprocal_rank_fusion([c.text for c in recent], [c.text for c in vector_results], [h.text for h in hits])
+        return self._ranked([by_text[t] for t in fused])
+
+    def _recent_matches(self, user_id: str, query: str, vector: list, fetch_k: int, filters: MemoryFilter = None) -> list:
+        """The user's recent turns related to the query (by vector if one is given), as candidates."""
+        if not self.short_term:
+            return []
+        # At most k of them: fused with the stores' results, a full over-fetch of recent turns would crowd those out
+        limit = max(1, fetch_k // self.overfetch)
+        with metrics.timer("memory.recall.short_term"):
+            matches = self.short_term.search(user_id, query, vector, limit=limit, accept=filters.matches if filters else None)
+        metrics.incr("memory.recall.short_term_hits", len(matches))
+        return [Candidate(turn.text, list(turn.vector) if turn.vector is not None else None) for turn, _ in matches]
+
+    def _candidates(self, query: str, user_id: str, fetch_k: int, filters: MemoryFilter = None) -> list:
+        """
+        Over-fetched, relevance-ranked candidates for the query, restricted to `filters`.
+        Keyword (BM25) and vector results are fused by reciprocal rank; a confident keyword
+        match skips the embedding call.
+        """
+        hits = self._lexical_search(user_id, query, fetch_k, filters)
+        if self._lexical_fast_path(hits):
+            candidates = self._fuse([], hits, self._recent_matches(user_id, query, None, fetch_k, filters))
+        else:
+            vector = self._embed_query(query)
+            recent = self._recent_matches(user_id, query, vector, fetch_k, filters)
+            candidates = self._fuse(self._search(user_id, vector, fetch_k, filters), hits, recent)
+        return candidates + self._pending_matches(user_id, query, fetch_k, candidates, filters)
+
+    @staticmethod
+    def _cache_variant(fetch_k: int, filters: MemoryFilter = None) -> tuple:
+        return (fetch_k, filters.key() if filters else None)
+
+    def _cached_candidates(self, query: str, user_id: str, fetch_k: int, filters: MemoryFilter = None) -> list:
+        if not self.recall_cache:
+            return self._candidates(query, user_id, fetch_k, filters)
+        # Read the generation first: a write that lands while we search makes this entry stale
+        generation = state_store.get(GENERATION_NAMESPACE, user_id, 0)
+        variant = self._cache_variant(fetch_k, filters)
+        candidates = self.recall_cache.get(user_id, query, variant, generation)
+        if candidates is not None:
+            metrics.incr("memory.recall.cache_hit")
+            return candidates
+        candidates = self._candidates(query, user_id, fetch_k, filters)
+        self.recall_cache.put(user_id, query, variant, generation, candidates)
+        return candidates
+
+    def _select(self, candidates: list, k: int, token_budget: int = None, max_chars: int = 1500000):
+        """
+        Picks up to k diverse candidates (MMR) and packs them into the token budget.
+        Returns (context, report) where the report says what was used and dropped.
+        """
+        picked, redundant = mmr(candidates, k)
+        texts, report = pack(picked, token_budget)
+        report.update({
+            "candidates": len(candidates),
+            "dropped_redundant": redundant,
+            "dropped_rank": len(candidates) - len(picked) - redundant,
+        })
+        metrics.observe_value("memory.recall.tokens_used", report["tokens_used"], TOKEN_BUCKETS)
+        metrics.incr("memory.recall.dropped_redundant", redundant)
+        metrics.incr("memory.recall.dropped_budget", report["dropped_budget"])
+        metrics.incr("memory.recall.truncated", report["truncated"])
+        print(f"[MIMIR] Recall packed {report['chunks']}/{report['candidates']} candidates, "
+              f"{report['tokens_used']}/{token_budget or '-'} tokens "
+              f"(dropped {redundant} redundant, {report['dropped_budget']} over budget, {report['truncated']} truncated)")
+        return self._format_context(texts, max_chars), report
+
+    def search(self, query: str, user_id: str = "Matt Burchett", k: int = 3, filters=None) -> list:
+        """Ranked, de-duplicated memory texts for the query (no budget applied)."""
+        picked, _ = mmr(self._cached_candidates(query, user_id, k * self.overfetch, MemoryFilter.of(filters)), k)
+        return [c.text for c in picked]
+
+    def recall(self, query: str, user_id: str = "Matt Burchett", k: int = 3, max_chars: int = 1500000,
+               token_budget: int = None, with_report: bool = False, filters=None):
+        """
+        Retrieves relevant information for the user.
+        Over-fetches k * MIMIR_RECALL_OVERFETCH candidates, keeps up to k diverse ones and
+        packs them into `token_budget` tokens (if given). With `with_report` returns
+        (context, report). `filters` (a MemoryFilter or a dict of its arguments, e.g.
+        {"source": "lease.pdf"} or {"kind": "conversation", "since": "2025-11-24"}) is
+        applied inside the vector search rather than to its results.
+        Blocking; async callers should use arecall.
+        """
+        filters = MemoryFilter.of(filters)
+        with metrics.timer("memory.recall.total"):
+            candidates = self._cached_candidates(query, user_id, k * self.overfetch, filters)
+            context, report = self._select(candidates, k, token_budget, max_chars)
+        return (context, report) if with_report else context
+
+    async def arecall(self, query: str, user_id: str = "Matt Burchett", k: int = 3, max_chars: int = 1500000,
+                      timeout: float = None, token_budget: int = None, with_report: bool = False, filters=None):
+        """
+        Async recall for the event loop. The keyword lookup, embedding call and vector search
+        each run in a worker thread against a shared deadline of `timeout` seconds. If the
+        deadline passes (or a step fails) the turn gets whatever was found so far, which
+        includes the keyword matches once that step has finished. Partial results are not
+        cached; complete ones are, as in recall. `filters` as in recall.
+        """
+        filters = MemoryFilter.of(filters)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+
+        def remaining():
+            return None if deadline is None else max(0.0, deadline - loop.time())
+
+        fetch_k = k * self.overfetch
+        start = time.perf_counter()
+        generation = None
+        if self.recall_cache:
+            generation = state_store.get(GENERATION_NAMESPACE, user_id, 0)
+            cached = self.recall_cache.get(user_id, query, self._cache_variant(fetch_k, filters), generation)
+            if cached is not None:
+                metrics.incr("memory.recall.cache_hit")
+                context, report = await asyncio.to_thread(self._select, cached, k, token_budget, max_chars)
+                metrics.observe("memory.recall.total", (time.perf_counter() - start) * 1000)
+                return (context, report) if with_report else context
+
+        hits, candidates, recent = [], [], []
+        complete = False
+        step = "lexical"
+        try:
+            hits = await asyncio.wait_for(asyncio.to_thread(self._lexical_search, user_id, query, fetch_k, filters), remaining())
+            if self._lexical_fast_path(hits):
+                candidates = self._fuse([], hits, self._recent_matches(user_id, query, None, fetch_k, filters))
+            else:
+                step = "embed"
+                vector = await asyncio.wait_for(asyncio.to_thread(self._embed_query, query), remaining())
+                recent = self._recent_matches(user_id, query, vector, fetch_k, filters)
+                step = "search"
+                vector_results = await asyncio.wait_for(asyncio.to_thread(self._search, user_id, vector, fetch_k, filters), remaining())
+                candidates = self._fuse(vector_results, hits, recent)
+            complete = True
+        except asyncio.TimeoutError as e:
+            if deadline is None:
+                # No deadline of ours: a step itself timed out (e.g. the embedding API); a failure like any other
+                print(f"[MIMIR] Recall for {user_id} failed during {step}: {e or 'timed out'}")
+            else:
+                metrics.observe("memory.recall.timeouts", (time.perf_counter() - start) * 1000)
+                print(f"[MIMIR] Recall for {user_id} timed out during {step} after {timeout:.1f}s; returning partial context")
+        except Exception as e:
+            print(f"[MIMIR] Recall for {user_id} failed during {step}: {e}")
+        if not candidates:
+            # The recent turns are in RAM, so a partial result still gets them (by vector if the embedding arrived)
+            candidates = self._fuse([], hits, recent or self._recent_matches(user_id, query, None, fetch_k, filters))
+        candidates = candidates + self._pending_matches(user_id, query, fetch_k, candidates, filters)
+        if complete and self.recall_cache:
+            self.recall_cache.put(user_id, query, self._cache_variant(fetch_k, filters), generation, candidates)
+
+        # MMR and packing are CPU work over the candidate vectors: keep them off the event loop
+        context, report = await asyncio.to_thread(self._select, candidates, k, token_budget, max_chars)
+        metrics.observe("memory.recall.total", (time.perf_counter() - start) * 1000)
+        return (context, report) if with_report else context
+
+    def stats(self) -> dict:
+        """Operational metrics for the memory subsystem."""
+        stats = {"layout": self.layout, "stores": self.stores.stats()}
+        if isinstance(self.embedding_function, CachedEmbeddings):
+            stats["embedding_cache"] = self.embedding_function.stats()
+        if self.embedding_batcher:
+            stats["embedding_batcher"] = self.embedding_batcher.stats()
+        if self.ingest:
+            stats["ingestion"] = self.ingest.stats()
+        if self.recall_cache:
+            stats["recall_cache"] = self.recall_cache.stats()
+        if self.short_term:
+            stats["short_term"] = self.short_term.stats()
+        if self.snapshots:
+            stats["snapshots"] = self.snapshots.stats()
+        stats["latency_ms"] = metrics.snapshot("memory.")
+        stats["counters"] = metrics.counters("memory.")
+        stats["values"] = metrics.values("memory.")
+        return stats
+
     def delete_memory(self, user_id: str):
         """
         Deletes the memory for a specific user.
@@ -112,23 +754,55 @@ class MimirMemory:
             print("[WARN] Cannot delete legacy user memory (Matt Burchett)")
             return False
 
-        safe_id = "".join([c for c in user_id if c.isalnum() or c in (' ', '_', '-')]).strip()
-        persist_dir = os.path.join(self.base_directory, safe_id)
+        persist_dir = self._persist_dir(user_id)
         
-        # Remove from cache
-        if user_id in self.vector_stores:
-            del self.vector_stores[user_id]
-            
-        # Delete directory
-        import shutil
-        if os.path.exists(persist_dir):
-            try:
-                shutil.rmtree(persist_dir)
-                print(f"[MIMIR] Deleted memory for {user_id}")
-                return True
-            except Exception as e:
-                print(f"[ERROR] Failed to delete memory for {user_id}: {e}")
-                return False
-        return True
+        if self.ingest:
+            self.ingest.discard(user_id)
+        if self.short_term:
+            self.short_term.discard(user_id)
+
+        with self._write_lock(user_id):
+            # Close the open store before removing its files
+            self.stores.discard(user_id)
+            if self.lexical:
+                self.lexical.delete_user(user_id)
+            if self.dedup:
+                self.dedup.delete_user(user_id)
+            self.compression.drop(user_id)
+            if self.snapshots:
+                self.snapshots.delete(self._safe_id(user_id))
+            state_store.incr(GENERATION_NAMESPACE, user_id)
+            if self.recall_cache:
+                self.recall_cache.invalidate(user_id)
+
+            if self.layout != "per_user":
+                return self._delete_shared(user_id)
+                
+            # Delete directory
+            import shutil
+            if os.path.exists(persist_dir):
+                try:
+                    shutil.rmtree(persist_dir)
+                    print(f"[MIMIR] Deleted memory for {user_id}")
+                    return True
+                except Exception as e:
+                    print(f"[ERROR] Failed to delete memory for {user_id}: {e}")
+                    return False
+            return True
+
+    def _delete_shared(self, user_id: str) -> bool:
+        client = self._get_shared_client()
+        try:
+            if self.layout == "collections":
+                client.delete_collection(user_collection_name(user_id))
+            else:
+                client.get_or_create_collection(COLLECTION_NAME).delete(where={"user_id": user_id})
+            print(f"[MIMIR] Deleted memory for {user_id}")
+            return True
+        except ValueError:
+            return True # No collection: nothing stored for this user
+        except Exception as e:
+            print(f"[ERROR] Failed to delete memory for {user_id}: {e}")
+            return False
 
-mimir_memory = MimirMemory()
+mimir_memory = LazySingleton(MimirMemory)
@@ -0,0 +1,130 @@
+import os
+import json
+import gzip
+import time
+import uuid
+from typing import Dict
+
+FORMAT = "mimir-memory-export"
+VERSION = 1
+BATCH_SIZE = 2000
+
+# An export is a directory holding:
+#   manifest.json       - format, version, user, embedding model, dimensions, count
+#   vectors.npy         - float32 matrix, one row per chunk (memory-mappable)
+#   records.jsonl.gz    - {"id", "document", "metadata"} per line, in the same order as the rows
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+RECORDS_FILE = "records.jsonl.gz"
+
+
+def export_user(memory, user_id: str, out_dir: str, batch_size: int = BATCH_SIZE) -> Dict:
+    """
+    Writes the user's chunks (documents, metadata and vectors) to `out_dir`.
+    Vectors are streamed into a memory-mapped .npy file, so the export never holds
+    the whole store in RAM.
+    """
+    import numpy as np
+
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    where = memory._tenant_filter(user_id)
+    with memory.use_store(user_id) as store:
+        collection = store._collection
+        # A compressed collection holds reduced vectors; export the full ones from the sidecar
+        compressed = memory.compression.projection(user_id) is not None
+        ids = collection.get(where=where, include=[])["ids"]
+
+        vectors = None
+        with gzip.open(os.path.join(out_dir, RECORDS_FILE), "wt", encoding="utf-8", compresslevel=6) as records:
+            for offset in range(0, len(ids), batch_size):
+                batch_ids = ids[offset:offset + batch_size]
+                page = collection.get(ids=batch_ids, include=["embeddings", "documents", "metadatas"])
+                # get() doesn't promise input order
+                rows = {i: n for n, i in enumerate(page["ids"])}
+                order = [rows[i] for i in batch_ids]
+                if compressed:
+                    full = memory.compression.get(user_id, batch_ids)
+                    block = np.stack([full[i] for i in batch_ids]).astype(np.float32)
+                else:
+                    block = np.asarray(page["embeddings"], dtype=np.float32)[order]
+                if vectors is None:
+                    vectors = np.lib.format.open_memmap(
+                        os.path.join(out_dir, VECTORS_FILE), mode="w+", dtype=np.float32, shape=(len(ids), block.shape[1])
+                    )
+                vectors[offset:offset + len(batch_ids)] = block
+                for n in order:
+                    records.write(json.dumps({
+                        "id": page["ids"][n],
+                        "document": page["documents"][n],
+                        "metadata": page["metadatas"][n] or {},
+                    }, ensure_ascii=False) + "\n")
+
+    dimensions = 0
+    if vectors is not None:
+        dimensions = int(vectors.shape[1])
+        vectors.flush()
+        del vectors
+    else:
+        np.save(os.path.join(out_dir, VECTORS_FILE), np.zeros((0, 0), dtype=np.float32))
+
+    manifest = {
+        "format": FORMAT,
+        "version": VERSION,
+        "user_id": user_id,
+        "embedding_model": memory.embedding_model,
+        "dimensions": dimensions,
+        "count": len(ids),
+        "exported_at": int(time.time()),
+    }
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return {**manifest, "seconds": round(time.perf_counter() - start, 2)}
+
+
+def import_user(memory, user_id: str, src_dir: str, batch_size: int = BATCH_SIZE, allow_model_mismatch: bool = False) -> Dict:
+    """
+    Bulk-loads an export into the user's store with its stored vectors (nothing is
+    re-embedded). Records are re-owned by `user_id`, which may differ from the exporting
+    user. Chunk IDs are kept (derived from the originals when importing into another
+    user, so a copy never overwrites the source in a shared collection), which makes
+    importing the same export twice harmless.
+    """
+    import numpy as np
+
+    with open(os.path.join(src_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT or manifest.get("version") != VERSION:
+        raise ValueError(f"{src_dir} is not a {FORMAT} v{VERSION} export")
+    if manifest["embedding_model"] != memory.embedding_model and not allow_model_mismatch:
+        raise ValueError(
+            f"Export was embedded with {manifest['embedding_model']} but this deployment uses "
+            f"{memory.embedding_model}; import with allow_model_mismatch and run reindex_memory afterwards"
+        )
+
+    start = time.perf_counter()
+    vectors = np.load(os.path.join(src_dir, VECTORS_FILE), mmap_mode="r")
+    rename = manifest["user_id"] != user_id
+    imported = 0
+    with gzip.open(os.path.join(src_dir, RECORDS_FILE), "rt", encoding="utf-8") as records:
+        batch = []
+        for line in records:
+            batch.append(json.loads(line))
+            if len(batch) == batch_size:
+                imported += _load_batch(memory, user_id, batch, vectors[imported:imported + len(batch)], rename)
+                batch = []
+        if batch:
+            imported += _load_batch(memory, user_id, batch, vectors[imported:imported + len(batch)], rename)
+
+    if imported != manifest["count"]:
+        print(f"[WARN] Imported {imported} chunks but the manifest lists {manifest['count']}")
+    return {"user_id": user_id, "count": imported, "seconds": round(time.perf_counter() - start, 2)}
+
+
+def _load_batch(memory, user_id: str, batch: list, vectors, rename: bool) -> int:
+    metadatas = [{**r["metadata"], "user_id": user_id} for r in batch]
+    ids = [r["id"] for r in batch]
+    if rename:
+        ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, f"{user_id}/{i}")) for i in ids]
+    memory._write_chunks(user_id, [r["document"] for r in batch], metadatas, vectors.tolist(), ids=ids)
+    return len(batch)
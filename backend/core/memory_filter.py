@@ -0,0 +1,125 @@
+import time
+import datetime
+from typing import Dict, List, Optional, Union
+
+# Chunk types that make up each kind of memory ("summary" is consolidated conversation)
+KINDS = {
+    "conversation": ["conversation", "summary"],
+    "document": ["document"],
+    "plan": ["daily_plan"],
+}
+
+Timestamp = Union[int, float, str, datetime.date, datetime.datetime]
+
+
+def to_timestamp(value: Timestamp, end_of_day: bool = False) -> Optional[float]:
+    """
+    Epoch seconds for an epoch number, datetime, date or ISO string ("2025-11-30",
+    "2025-11-30T14:00"). A bare date means the start of that day (local time), or its
+    end with `end_of_day`, so an inclusive range of dates works as people expect.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = value.strip()
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        value = datetime.datetime.fromisoformat(value) if "T" in value or " " in value else datetime.date.fromisoformat(value)
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    start = time.mktime(value.timetuple())
+    return start + 86400 - 1 if end_of_day else start
+
+
+def _one_or_many(value) -> Optional[List[str]]:
+    if value is None or value == "" or value == []:
+        return None
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(",") if v.strip()]
+    return list(value)
+
+
+class MemoryFilter:
+    """
+    Structured restriction for recall: chunk source (e.g. an uploaded file name), chunk
+    type, kind of memory and a created_at range. Translates into a Chroma `where`
+    clause, so the vector search only ranks matching chunks, and can test a metadata
+    dict for the results that don't come from Chroma (keyword hits, pending writes).
+
+    Chunks written before timestamps were recorded have no created_at and never match
+    a time range.
+    """
+
+    def __init__(self, source: Union[str, List[str]] = None, type: Union[str, List[str]] = None, kind: str = None,
+                 since: Timestamp = None, until: Timestamp = None):
+        self.sources = _one_or_many(source)
+        types = _one_or_many(type) or []
+        if kind:
+            if kind not in KINDS:
+                raise ValueError(f"Unknown memory kind '{kind}', expected one of {sorted(KINDS)}")
+            types = [t for t in types if t in KINDS[kind]] if types else list(KINDS[kind])
+            if not types:
+                types = ["\0none"] # type and kind contradict each other: nothing matches
+        self.types = types or None
+        self.since = to_timestamp(since)
+        self.until = to_timestamp(until, end_of_day=True)
+
+    @classmethod
+    def of(cls, filters) -> Optional["MemoryFilter"]:
+        """Accepts a MemoryFilter, a dict of its arguments or None."""
+        if filters is None or isinstance(filters, MemoryFilter):
+            return filters or None
+        return cls(**filters) or None
+
+    def __bool__(self):
+        return any(v is not None for v in (self.sources, self.types, self.since, self.until))
+
+    def key(self) -> tuple:
+        """Hashable identity, for caching results per filter."""
+        return (tuple(self.sources or ()), tuple(self.types or ()), self.since, self.until)
+
+    def conditions(self) -> List[Dict]:
+        conditions = []
+        if self.sources:
+            conditions.append({"source": self.sources[0]} if len(self.sources) == 1 else {"source": {"$in": self.sources}})
+        if self.types:
+            conditions.append({"type": self.types[0]} if len(self.types) == 1 else {"type": {"$in": self.types}})
+        if self.since is not None:
+            conditions.append({"created_at": {"$gte": self.since}})
+        if self.until is not None:
+            conditions.append({"created_at": {"$lte": self.until}})
+        return conditions
+
+    def matches(self, metadata: dict) -> bool:
+        metadata = metadata or {}
+        if self.sources and metadata.get("source") not in self.sources:
+            return False
+        if self.types and metadata.get("type") not in self.types:
+            return False
+        created_at = metadata.get("created_at")
+        if (self.since is not None or self.until is not None) and created_at is None:
+            return False
+        if self.since is not None and created_at < self.since:
+            return False
+        if self.until is not None and created_at > self.until:
+            return False
+        return True
+
+    def __repr__(self):
+        return f"MemoryFilter(sources={self.sources}, types={self.types}, since={self.since}, until={self.until})"
+
+
+def combine_where(*clauses: Optional[Dict]) -> Optional[Dict]:
+    """ANDs Chroma where clauses, skipping empty ones (Chroma rejects an $and of fewer than two)."""
+    conditions = []
+    for clause in clauses:
+        if not clause:
+            continue
+        conditions.extend(clause["$and"] if list(clause) == ["$and"] else [clause])
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
@@ -0,0 +1,198 @@
+import re
+import time
+import threading
+from typing import Callable, Dict, List, Optional
+
+
+class PendingDocument:
+    __slots__ = ("user_id", "text", "metadata", "accepted_at", "attempts", "retry_at")
+
+    def __init__(self, user_id: str, text: str, metadata: dict):
+        self.user_id = user_id
+        self.text = text
+        self.metadata = metadata
+        self.accepted_at = time.time()
+        self.attempts = 0
+        self.retry_at = 0.0 # After a failed write, not retried before this time
+
+
+def _terms(text: str) -> set:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+class IngestionBuffer:
+    """
+    Write-behind buffer for memory writes.
+
+    `add` returns immediately. A background thread flushes when the pending chunk count
+    reaches `batch_size` or the oldest document has waited `flush_interval` seconds.
+    One flush splits every pending document (across turns and users), embeds all the
+    chunks in a single batched call and then writes each user's chunks to their store;
+    a large backlog is flushed in rounds of MAX_FLUSH_DOCUMENTS documents.
+    Documents stay visible to `search_pending` until their write has succeeded.
+
+    A user's failed write only holds back that user's documents: they are retried after
+    an exponentially growing delay (RETRY_BASE_SECONDS doubling up to RETRY_MAX_SECONDS)
+    and dropped after MAX_ATTEMPTS, while everyone else's documents are removed as
+    soon as they are written.
+    """
+
+    MAX_ATTEMPTS = 5
+    MAX_FLUSH_DOCUMENTS = 1024
+    RETRY_BASE_SECONDS = 2.0
+    RETRY_MAX_SECONDS = 300.0
+
+    def __init__(self, memory, batch_size: int = 64, flush_interval: float = 2.0):
+        self.memory = memory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[PendingDocument] = []
+        self._pending_chunks = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._counters = {"accepted": 0, "flushes": 0, "chunks_written": 0, "failures": 0, "dropped": 0}
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="mimir-ingest", daemon=True)
+            self._thread.start()
+
+    def add(self, user_id: str, text: str, metadata: dict):
+        with self._cond:
+            self._pending.append(PendingDocument(user_id, text, metadata))
+            # Rough chunk estimate (chunk_size=1000) so large uploads trigger a flush sooner
+            self._pending_chunks += max(1, len(text) // 900)
+            self._counters["accepted"] += 1
+            self._ensure_thread()
+            # The thread may be asleep until a later deadline (or indefinitely): let it re-plan
+            self._cond.notify()
+
+    def _due(self, now: float):
+        """(chunks ready to write now, time the next document becomes due or None). Holds the lock."""
+        ready_chunks, next_due = 0, None
+        for doc in self._pending:
+            if doc.retry_at > now:
+                next_due = doc.retry_at if next_due is None else min(next_due, doc.retry_at)
+                continue
+            ready_chunks += max(1, len(doc.text) // 900)
+            due = doc.accepted_at + self.flush_interval
+            next_due = due if next_due is None else min(next_due, due)
+        return ready_chunks, next_due
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    now = time.time()
+                    ready_chunks, next_due = self._due(now)
+                    if ready_chunks >= self.batch_size or (next_due is not None and next_due <= now):
+                        break
+                    self._cond.wait(None if next_due is None else next_due - now)
+                if self._stopping:
+                    return
+            self.flush()
+
+    def flush(self, retry_all: bool = False) -> int:
+        """
+        Writes everything currently pending, except documents still backing off after a
+        failure (unless `retry_all`). Returns the number of chunks written.
+        """
+        with self._cond:
+            pending = len(self._pending)
+        written = 0
+        # A backlog (bulk import, slow store) is written in bounded rounds, not one huge batch
+        for _ in range(0, pending, self.MAX_FLUSH_DOCUMENTS):
+            count = self._flush_round(retry_all)
+            if count is None:
+                break # Failed; the rest waits for the retry
+            written += count
+        return written
+
+    def _flush_round(self, retry_all: bool = False) -> Optional[int]:
+        """
+        Writes up to MAX_FLUSH_DOCUMENTS of the oldest due documents. Returns the chunks
+        written, or None if the round failed as a whole (the embedding call).
+        """
+        with self._flush_lock:
+            now = time.time()
+            with self._cond:
+                due = [d for d in self._pending if retry_all or d.retry_at <= now]
+            batch = due[:self.MAX_FLUSH_DOCUMENTS]
+            if not batch:
+                return 0
+
+            def report(user_id: str, written: int, error: Optional[Exception]):
+                docs = [d for d in batch if d.user_id == user_id]
+                if error is not None:
+                    print(f"[MIMIR] Memory write for {user_id} failed: {error}")
+                    self._failed(docs)
+                    return
+                with self._cond:
+                    self._remove(docs) # Written: no longer pending, whatever happens to the other users
+                    self._counters["chunks_written"] += written
+
+            try:
+                written = self.memory._ingest_batch(batch, report)
+            except Exception as e:
+                print(f"[MIMIR] Memory flush of {len(batch)} documents failed: {e}")
+                with self._cond:
+                    unwritten = set(map(id, self._pending))
+                self._failed([d for d in batch if id(d) in unwritten])
+                return None
+
+            with self._cond:
+                self._counters["flushes"] += 1
+            return written
+
+    def _failed(self, docs: List[PendingDocument]):
+        """Schedules a retry for documents whose write failed, dropping those out of attempts."""
+        now = time.time()
+        with self._cond:
+            self._counters["failures"] += 1
+            for doc in docs:
+                doc.attempts += 1
+                doc.retry_at = now + min(self.RETRY_BASE_SECONDS * 2 ** (doc.attempts - 1), self.RETRY_MAX_SECONDS)
+            dropped = [d for d in docs if d.attempts >= self.MAX_ATTEMPTS]
+            if dropped:
+                print(f"[ERROR] Dropping {len(dropped)} memory documents after {self.MAX_ATTEMPTS} failed writes")
+                self._remove(dropped)
+                self._counters["dropped"] += len(dropped)
+
+    def _remove(self, docs: List[PendingDocument]):
+        done = set(map(id, docs))
+        self._pending = [d for d in self._pending if id(d) not in done]
+        self._pending_chunks = sum(max(1, len(d.text) // 900) for d in self._pending)
+
+    def search_pending(self, user_id: str, query: str, limit: int = 3, accept: Callable[[dict], bool] = None) -> List[str]:
+        """Not-yet-flushed documents for the user that share terms with the query (and whose metadata passes `accept`)."""
+        query_terms = _terms(query)
+        with self._cond:
+            docs = [d for d in self._pending if d.user_id == user_id and (accept is None or accept(d.metadata))]
+        scored = []
+        for doc in docs:
+            overlap = len(query_terms & _terms(doc.text))
+            if overlap:
+                scored.append((overlap, doc.accepted_at, doc.text))
+        scored.sort(reverse=True)
+        return [text for _, _, text in scored[:limit]]
+
+    def discard(self, user_id: str):
+        """Drops pending writes for a user (used when their memory is deleted)."""
+        with self._cond:
+            self._remove([d for d in self._pending if d.user_id == user_id])
+
+    def stop(self):
+        """Stops the background thread and flushes whatever is still pending."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self.flush(retry_all=True) # Last chance for documents still backing off
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {**self._counters, "pending_documents": len(self._pending)}
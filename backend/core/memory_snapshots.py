@@ -0,0 +1,315 @@
+import os
+import json
+import time
+import shutil
+import socket
+import tarfile
+import threading
+from typing import Callable, Dict, List, Optional
+
+from backend.core.metrics import metrics
+
+SNAPSHOTS_DIRNAME = "_snapshots"
+LATEST_FILE = "LATEST"
+# Per-user files besides the store directory (keyword index, compression sidecar), relative to the base
+BUNDLE_SIDE_FILES = ("_lexical/{safe}.sqlite3", "_compression/{safe}.sqlite3")
+# SQLite shared-memory files are rebuilt on open: never copied
+SKIPPED_SUFFIXES = ("-shm", ".tmp")
+
+
+class MemorySnapshots:
+    """
+    Keeps per-user memory on local disk and versioned snapshots of it on `remote_dir`.
+
+    Chroma's SQLite and index files take small random writes, fsyncs and file locks,
+    which a FUSE-mounted bucket (Cloud Run's MIMIR_DATA_DIR) handles slowly and unsafely.
+    Instead MimirMemory works in `local_dir`, and each user's files (store directory,
+    keyword index, compression sidecar) are:
+
+      hydrated  on first open from the newest snapshot on the mount, or from the
+                plain per-user layout there if the user has no snapshot yet; on every
+                later (re)open, if another instance has published a newer one since
+      snapshot  every `interval` seconds and at shutdown, if they changed: written as
+                one tar file (a single sequential upload), then published by replacing
+                the user's LATEST pointer. Older versions beyond `keep` are removed.
+
+    Writers call `mark_dirty` before changing a user's files (Chroma rewrites some of its
+    files just by opening them, so the files themselves can't tell). The flag lives in a
+    small local state file shared by the workers; hydration, snapshots and writes all run
+    under the user's write lock (`lock(user_id)`), so a snapshot never captures a half-done
+    write. Local changes that aren't snapshotted yet are never overwritten by a hydration. One
+    instance should serve a user at a time (session affinity); if two write the same
+    user, the last snapshot wins.
+    """
+
+    def __init__(self, remote_dir: str, local_dir: str, lock: Callable, interval: float = 300, keep: int = 3):
+        self.remote_dir = remote_dir
+        self.local_dir = local_dir
+        self.lock = lock
+        self.interval = interval
+        self.keep = max(1, keep)
+        self.instance = f"{socket.gethostname()}-{os.getpid()}"
+        self._state_dir = os.path.join(local_dir, SNAPSHOTS_DIRNAME)
+        os.makedirs(self._state_dir, exist_ok=True)
+        os.makedirs(os.path.join(remote_dir, SNAPSHOTS_DIRNAME), exist_ok=True)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._counters_lock = threading.Lock()
+        self._counters = {"hydrations": 0, "bytes_read": 0, "snapshots": 0, "bytes_written": 0, "failures": 0,
+                          "conflicts": 0, "last_snapshot_ms": None, "last_snapshot_bytes": None}
+
+    # --- bookkeeping ---
+
+    def _bundle(self, safe_id: str) -> List[str]:
+        return [safe_id] + [p.format(safe=safe_id) for p in BUNDLE_SIDE_FILES]
+
+    def _files(self, root: str, safe_id: str) -> List[str]:
+        """Paths (relative to root) of the user's files under root."""
+        files = []
+        for entry in self._bundle(safe_id):
+            path = os.path.join(root, entry)
+            if os.path.isdir(path):
+                for directory, _, names in os.walk(path):
+                    files.extend(os.path.relpath(os.path.join(directory, n), root) for n in names)
+            else:
+                parent, prefix = os.path.split(path)
+                if os.path.isdir(parent):
+                    # The database and its -wal file
+                    files.extend(os.path.relpath(os.path.join(parent, n), root) for n in os.listdir(parent)
+                                 if n == prefix or n.startswith(prefix + "-"))
+        return sorted(f for f in files if not f.endswith(SKIPPED_SUFFIXES))
+
+    def _state_path(self, safe_id: str) -> str:
+        return os.path.join(self._state_dir, f"{safe_id}.json")
+
+    def _load_state(self, safe_id: str) -> Optional[dict]:
+        try:
+            with open(self._state_path(safe_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save_state(self, safe_id: str, state: dict):
+        path = self._state_path(safe_id)
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+
+    def mark_dirty(self, safe_id: str, user_id: str = None):
+        """Records that the user's local files are changing and need a snapshot. Call under the user's lock."""
+        state = self._load_state(safe_id) or {"version": None}
+        if not state.get("dirty"):
+            state["dirty"] = True
+            state["user_id"] = user_id or state.get("user_id") or safe_id
+            self._save_state(safe_id, state)
+
+    def _remote_user_dir(self, safe_id: str) -> str:
+        return os.path.join(self.remote_dir, SNAPSHOTS_DIRNAME, safe_id)
+
+    def latest(self, safe_id: str) -> Optional[dict]:
+        """The user's newest published snapshot ({"version", "user_id", "bytes", "created"}), if any."""
+        try:
+            with open(os.path.join(self._remote_user_dir(safe_id), LATEST_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _count(self, **amounts):
+        with self._counters_lock:
+            for name, amount in amounts.items():
+                self._counters[name] += amount
+
+    # --- hydration ---
+
+    def hydrate(self, user_id: str, safe_id: str) -> bool:
+        """Brings the user's local files up to the newest snapshot if they're behind. True if files were copied."""
+        with self.lock(user_id):
+            state = self._load_state(safe_id)
+            latest = self.latest(safe_id)
+            if state is not None:
+                if latest is None or latest["version"] == state.get("version"):
+                    return False # Local copy is current
+                if state.get("dirty"):
+                    self._count(conflicts=1)
+                    print(f"[WARN] Memory for {user_id} has a newer snapshot ({latest['version']}) but also local "
+                          f"changes not snapshotted yet; keeping the local copy, which will replace it")
+                    return False
+
+            start = time.perf_counter()
+            if latest is not None:
+                copied = self._extract(safe_id, latest["version"])
+                version = latest["version"]
+            else:
+                copied = self._copy_plain(safe_id)
+                version = None
+            self._save_state(safe_id, {"user_id": user_id, "version": version, "dirty": False})
+        if copied:
+            elapsed = (time.perf_counter() - start) * 1000
+            self._count(hydrations=1, bytes_read=copied)
+            metrics.observe("memory.snapshot.hydrate", elapsed)
+            print(f"[MIMIR] Hydrated memory for {user_id} ({version or 'unversioned'}, "
+                  f"{copied / (1024 * 1024):.1f} MB) in {elapsed:.0f} ms")
+        return bool(copied)
+
+    def _clear_local(self, safe_id: str):
+        for rel in self._bundle(safe_id):
+            path = os.path.join(self.local_dir, rel)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+        for rel in self._files(self.local_dir, safe_id):
+            try:
+                os.remove(os.path.join(self.local_dir, rel))
+            except FileNotFoundError:
+                pass
+
+    def _extract(self, safe_id: str, version: str) -> int:
+        archive = os.path.join(self._remote_user_dir(safe_id), f"{version}.tar")
+        staging = os.path.join(self._state_dir, f"{safe_id}.incoming")
+        shutil.rmtree(staging, ignore_errors=True)
+        with tarfile.open(archive, "r") as tar:
+            members = [m for m in tar.getmembers() if m.isfile() and not os.path.isabs(m.name) and ".." not in m.name.split("/")]
+            tar.extractall(staging, members=members)
+        # Swap in only once the whole archive has been read
+        self._clear_local(safe_id)
+        copied = 0
+        for member in members:
+            target = os.path.join(self.local_dir, member.name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(os.path.join(staging, member.name), target)
+            copied += member.size
+        shutil.rmtree(staging, ignore_errors=True)
+        return copied
+
+    def _copy_plain(self, safe_id: str) -> int:
+        """First hydration of a user stored in the plain layout on the mount (no snapshot yet)."""
+        copied = 0
+        for rel in self._files(self.remote_dir, safe_id):
+            target = os.path.join(self.local_dir, rel)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(os.path.join(self.remote_dir, rel), target)
+            copied += os.path.getsize(target)
+        return copied
+
+    def remote_users(self) -> Dict[str, str]:
+        """{safe_id: user_id} for every user with a snapshot or a plain-layout store on the mount."""
+        users = {}
+        for name in os.listdir(self.remote_dir):
+            path = os.path.join(self.remote_dir, name)
+            if not name.startswith("_") and os.path.isdir(path):
+                users[name] = name
+        snapshots = os.path.join(self.remote_dir, SNAPSHOTS_DIRNAME)
+        for name in os.listdir(snapshots):
+            latest = self.latest(name)
+            if latest is not None:
+                users[name] = latest.get("user_id") or name
+        return users
+
+    # --- snapshots ---
+
+    def snapshot(self, user_id: str, safe_id: str, force: bool = False) -> Optional[dict]:
+        """Publishes a snapshot of the user's files if they are marked dirty. Returns {"version", "bytes", "ms"} or None."""
+        start = time.perf_counter()
+        with self.lock(user_id):
+            state = self._load_state(safe_id) or {}
+            if not force and not state.get("dirty"):
+                return None
+            files = self._files(self.local_dir, safe_id)
+
+            # Millisecond timestamps first, so versions sort by age across instances
+            version = f"{int(time.time() * 1000):013d}-{self.instance}"
+            remote = self._remote_user_dir(safe_id)
+            os.makedirs(remote, exist_ok=True)
+            archive = os.path.join(remote, f"{version}.tar")
+            with tarfile.open(archive + ".tmp", "w") as tar:
+                for rel in files:
+                    tar.add(os.path.join(self.local_dir, rel), arcname=rel)
+            size = os.path.getsize(archive + ".tmp")
+            os.replace(archive + ".tmp", archive)
+            latest = {"version": version, "user_id": user_id, "bytes": size, "created": time.time()}
+            with open(os.path.join(remote, LATEST_FILE + ".tmp"), "w") as f:
+                json.dump(latest, f)
+            os.replace(os.path.join(remote, LATEST_FILE + ".tmp"), os.path.join(remote, LATEST_FILE))
+            self._save_state(safe_id, {"user_id": user_id, "version": version, "dirty": False})
+        self._prune(remote)
+
+        elapsed = (time.perf_counter() - start) * 1000
+        self._count(snapshots=1, bytes_written=size)
+        with self._counters_lock:
+            self._counters["last_snapshot_ms"] = round(elapsed, 1)
+            self._counters["last_snapshot_bytes"] = size
+        metrics.observe("memory.snapshot.duration", elapsed)
+        metrics.incr("memory.snapshot.bytes_written", size)
+        print(f"[MIMIR] Snapshot of memory for {user_id}: {size / (1024 * 1024):.1f} MB in {elapsed:.0f} ms")
+        return {"version": version, "bytes": size, "ms": round(elapsed, 1)}
+
+    def _prune(self, remote: str):
+        versions = sorted(n for n in os.listdir(remote) if n.endswith(".tar"))
+        for name in versions[:-self.keep]:
+            try:
+                os.remove(os.path.join(remote, name))
+            except OSError:
+                pass
+
+    def snapshot_changed(self) -> dict:
+        """Snapshots every local user marked dirty. Returns {"users", "bytes", "ms"}."""
+        start = time.perf_counter()
+        users = written = 0
+        for name in sorted(os.listdir(self._state_dir)):
+            if not name.endswith(".json"):
+                continue
+            safe_id = name[:-len(".json")]
+            state = self._load_state(safe_id) or {}
+            try:
+                result = self.snapshot(state.get("user_id") or safe_id, safe_id)
+            except Exception as e:
+                self._count(failures=1)
+                print(f"[ERROR] Snapshot of memory for {safe_id} failed: {e}")
+                continue
+            if result:
+                users += 1
+                written += result["bytes"]
+        return {"users": users, "bytes": written, "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    def delete(self, safe_id: str):
+        """Removes the user's snapshots, plain-layout files on the mount and local bookkeeping."""
+        shutil.rmtree(self._remote_user_dir(safe_id), ignore_errors=True)
+        shutil.rmtree(os.path.join(self.remote_dir, safe_id), ignore_errors=True)
+        for rel in self._files(self.remote_dir, safe_id):
+            try:
+                os.remove(os.path.join(self.remote_dir, rel))
+            except FileNotFoundError:
+                pass
+        try:
+            os.remove(self._state_path(safe_id))
+        except FileNotFoundError:
+            pass
+
+    # --- schedule ---
+
+    def start(self):
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mimir-snapshots", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            result = self.snapshot_changed()
+            if result["users"]:
+                print(f"[MIMIR] Snapshotted {result['users']} users ({result['bytes'] / (1024 * 1024):.1f} MB) "
+                      f"in {result['ms'] / 1000:.1f}s")
+
+    def stop(self):
+        """Stops the schedule and snapshots whatever changed since the last run (shutdown)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+        result = self.snapshot_changed()
+        print(f"[MIMIR] Final snapshot: {result['users']} users, {result['bytes'] / (1024 * 1024):.1f} MB "
+              f"in {result['ms'] / 1000:.1f}s")
+        return result
+
+    def stats(self) -> Dict:
+        with self._counters_lock:
+            return dict(self._counters)
@@ -0,0 +1,291 @@
+import os
+import hashlib
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from backend.core.metrics import metrics
+
+# How user memories are laid out on disk (MIMIR_MEMORY_LAYOUT):
+#   per_user    - one Chroma client/database per user directory (original layout)
+#   collections - one shared client, one collection per user
+#   shared      - one shared client and collection, scoped by the user_id metadata field
+MEMORY_LAYOUTS = ("per_user", "collections", "shared")
+COLLECTION_NAME = "mimir_knowledge"
+SHARED_STORE_DIRNAME = "_shared"
+
+
+def user_collection_name(user_id: str) -> str:
+    # Chroma names allow only [a-zA-Z0-9._-] and 3-63 characters, so hash the ID
+    return "u_" + hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+
+
+# Guards Chroma's per-path system cache while we take systems out of it
+_chroma_lock = threading.Lock()
+
+
+def open_chroma_client(path: str):
+    """
+    A PersistentClient for `path` with a newly started system of its own.
+
+    Chroma caches one system per path and hands it to every client opened on it. A store
+    reopened while its predecessor is still leased (stale generation, eviction) would then
+    share that system, keep seeing the index as it was, and break as soon as the old
+    store is closed. So the cached system is detached first (whoever uses it keeps it
+    until close_chroma) and each open starts from the files on disk.
+    """
+    import chromadb
+    from chromadb.api.shared_system_client import SharedSystemClient
+    target = os.path.abspath(path)
+    with _chroma_lock:
+        systems = SharedSystemClient._identifier_to_system
+        for identifier, system in list(systems.items()):
+            if system.settings.persist_directory and os.path.abspath(system.settings.persist_directory) == target:
+                systems.pop(identifier, None)
+        client = chromadb.PersistentClient(path=path)
+        # client._system looks the path up in the cache each time; remember which system is ours
+        client._mimir_system = client._system
+        return client
+
+
+def close_chroma(store):
+    """
+    Releases a Chroma store opened on its own client (see open_chroma_client): stops the
+    store's system, and drops it from Chroma's cache unless a newer store's system has
+    taken its place there.
+    """
+    try:
+        client = store._client
+        from chromadb.api.shared_system_client import SharedSystemClient
+        with _chroma_lock:
+            system = getattr(client, "_mimir_system", None) or client._system
+            systems = SharedSystemClient._identifier_to_system
+            if systems.get(client._identifier) is system:
+                systems.pop(client._identifier, None)
+        system.stop()
+    except Exception as e:
+        print(f"[WARN] Failed to close memory store cleanly: {e}")
+
+
+def process_rss_mb() -> Optional[float]:
+    """Current resident set size of this process in MB (None where it can't be read)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # Peak rather than current RSS, but the best available (kB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / 1024 / (1024 if os.uname().sysname == "Darwin" else 1), 1)
+    except Exception:
+        return None
+
+
+class _Entry:
+    __slots__ = ("store", "generation", "last_used", "leases", "evicted")
+
+    def __init__(self, store, generation: int):
+        self.store = store
+        self.generation = generation
+        self.last_used = time.monotonic()
+        self.leases = 0
+        self.evicted = False
+
+
+class StoreCache:
+    """
+    Bounded LRU of open per-user stores.
+
+    At most `capacity` stores stay open; opening one more closes the least recently
+    used, and stores untouched for `idle_seconds` are closed by a background sweep.
+    Callers hold a store through `lease()`, so a store is never closed while a search
+    or write is using it: an evicted store that is still leased is closed when its
+    last lease is released.
+    """
+
+    def __init__(self, opener: Callable[[str], object], closer: Callable[[object], None] = close_chroma,
+                 capacity: int = 64, idle_seconds: float = 900):
+        self.opener = opener
+        self.closer = closer
+        self.capacity = max(1, capacity)
+        self.idle_seconds = idle_seconds
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._open_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+        self._counters = {"opens": 0, "reopens": 0, "evictions_lru": 0, "evictions_idle": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, user_id: str):
+        return user_id in self._entries
+
+    @contextmanager
+    def lease(self, user_id: str, generation: int):
+        """Yields the user's open store, (re)opening it if missing or older than `generation`."""
+        entry = self._acquire(user_id, generation)
+        try:
+            yield entry.store
+        finally:
+            self._release(entry)
+
+    def _acquire(self, user_id: str, generation: int) -> _Entry:
+        stale = []
+        with self._lock:
+            entry = self._take(user_id, generation, stale)
+            open_lock = self._open_locks.setdefault(user_id, threading.Lock())
+        self._close_all(stale)
+        if entry is not None:
+            return entry
+        stale = []
+
+        # Open outside the cache lock so one slow open doesn't hold up every other user
+        with open_lock:
+            with self._lock:
+                entry = self._take(user_id, generation, stale)
+            if entry is not None:
+                return entry
+
+            start = time.perf_counter()
+            store = self.opener(user_id)
+            elapsed = (time.perf_counter() - start) * 1000
+            metrics.observe("memory.store.open", elapsed)
+
+            with self._lock:
+                entry = _Entry(store, generation)
+                entry.leases = 1
+                self._entries[user_id] = entry
+                self._counters["opens"] += 1
+                overflow = self._evict_lru()
+                open_count = len(self._entries)
+            print(f"[MIMIR] Opened memory store for {user_id} in {elapsed:.0f} ms ({open_count} open)")
+
+        self._close_all(stale + overflow)
+        self._ensure_sweeper()
+        return entry
+
+    def _take(self, user_id: str, generation: int, closable: list) -> Optional[_Entry]:
+        """
+        Returns a current entry with a lease taken. A stale entry is detached and, if
+        unused, added to `closable`. Caller holds the lock.
+        """
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry.generation != generation:
+            # Another worker wrote to this store since we opened it; reopen to see the changes
+            self._detach(user_id)
+            self._counters["reopens"] += 1
+            if entry.leases == 0:
+                closable.append(entry)
+            return None
+        entry.leases += 1
+        entry.last_used = time.monotonic()
+        self._entries.move_to_end(user_id)
+        return entry
+
+    def _release(self, entry: _Entry):
+        with self._lock:
+            entry.leases -= 1
+            entry.last_used = time.monotonic()
+            close_now = entry.evicted and entry.leases == 0
+        if close_now:
+            self._close_all([entry])
+
+    def _detach(self, user_id: str):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            entry.evicted = True
+        return entry
+
+    def _evict_lru(self) -> list:
+        """
+        Detaches least recently used entries beyond capacity and returns the unused ones
+        for closing (leased ones close on release). Caller holds the lock.
+        """
+        closable = []
+        for user_id in list(self._entries):
+            if len(self._entries) <= self.capacity:
+                break
+            entry = self._entries[user_id]
+            self._detach(user_id)
+            self._counters["evictions_lru"] += 1
+            if entry.leases == 0:
+                closable.append(entry)
+        return closable
+
+    def _close_all(self, entries: list):
+        for entry in entries:
+            start = time.perf_counter()
+            self.closer(entry.store)
+            metrics.observe("memory.store.close", (time.perf_counter() - start) * 1000)
+
+    def set_generation(self, user_id: str, generation: int, store):
+        """
+        Records that `store` already includes the write that produced `generation`. If the
+        user's store has been reopened since that write began, the new one may predate it
+        and keeps its generation (it is reopened on next use).
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry.store is store:
+                entry.generation = generation
+
+    def discard(self, user_id: str):
+        """Closes the user's store (now, or when its last lease is released)."""
+        with self._lock:
+            entry = self._detach(user_id)
+            close_now = entry is not None and entry.leases == 0
+        if close_now:
+            self._close_all([entry])
+
+    def evict_idle(self) -> int:
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [u for u, e in self._entries.items() if e.leases == 0 and e.last_used < cutoff]
+            entries = [self._detach(u) for u in idle]
+            self._counters["evictions_idle"] += len(entries)
+        if entries:
+            self._close_all(entries)
+            print(f"[MIMIR] Closed {len(entries)} idle memory stores ({len(self._entries)} open)")
+        return len(entries)
+
+    def _ensure_sweeper(self):
+        if self.idle_seconds <= 0 or (self._sweeper is not None and self._sweeper.is_alive()):
+            return
+        self._sweeper = threading.Thread(target=self._sweep, name="mimir-store-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def _sweep(self):
+        interval = min(60.0, max(1.0, self.idle_seconds / 4))
+        while True:
+            time.sleep(interval)
+            try:
+                self.evict_idle()
+            except Exception as e:
+                print(f"[WARN] Idle memory store sweep failed: {e}")
+
+    def close_all(self):
+        with self._lock:
+            entries = [self._detach(u) for u in list(self._entries)]
+        self._close_all([e for e in entries if e.leases == 0])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            open_count = len(self._entries)
+            leased = sum(1 for e in self._entries.values() if e.leases)
+        return {
+            **counters,
+            "open": open_count,
+            "in_use": leased,
+            "capacity": self.capacity,
+            "idle_seconds": self.idle_seconds,
+            "process_rss_mb": process_rss_mb(),
+        }
@@ -0,0 +1,115 @@
+import time
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List
+
+# Upper bounds (ms) of the latency buckets; anything slower lands in the overflow bucket
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """
+    Process-local latency histogram: cumulative bucket counts plus a window of recent
+    samples for percentiles. Cheap enough to record on every request.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS_MS, window: int = 1024):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.total += value
+            self.recent.append(value)
+
+    @staticmethod
+    def _percentile(ordered: List[float], pct: float) -> float:
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return round(ordered[index], 2)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            ordered = sorted(self.recent)
+            counts = list(self.counts)
+            count, total = self.count, self.total
+        buckets = {f"le_{b}": c for b, c in zip(self.buckets, counts)}
+        buckets["inf"] = counts[-1]
+        return {
+            "count": count,
+            "mean": round(total / count, 2) if count else 0.0,
+            "p50": self._percentile(ordered, 50),
+            "p95": self._percentile(ordered, 95),
+            "p99": self._percentile(ordered, 99),
+            "buckets": buckets,
+        }
+
+
+class Metrics:
+    """
+    Named histograms and counters, created on first use. Latency histograms (ms) and
+    value histograms (sizes, token counts; see observe_value) are kept apart.
+    """
+
+    def __init__(self):
+        self._histograms: Dict[str, Histogram] = {}
+        self._values: Dict[str, Histogram] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str) -> Histogram:
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = Histogram()
+            return hist
+
+    def observe(self, name: str, value_ms: float):
+        self.histogram(name).observe(value_ms)
+
+    def observe_value(self, name: str, value: float, buckets: tuple):
+        """Records a non-latency value; `buckets` are used when the histogram is created."""
+        with self._lock:
+            hist = self._values.get(name)
+            if hist is None:
+                hist = self._values[name] = Histogram(buckets)
+        hist.observe(value)
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def counters(self, prefix: str = "") -> Dict[str, int]:
+        with self._lock:
+            return {n[len(prefix):]: v for n, v in sorted(self._counters.items()) if n.startswith(prefix)}
+
+    @contextmanager
+    def timer(self, name: str):
+        """Records the wall time of the block (in ms), including when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000)
+
+    def snapshot(self, prefix: str = "") -> Dict[str, Dict]:
+        with self._lock:
+            names = [n for n in self._histograms if n.startswith(prefix)]
+        return {n[len(prefix):]: self._histograms[n].snapshot() for n in sorted(names)}
+
+    def values(self, prefix: str = "") -> Dict[str, Dict]:
+        with self._lock:
+            names = [n for n in self._values if n.startswith(prefix)]
+        return {n[len(prefix):]: self._values[n].snapshot() for n in sorted(names)}
+
+
+metrics = Metrics()
@@ -2,21 +2,25 @@ import requests
 import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
 import time
+from backend.core.lazy import LazySingleton
+from backend.core.state import state_store
+
+NEWS_CACHE_NAMESPACE = "news_cache"
+NEWS_CACHE_TTL_SECONDS = 24 * 3600 # Stale entries are still served if a refresh fails
 
 class NewsManager:
     def __init__(self):
         self.base_url = "https://news.google.com/rss"
-        self.cache = {} # Dict[str, Dict] -> {query: {'items': [], 'timestamp': datetime}}
         self.cache_duration = timedelta(minutes=15)
 
     def get_news(self, query=None, force_refresh=False):
         now = datetime.now()
         cache_key = query if query else "TOP_NEWS"
         
-        # Check cache
-        if not force_refresh and cache_key in self.cache:
-            cached_data = self.cache[cache_key]
-            if (now - cached_data['timestamp']) < self.cache_duration:
+        # Check cache (shared state: {'items': [], 'timestamp': epoch seconds})
+        cached_data = state_store.get(NEWS_CACHE_NAMESPACE, cache_key)
+        if not force_refresh and cached_data:
+            if (now - datetime.fromtimestamp(cached_data['timestamp'])) < self.cache_duration:
                 return cached_data['items']
 
         try:
@@ -50,20 +54,20 @@ class NewsManager:
                 })
             
             # Update cache
-            self.cache[cache_key] = {
+            state_store.set(NEWS_CACHE_NAMESPACE, cache_key, {
                 'items': items,
-                'timestamp': now
-            }
+                'timestamp': now.timestamp()
+            }, ttl=NEWS_CACHE_TTL_SECONDS)
             return items
             
         except Exception as e:
             print(f"[NEWS] Error fetching news for '{cache_key}': {e}")
             # Return cache if available, even if expired
-            if cache_key in self.cache:
-                return self.cache[cache_key]['items']
+            if cached_data:
+                return cached_data['items']
             return []
 
     def get_top_news(self, force_refresh=False):
         return self.get_news(query=None, force_refresh=force_refresh)
 
-news_manager = NewsManager()
+news_manager = LazySingleton(NewsManager)
@@ -0,0 +1,118 @@
+import re
+import math
+from typing import Dict, List, Optional, Tuple
+
+# Fraction of the MMR score given to relevance (the rest penalizes similarity to picks)
+MMR_LAMBDA = 0.7
+# Candidates at least this similar to an already selected chunk add nothing
+REDUNDANT_SIMILARITY = 0.95
+# Don't bother truncating a chunk into less room than this
+MIN_TRUNCATED_TOKENS = 40
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English with Gemini/SentencePiece tokenizers; cheap and close enough for budgeting
+    return max(1, math.ceil(len(text) / 4))
+
+
+class Candidate:
+    __slots__ = ("text", "vector", "relevance", "_words")
+
+    def __init__(self, text: str, vector: Optional[List[float]] = None, relevance: float = 0.0):
+        self.text = text
+        self.vector = vector
+        self.relevance = relevance
+        self._words = None
+
+    @property
+    def words(self) -> set:
+        if self._words is None:
+            self._words = set(re.findall(r"\w+", self.text.lower()))
+        return self._words
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def similarity(a: Candidate, b: Candidate) -> float:
+    """Cosine of the embeddings when both have one, otherwise word-set Jaccard."""
+    if a.vector is not None and b.vector is not None:
+        return _cosine(a.vector, b.vector)
+    if not a.words or not b.words:
+        return 0.0
+    return len(a.words & b.words) / len(a.words | b.words)
+
+
+def mmr(candidates: List[Candidate], k: int, lambda_: float = MMR_LAMBDA) -> Tuple[List[Candidate], int]:
+    """
+    Maximal marginal relevance: repeatedly picks the candidate with the best
+    lambda * relevance - (1 - lambda) * max similarity to what is already picked.
+    Near-identical candidates are discarded. Returns (picked, redundant count).
+
+    Each candidate's max similarity is kept up to date as picks are made, and the
+    cosines against a pick come from one product with the normalized embedding matrix,
+    so the cost is O(n * k) dot products done by numpy rather than O(n * k^2) in Python.
+    """
+    import numpy as np
+
+    n = len(candidates)
+    if not n or k <= 0:
+        return [], 0
+    matrix, has_vector = None, np.zeros(n, dtype=bool)
+    dims = {len(c.vector) for c in candidates if c.vector is not None}
+    if len(dims) == 1:
+        has_vector = np.array([c.vector is not None for c in candidates])
+        matrix = np.zeros((n, dims.pop()), dtype=np.float32)
+        matrix[has_vector] = [c.vector for c in candidates if c.vector is not None]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0) # Zero vectors stay zero: cosine 0, as in _cosine
+
+    relevance = np.array([c.relevance for c in candidates], dtype=np.float64)
+    overlap = np.zeros(n) # Max similarity to the picks so far (0 until the first pick)
+    alive = np.ones(n, dtype=bool)
+    picked: List[Candidate] = []
+    redundant = 0
+    while alive.any() and len(picked) < k:
+        scores = np.where(alive, lambda_ * relevance - (1 - lambda_) * overlap, -np.inf)
+        best = int(np.argmax(scores))
+        alive[best] = False
+        if overlap[best] >= REDUNDANT_SIMILARITY:
+            redundant += 1
+            continue
+        sims = np.zeros(n)
+        if matrix is not None and has_vector[best]:
+            sims[has_vector] = (matrix[has_vector] @ matrix[best]).astype(np.float64)
+            others = np.flatnonzero(alive & ~has_vector)
+        else:
+            others = np.flatnonzero(alive)
+        for i in others:
+            sims[i] = similarity(candidates[i], candidates[best])
+        overlap = np.maximum(overlap, sims) if picked else sims
+        picked.append(candidates[best])
+    return picked, redundant
+
+
+def pack(candidates: List[Candidate], token_budget: Optional[int]) -> Tuple[List[str], Dict]:
+    """
+    Fits picked candidates (best first) into `token_budget` tokens. A chunk that doesn't
+    fit is truncated if there is reasonable room left, otherwise dropped.
+    """
+    texts, used, truncated, dropped = [], 0, 0, 0
+    for candidate in candidates:
+        tokens = estimate_tokens(candidate.text)
+        if token_budget is None or used + tokens <= token_budget:
+            texts.append(candidate.text)
+            used += tokens
+            continue
+        room = token_budget - used
+        if room >= MIN_TRUNCATED_TOKENS:
+            texts.append(candidate.text[:room * 4 - 3] + "...")
+            used += room
+            truncated += 1
+        else:
+            dropped += 1
+    return texts, {"tokens_used": used, "token_budget": token_budget, "chunks": len(texts),
+                   "truncated": truncated, "dropped_budget": dropped}
@@ -0,0 +1,73 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from backend.core.embeddings import normalize_text
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation don't change what is recalled."""
+    return re.sub(r"[\s.!?,;:]+$", "", normalize_text(query).lower())
+
+
+class RecallCache:
+    """
+    In-process LRU of recall candidates, keyed by user, normalized query and a
+    variant (the fetch size and filter the candidates were found with).
+
+    A hit skips the keyword lookup, the embedding call and the vector search; only the
+    cheap diversity/budget selection runs again. Every entry remembers the user's store
+    generation (bumped by any worker that writes or deletes their memory) and a local
+    epoch (bumped by `invalidate`, e.g. when something is queued for write-behind), and
+    is ignored once either has moved on. Stale entries are not removed eagerly; they
+    age out of the LRU.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._epochs: Dict[str, int] = {}
+        self._counters = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0}
+
+    def get(self, user_id: str, query: str, variant, generation) -> Optional[List]:
+        key = (user_id, normalize_query(query), variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            if entry[0] != generation or entry[1] != self._epochs.get(user_id, 0):
+                del self._entries[key]
+                self._counters["stale"] += 1
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry[2]
+
+    def put(self, user_id: str, query: str, variant, generation, candidates: List):
+        key = (user_id, normalize_query(query), variant)
+        with self._lock:
+            self._entries[key] = (generation, self._epochs.get(user_id, 0), candidates)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._epochs[user_id] = self._epochs.get(user_id, 0) + 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "entries": size,
+            "max_entries": self.max_entries,
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,102 @@
+import os
+import asyncio
+from typing import Optional
+
+from backend.core.state import state_store
+
+CLAIM_NAMESPACE = "journal_claims"
+
+
+class JournalScheduler:
+    """
+    Generates daily journals in the background once each user's local day has ended,
+    so chat requests never pay for journal generation.
+
+    Every MIMIR_JOURNAL_SCAN_INTERVAL seconds it walks the user profiles, asks the
+    journal manager which past days (in the user's own timezone) still lack a journal,
+    and generates them with at most MIMIR_JOURNAL_CONCURRENCY running at once.
+    Each (user, day) is claimed in the state store first, so with the shared SQLite
+    state several workers can run the scheduler without generating twice.
+    """
+
+    def __init__(self):
+        self.interval = float(os.getenv("MIMIR_JOURNAL_SCAN_INTERVAL", "300"))
+        self.concurrency = int(os.getenv("MIMIR_JOURNAL_CONCURRENCY", "2"))
+        self.claim_ttl = float(os.getenv("MIMIR_JOURNAL_CLAIM_TTL", "3600"))
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            print(f"[SCHEDULER] Journal scheduler started (every {self.interval:.0f}s, concurrency {self.concurrency})")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"[SCHEDULER] Journal scan failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> int:
+        """Runs one scan over all users. Returns the number of journals generated."""
+        from backend.core.user_manager import user_manager
+        from backend.core.daily_journal import daily_journal
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        jobs = []
+        for user_id in list(user_manager.profiles):
+            try:
+                dates = await asyncio.to_thread(daily_journal.pending_journal_dates, user_id)
+            except Exception as e:
+                print(f"[SCHEDULER] Could not check journals for {user_id}: {e}")
+                continue
+            for date_str in dates:
+                jobs.append(self._generate(semaphore, user_id, date_str))
+
+        results = await asyncio.gather(*jobs)
+        generated = sum(1 for r in results if r)
+        if generated:
+            print(f"[SCHEDULER] Generated {generated} journal entries")
+        return generated
+
+    async def _generate(self, semaphore: asyncio.Semaphore, user_id: str, date_str: str) -> bool:
+        from backend.core.daily_journal import daily_journal
+
+        claim_key = f"{user_id}_{date_str}"
+        if not state_store.add(CLAIM_NAMESPACE, claim_key, os.getpid(), ttl=self.claim_ttl):
+            return False # Another worker (or an earlier scan) is on it
+
+        async with semaphore:
+            try:
+                print(f"[SCHEDULER] Generating journal for {user_id} on {date_str}")
+                await daily_journal.generate_journal_entry(user_id, date_str)
+                return True
+            except Exception as e:
+                print(f"[SCHEDULER] Journal generation failed for {user_id} on {date_str}: {e}")
+                state_store.delete(CLAIM_NAMESPACE, claim_key) # Retry on the next scan
+                return False
+
+
+def create_journal_scheduler() -> Optional[JournalScheduler]:
+    """
+    MIMIR_JOURNAL_SCHEDULER selects how end-of-day journals are produced:
+      - "inprocess" (default): each worker runs JournalScheduler (claims prevent duplicates)
+      - "off": nothing runs in the web process; run `python -m backend.scripts.run_journals`
+        from an external job (cron, Cloud Scheduler) instead
+    """
+    mode = os.getenv("MIMIR_JOURNAL_SCHEDULER", "inprocess").lower()
+    if mode == "off":
+        return None
+    if mode != "inprocess":
+        print(f"[SCHEDULER] Unknown MIMIR_JOURNAL_SCHEDULER '{mode}', using in-process scheduler")
+    return JournalScheduler()
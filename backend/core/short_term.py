@@ -0,0 +1,114 @@
+import re
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Tuple
+
+# Memory types that are conversation turns and go through the short-term tier
+SHORT_TERM_TYPES = {"conversation"}
+
+
+class RecentTurn:
+    __slots__ = ("text", "metadata", "vector", "at", "_terms")
+
+    def __init__(self, text: str, metadata: dict):
+        self.text = text
+        self.metadata = metadata
+        self.vector = None # Filled in when the write-behind flush embeds the turn
+        self.at = time.time()
+        self._terms = None
+
+    @property
+    def terms(self) -> set:
+        if self._terms is None:
+            self._terms = set(re.findall(r"\w+", self.text.lower()))
+        return self._terms
+
+
+class ShortTermMemory:
+    """
+    The last few conversation turns of each user, held in RAM.
+
+    Each user gets a ring buffer of their `capacity` most recent turns; turns older than
+    `max_age` seconds are ignored, and users beyond `max_users` are forgotten least recently
+    used first. remember() puts a turn here as well as in the write-behind buffer; when the
+    flush embeds it the vector is attached, so the turn is searched by cosine similarity
+    (one matrix product over the buffer) without waiting for, or querying, the vector store.
+    Turns not embedded yet, and queries answered without an embedding, match by shared terms.
+    """
+
+    def __init__(self, capacity: int = 20, max_age: float = 3600, max_users: int = 1024):
+        self.capacity = capacity
+        self.max_age = max_age
+        self.max_users = max_users
+        self._turns: "OrderedDict[str, Deque[RecentTurn]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"added": 0, "embedded": 0, "searches": 0, "hits": 0}
+
+    def add(self, user_id: str, text: str, metadata: dict):
+        with self._lock:
+            turns = self._turns.get(user_id)
+            if turns is None:
+                turns = self._turns[user_id] = deque(maxlen=self.capacity)
+                while len(self._turns) > self.max_users:
+                    self._turns.popitem(last=False)
+            self._turns.move_to_end(user_id)
+            turns.append(RecentTurn(text, metadata))
+            self._counters["added"] += 1
+
+    def attach(self, user_id: str, text: str, vector):
+        """Records the embedding of a buffered turn (matched by text)."""
+        with self._lock:
+            for turn in self._turns.get(user_id, ()):
+                if turn.vector is None and turn.text == text:
+                    turn.vector = vector
+                    self._counters["embedded"] += 1
+                    return
+
+    def _recent(self, user_id: str, accept: Callable[[dict], bool] = None) -> List[RecentTurn]:
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            turns = list(self._turns.get(user_id, ()))
+        return [t for t in turns if t.at >= cutoff and (accept is None or accept(t.metadata))]
+
+    def search(self, user_id: str, query: str, vector: list = None, limit: int = 5,
+               accept: Callable[[dict], bool] = None) -> List[Tuple[RecentTurn, float]]:
+        """
+        Up to `limit` of the user's recent turns ranked by similarity to the query: cosine
+        against `vector` for embedded turns, term overlap for the rest (or when there is no
+        query vector). Turns that don't relate to the query at all are left out.
+        """
+        turns = self._recent(user_id, accept)
+        with self._lock:
+            self._counters["searches"] += 1
+        if not turns:
+            return []
+        scored: List[Tuple[RecentTurn, float]] = []
+        embedded = [t for t in turns if t.vector is not None] if vector is not None else []
+        if embedded:
+            import numpy as np
+            from backend.core.compression import cosine_scores
+            scores = cosine_scores(np.asarray([t.vector for t in embedded], dtype=np.float32), vector)
+            scored.extend((t, float(s)) for t, s in zip(embedded, scores) if s > 0)
+        query_terms = set(re.findall(r"\w+", query.lower()))
+        if query_terms:
+            seen = set(map(id, embedded))
+            for turn in turns:
+                if id(turn) in seen:
+                    continue
+                overlap = len(query_terms & turn.terms) / len(query_terms)
+                if overlap:
+                    scored.append((turn, overlap))
+        # Most similar first; among equals the most recent
+        scored.sort(key=lambda pair: (pair[1], pair[0].at), reverse=True)
+        with self._lock:
+            self._counters["hits"] += min(limit, len(scored))
+        return scored[:limit]
+
+    def discard(self, user_id: str):
+        with self._lock:
+            self._turns.pop(user_id, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._counters, "users": len(self._turns), "turns": sum(len(t) for t in self._turns.values())}
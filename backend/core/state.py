@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+from backend.core.lazy import LazySingleton
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class StateStore:
+    """
+    Key/value state shared by everything that must agree across requests:
+    chat histories, caches, per-user locks and counters.
+
+    Values are namespaced and must be JSON-serializable so that the same code
+    works with the in-process store and with stores shared between workers.
+    """
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def add(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Sets the key only if it is absent. Returns True if this call stored it."""
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str):
+        raise NotImplementedError
+
+    def incr(self, namespace: str, key: str, amount: int = 1) -> int:
+        """Atomically increments an integer counter and returns the new value."""
+        raise NotImplementedError
+
+    def lock(self, name: str):
+        """Returns a context manager holding a named mutual-exclusion lock."""
+        raise NotImplementedError
+
+
+class InProcessStateStore(StateStore):
+    """Plain dictionaries and thread locks. Correct for a single worker process."""
+
+    def __init__(self):
+        self._data: Dict[Tuple[str, str], Tuple[Any, Optional[float]]] = {}
+        self._mutex = threading.RLock()
+        self._locks: Dict[str, threading.Lock] = {}
+
+    def _live(self, namespace: str, key: str):
+        item = self._data.get((namespace, key))
+        if item is None:
+            return None
+        if item[1] is not None and item[1] <= time.time():
+            del self._data[(namespace, key)]
+            return None
+        return item
+
+    def get(self, namespace, key, default=None):
+        with self._mutex:
+            item = self._live(namespace, key)
+            return default if item is None else item[0]
+
+    def set(self, namespace, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._mutex:
+            self._data[(namespace, key)] = (value, expires_at)
+
+    def add(self, namespace, key, value, ttl=None):
+        with self._mutex:
+            if self._live(namespace, key) is not None:
+                return False
+            self.set(namespace, key, value, ttl)
+            return True
+
+    def delete(self, namespace, key):
+        with self._mutex:
+            self._data.pop((namespace, key), None)
+
+    def incr(self, namespace, key, amount=1):
+        with self._mutex:
+            item = self._live(namespace, key)
+            value = (item[0] if item else 0) + amount
+            self._data[(namespace, key)] = (value, item[1] if item else None)
+            return value
+
+    def lock(self, name):
+        with self._mutex:
+            if name not in self._locks:
+                self._locks[name] = threading.Lock()
+            return self._locks[name]
+
+
+class SQLiteStateStore(StateStore):
+    """
+    State shared between worker processes on one host.
+
+    Values live in a local SQLite database (WAL mode) and named locks are
+    advisory file locks next to it. Keep the database on local disk; SQLite
+    locking is not reliable on network/FUSE mounts.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_dir = os.path.join(os.path.dirname(os.path.abspath(path)), "mimir_state_locks")
+        os.makedirs(self.lock_dir, exist_ok=True)
+        self._local = threading.local()
+        self._writes = 0
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+        print(f"[STATE] Using shared SQLite state at {self.path}")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _maybe_purge(self, conn):
+        # Expired rows are ignored on read; sweep them out every so often
+        self._writes += 1
+        if self._writes % 500 == 0:
+            conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    def get(self, namespace, key, default=None):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set(self, namespace, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), expires_at),
+            )
+            self._maybe_purge(conn)
+
+    def add(self, namespace, key, value, ttl=None):
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND key = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                (namespace, key, now),
+            )
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), expires_at),
+            )
+            return cursor.rowcount == 1
+
+    def delete(self, namespace, key):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def incr(self, namespace, key, amount=1):
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, time.time()),
+            ).fetchone()
+            value = (json.loads(row[0]) if row else 0) + amount
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, NULL)",
+                (namespace, key, json.dumps(value)),
+            )
+            return value
+
+    @contextmanager
+    def lock(self, name):
+        digest = hashlib.sha1(name.encode("utf-8")).hexdigest()
+        with open(os.path.join(self.lock_dir, f"{digest}.lock"), "a+b") as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                while True:
+                    try:
+                        f.seek(0)
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue  # LK_LOCK gives up after ~10s; keep waiting
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def create_state_store() -> StateStore:
+    """
+    Builds the state store selected by MIMIR_STATE_BACKEND:
+      - "memory" (default): in-process, for a single uvicorn worker
+      - "sqlite": shared between workers on the same host (uvicorn --workers N)
+    """
+    backend = os.getenv("MIMIR_STATE_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        path = os.getenv("MIMIR_STATE_PATH") or os.path.join(tempfile.gettempdir(), "mimir_state.sqlite3")
+        return SQLiteStateStore(path)
+    if backend != "memory":
+        print(f"[STATE] Unknown MIMIR_STATE_BACKEND '{backend}', falling back to in-process state")
+    return InProcessStateStore()
+
+
+state_store = LazySingleton(create_state_store, name="StateStore")
@@ -1,11 +1,11 @@
 import os
 import requests
-from bs4 import BeautifulSoup
 from typing import Optional, Dict, List
 from dotenv import load_dotenv
-import google.generativeai as genai
 from datetime import datetime, timedelta
 import json
+import time
+from backend.core.state import state_store
 
 load_dotenv()
 
@@ -15,23 +15,21 @@ GOOGLE_SEARCH_ENGINE_ID = os.getenv("GOOGLE_SEARCH_ENGINE_ID")
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-# Configure Gemini for content summarization
-genai.configure(api_key=GOOGLE_API_KEY)
-
-# Simple in-memory cache
-_cache = {}
+# Tool result cache, kept in the shared state store so all workers reuse it
+TOOL_CACHE_NAMESPACE = "tool_cache"
+TOOL_CACHE_TTL_SECONDS = 6 * 3600 # Upper bound; callers pass their own max age
 
 def _get_cache(key: str, max_age_minutes: int = 30) -> Optional[any]:
     """Get cached value if not expired"""
-    if key in _cache:
-        data, timestamp = _cache[key]
-        if datetime.now() - timestamp < timedelta(minutes=max_age_minutes):
-            return data
+    cached = state_store.get(TOOL_CACHE_NAMESPACE, key)
+    if cached:
+        if time.time() - cached["timestamp"] < max_age_minutes * 60:
+            return cached["data"]
     return None
 
 def _set_cache(key: str, value: any):
     """Set cache value with current timestamp"""
-    _cache[key] = (value, datetime.now())
+    state_store.set(TOOL_CACHE_NAMESPACE, key, {"data": value, "timestamp": time.time()}, ttl=TOOL_CACHE_TTL_SECONDS)
 
 
 import concurrent.futures
@@ -93,6 +91,8 @@ def web_search(query: str, num_results: int = 3) -> Dict:
                     })
                     
                     if page_response.status_code == 200:
+                        from bs4 import BeautifulSoup
+
                         # Parse HTML
                         soup = BeautifulSoup(page_response.content, 'lxml')
                         
@@ -564,3 +564,38 @@ def set_home_city(city: str, confirm: bool = False, user_id: str = "Matt Burchet
     except Exception as e:
         print(f"[TOOL ERROR] Failed to set home city: {e}")
         return {"error": str(e)}
+
+
+def memory_search(query: str, source: str = None, type: str = None, kind: str = None,
+                  start_date: str = None, end_date: str = None, k: int = 5, user_id: str = "Matt Burchett") -> Dict:
+    """
+    Search the user's long-term memory, optionally restricted by metadata.
+    
+    Args:
+        query: What to look for
+        source: Uploaded file name(s), comma separated (optional)
+        type: Chunk type(s) such as document, conversation, summary, daily_plan (optional)
+        kind: "conversation", "document" or "plan" (optional)
+        start_date: YYYY-MM-DD, inclusive (optional)
+        end_date: YYYY-MM-DD, inclusive (optional)
+        k: Maximum number of memories to return
+        user_id: User ID
+    
+    Returns:
+        {"results": [...], "count": N}
+    """
+    print(f"[TOOL] Executing memory_search")
+    
+    try:
+        from backend.core.memory import mimir_memory
+        from backend.core.memory_filter import MemoryFilter
+        
+        filters = MemoryFilter(source=source, type=type, kind=kind, since=start_date, until=end_date)
+        results = mimir_memory.search(query, user_id=user_id, k=int(k), filters=filters)
+        return {"results": results, "count": len(results)}
+    
+    except ValueError as e:
+        return {"error": f"Invalid filter: {e}"}
+    except Exception as e:
+        print(f"[TOOL ERROR] Memory search failed: {e}")
+        return {"error": str(e)}
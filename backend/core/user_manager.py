@@ -3,6 +3,7 @@ import os
 import datetime
 from typing import Dict, Optional, List
 from pydantic import BaseModel
+from backend.core.lazy import LazySingleton
 
 class UserProfile(BaseModel):
     auth_id: str
@@ -98,4 +99,4 @@ class UserManager:
 
 # Global instance
 MIMIR_DATA_DIR = os.getenv("MIMIR_DATA_DIR", ".")
-user_manager = UserManager(storage_file=os.path.join(MIMIR_DATA_DIR, "user_profiles.json"))
+user_manager = LazySingleton(lambda: UserManager(storage_file=os.path.join(MIMIR_DATA_DIR, "user_profiles.json")), name="UserManager")
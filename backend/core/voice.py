@@ -1,12 +1,9 @@
 import os
-import google.generativeai as genai
 from dotenv import load_dotenv
 import re
-import os
 import io
 import wave
-from google.cloud import texttospeech
-from google.api_core.client_options import ClientOptions
+from backend.core.lazy import LazySingleton
 
 load_dotenv()
 
@@ -18,6 +15,9 @@ class MimirVoice:
             self.client = None
         else:
             try:
+                from google.cloud import texttospeech
+                from google.api_core.client_options import ClientOptions
+
                 # Initialize Google Cloud TTS Client with API Key
                 options = ClientOptions(api_key=self.api_key)
                 self.client = texttospeech.TextToSpeechClient(client_options=options)
@@ -26,6 +26,12 @@ class MimirVoice:
                 print(f"Failed to initialize Google Cloud TTS: {e}")
                 self.client = None
 
+    def warm(self):
+        """Opens the gRPC channel to the TTS service so the first spoken sentence doesn't pay for it."""
+        if not self.client:
+            raise RuntimeError("Voice client not initialized")
+        self.client.list_voices(language_code="en-GB")
+
     def _pcm_to_wav(self, pcm_data, sample_rate=24000):
         """Converts raw PCM data to WAV format."""
         with io.BytesIO() as wav_buffer:
@@ -74,6 +80,8 @@ class MimirVoice:
             print("Voice client not initialized.")
             return b""
             
+        from google.cloud import texttospeech
+
         try:
             # Clean text
             clean_text = text.replace("*", "").replace("#", "").strip()
@@ -131,4 +139,4 @@ class MimirVoice:
             print(f"[MIMIR VOICE] Generation error: {e}")
             return b""
 
-mimir_voice = MimirVoice()
+mimir_voice = LazySingleton(MimirVoice)
@@ -0,0 +1,140 @@
+import os
+import time
+import asyncio
+from typing import Dict, List, Any
+
+# Components run in this order of groups: profiles first (it decides which users
+# are "recent"), then everything else concurrently.
+DEFAULT_COMPONENTS = "profiles,embeddings,memory,tts,auth,discovery,calendars"
+
+
+def _warm_profiles(user_ids: List[str]) -> str:
+    from backend.core.user_manager import user_manager
+    return f"{len(user_manager.profiles)} profiles"
+
+
+def _warm_embeddings(user_ids: List[str]) -> str:
+    from backend.core.memory import mimir_memory
+    # Past the cache and batcher wrappers: a cache hit would leave the client and its connection cold
+    embedder = mimir_memory.embedding_function
+    while hasattr(embedder, "inner"):
+        embedder = embedder.inner
+    embedder.embed_query("warm-up")
+    return f"embedding client primed ({type(embedder).__name__})"
+
+
+def _warm_memory(user_ids: List[str]) -> str:
+    from backend.core.memory import mimir_memory
+    for user_id in user_ids:
+        with mimir_memory.use_store(user_id) as store:
+            store._collection.count() # Forces the collection segments to load
+    return f"{len(user_ids)} stores opened"
+
+
+def _warm_tts(user_ids: List[str]) -> str:
+    from backend.core.voice import mimir_voice
+    mimir_voice.warm()
+    return "TTS channel open"
+
+
+def _warm_auth(user_ids: List[str]) -> str:
+    from backend.core.auth import auth_request
+    auth_request.warm()
+    return "Google signing certs cached"
+
+
+def _warm_discovery(user_ids: List[str]) -> str:
+    from backend.core.google_calendar import load_discovery_document
+    load_discovery_document()
+    return "Calendar discovery document loaded"
+
+
+def _warm_calendars(user_ids: List[str]) -> str:
+    from backend.core.calendar import CalendarManager
+    for user_id in user_ids:
+        CalendarManager(user_id=user_id).get_events()
+    return f"{len(user_ids)} calendars loaded"
+
+
+WARMERS = {
+    "profiles": _warm_profiles,
+    "embeddings": _warm_embeddings,
+    "memory": _warm_memory,
+    "tts": _warm_tts,
+    "auth": _warm_auth,
+    "discovery": _warm_discovery,
+    "calendars": _warm_calendars,
+}
+
+
+class WarmupManager:
+    """
+    Primes the expensive clients after a deploy so the first real request doesn't pay
+    for them. Configured through:
+      - MIMIR_WARMUP_COMPONENTS: comma list of components, or "none" to skip warm-up
+      - MIMIR_WARMUP_USERS: how many recently active users get their stores/calendars opened
+      - MIMIR_WARMUP_TIMEOUT: seconds allowed per component
+    The service reports ready once every component has finished, failed or timed out.
+    """
+
+    def __init__(self):
+        components = os.getenv("MIMIR_WARMUP_COMPONENTS", DEFAULT_COMPONENTS)
+        if components.strip().lower() == "none":
+            components = ""
+        self.components = [c.strip() for c in components.split(",") if c.strip()]
+        self.user_limit = int(os.getenv("MIMIR_WARMUP_USERS", "10"))
+        self.timeout = float(os.getenv("MIMIR_WARMUP_TIMEOUT", "60"))
+        self.state = "pending"
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.users: List[str] = []
+        self.total_ms = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    async def _run_component(self, name: str):
+        warmer = WARMERS.get(name)
+        if warmer is None:
+            self.results[name] = {"status": "skipped", "detail": "unknown component"}
+            return
+        start = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(asyncio.to_thread(warmer, self.users), timeout=self.timeout)
+            result = {"status": "ok", "detail": detail}
+        except asyncio.TimeoutError:
+            result = {"status": "timeout", "detail": f"exceeded {self.timeout:.0f}s"}
+        except Exception as e:
+            result = {"status": "error", "detail": str(e)}
+        result["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self.results[name] = result
+        print(f"[WARMUP] {name}: {result['status']} in {result['duration_ms']} ms ({result['detail']})")
+
+    async def run(self):
+        self.state = "warming"
+        start = time.perf_counter()
+        try:
+            if "profiles" in self.components:
+                await self._run_component("profiles")
+            try:
+                from backend.core.daily_journal import daily_journal
+                self.users = await asyncio.to_thread(daily_journal.recent_users, self.user_limit)
+            except Exception as e:
+                print(f"[WARMUP] Could not determine recent users: {e}")
+
+            await asyncio.gather(*(self._run_component(c) for c in self.components if c != "profiles"))
+        finally:
+            self.total_ms = round((time.perf_counter() - start) * 1000, 1)
+            self.state = "ready"
+            print(f"[WARMUP] Complete in {self.total_ms} ms")
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "status": self.state,
+            "total_ms": self.total_ms,
+            "users": len(self.users),
+            "components": self.results,
+        }
+
+
+warmup = WarmupManager()
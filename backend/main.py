@@ -7,25 +7,20 @@ from backend.core.memory import mimir_memory
 from backend.core.voice import mimir_voice
 from backend.core.daily_journal import daily_journal
 from backend.core.news import news_manager
-import uvicorn
+from backend.core.warmup import warmup
+from backend.core.scheduler import create_journal_scheduler
+from backend.core.consolidation import create_consolidation_job
+from backend.core.chunking import PAGE_BREAK, SHEET_PREFIX
 import base64
-from PyPDF2 import PdfReader
-from docx import Document
-from openpyxl import load_workbook
-from PIL import Image
 import io
-import google.generativeai as genai
 import os
 import json
 from dotenv import load_dotenv
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID") # Add this to env
 print(f"Backend initialized with GOOGLE_CLIENT_ID: {GOOGLE_CLIENT_ID[:5]}..." if GOOGLE_CLIENT_ID else "WARNING: GOOGLE_CLIENT_ID is missing")
-genai.configure(api_key=GOOGLE_API_KEY)
 
 from fastapi.staticfiles import StaticFiles
 
@@ -46,23 +41,15 @@ from backend.core.user_manager import user_manager
 
 # Authentication Middleware
 from fastapi import Request, HTTPException, status, Response
-
-async def verify_google_token(token: str):
-    try:
-        # Specify the CLIENT_ID of the app that accesses the backend:
-        id_info = id_token.verify_oauth2_token(token, google_requests.Request(), GOOGLE_CLIENT_ID)
-        return id_info
-    except ValueError as e:
-        print(f"Token verification error: {e}")
-        return None
+from backend.core.auth import verify_google_token
 
 @app.middleware("http")
 async def auth_middleware(request: Request, call_next):
     if request.method == "OPTIONS":
         return await call_next(request)
         
-    # Skip auth for health check and docs
-    if request.url.path in ["/", "/docs", "/openapi.json"]:
+    # Skip auth for health/readiness checks and docs
+    if request.url.path in ["/", "/ready", "/docs", "/openapi.json"]:
         return await call_next(request)
 
     # Allow unauthenticated access to user check endpoints (to prevent catch-22)
@@ -118,6 +105,14 @@ class ChatResponse(BaseModel):
 def read_root():
     return {"status": "MIMIR is awake"}
 
+@app.get("/ready")
+def read_ready():
+    """Readiness probe: 503 until the startup warm-up has finished."""
+    report = warmup.report()
+    if not warmup.ready:
+        return Response(status_code=503, content=json.dumps(report), media_type="application/json")
+    return report
+
 # User Management Endpoints
 @app.get("/user/me")
 def get_current_user(request: Request):
@@ -146,8 +141,57 @@ def onboard_user(request: Request, data: OnboardRequest):
 
 from fastapi.responses import StreamingResponse
 import asyncio
+import time
+
+# Keep references to fire-and-forget tasks so they aren't garbage collected mid-run
+_background_tasks = set()
+
+def spawn_background(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+async def _run_logged(label: str, func, *args, **kwargs):
+    try:
+        await asyncio.to_thread(func, *args, **kwargs)
+    except Exception as e:
+        print(f"[BACKGROUND] {label} failed: {e}")
+
+def spawn_thread(label: str, func, *args, **kwargs):
+    """Runs a blocking, non-essential step off the request path."""
+    return spawn_background(_run_logged(label, func, *args, **kwargs))
+
+# Per-step budgets for assembling chat context before the first LLM token
+RECALL_TIMEOUT = float(os.getenv("MIMIR_RECALL_TIMEOUT", "2.0"))
+CONTEXT_STEP_TIMEOUT = float(os.getenv("MIMIR_CONTEXT_STEP_TIMEOUT", "1.0"))
+# How many memories recall may add to the prompt, and how many tokens they may take in total
+RECALL_K = int(os.getenv("MIMIR_RECALL_K", "5"))
+RECALL_TOKEN_BUDGET = int(os.getenv("MIMIR_RECALL_TOKEN_BUDGET", "1500"))
+
+async def run_timeboxed(label: str, timeout: float, default, func, *args, **kwargs):
+    """
+    Runs a blocking context step in a thread, giving up after `timeout` seconds.
+    Failures and timeouts degrade to `default` instead of failing the turn.
+    """
+    start = time.perf_counter()
+    try:
+        return await asyncio.wait_for(asyncio.to_thread(func, *args, **kwargs), timeout=timeout)
+    except asyncio.TimeoutError:
+        print(f"[CHAT] {label} timed out after {timeout:.1f}s; continuing without it")
+    except Exception as e:
+        print(f"[CHAT] {label} failed after {(time.perf_counter() - start) * 1000:.0f} ms: {e}")
+    return default
+
+journal_scheduler = create_journal_scheduler()
+consolidation_job = create_consolidation_job()
+
+async def _run_startup_maintenance():
+    try:
+        await asyncio.to_thread(daily_journal.cleanup_old_logs)
+    except Exception as e:
+        print(f"[STARTUP] Log cleanup failed: {e}")
 
-# Ensure necessary directories exist on startup
 # Ensure necessary directories exist on startup
 @app.on_event("startup")
 async def startup_event():
@@ -162,11 +206,28 @@ async def startup_event():
             json.dump({}, f)
         print("[STARTUP] Created empty user_profiles.json")
 
-    # Run maintenance tasks
-    try:
-        daily_journal.cleanup_old_logs()
-    except Exception as e:
-        print(f"[STARTUP] Log cleanup failed: {e}")
+    # Run maintenance tasks in the background so they don't delay the first request
+    spawn_background(_run_startup_maintenance())
+
+    # Prime clients and recently active users' stores; /ready reports when done
+    spawn_background(warmup.run())
+
+    # End-of-day journals are generated in the background, per user timezone
+    if journal_scheduler:
+        journal_scheduler.start()
+    if consolidation_job:
+        consolidation_job.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if journal_scheduler:
+        await journal_scheduler.stop()
+    if consolidation_job:
+        await consolidation_job.stop()
+
+    # Flush memories still waiting in the write-behind buffer
+    if mimir_memory._initialized:
+        await asyncio.to_thread(mimir_memory.close)
 
 @app.post("/chat")
 async def chat(request: Request, body: ChatRequest):
@@ -187,9 +248,14 @@ async def chat(request: Request, body: ChatRequest):
         
         async def event_generator():
             try:
-                # 1. Recall Context for specific user
-                daily_journal.log_interaction(user_id, "chat", f"User: {user_msg}")
-                context = mimir_memory.recall(user_msg, user_id=user_id)
+                # 1. Log the message off the critical path (journals are generated by the scheduler)
+                spawn_thread("Logging user message", daily_journal.log_interaction, user_id, "chat", f"User: {user_msg}")
+
+                # Recall context and check journal prompts concurrently, each with its own budget
+                context, prompt_needed = await asyncio.gather(
+                    mimir_memory.arecall(user_msg, user_id=user_id, k=RECALL_K, timeout=RECALL_TIMEOUT, token_budget=RECALL_TOKEN_BUDGET),
+                    run_timeboxed("Journal prompt check", CONTEXT_STEP_TIMEOUT, False, daily_journal.check_prompt_needed, user_id),
+                )
                 
                 # 2. Add current date/time to context
                 current_time = datetime.now().strftime("%A, %B %d, %Y at %I:%M %p")
@@ -200,11 +266,9 @@ async def chat(request: Request, body: ChatRequest):
                 else:
                     context = time_context
     
-                # 2.5 Check for Daily Journal Triggers
-                await daily_journal.check_end_of_day(user_id)
-                
-                if daily_journal.check_prompt_needed(user_id):
-                    daily_journal.mark_prompted(user_id)
+                # 2.5 Daily Journal prompt
+                if prompt_needed:
+                    spawn_thread("Marking journal prompt", daily_journal.mark_prompted, user_id)
                     context += "\\n\\n[SYSTEM NOTE: It is after 7:00 PM and the user has not recorded much today. Gently ask them how their day went and if they have anything to add to their daily log.]"
                 
                 # 3. Generate Response (Parallel Audio via Queue with Ordered Collection)
@@ -288,10 +352,10 @@ async def chat(request: Request, body: ChatRequest):
                                     text_buffer = ""
                                 
                                 # 3. Remember Interaction
-                                mimir_memory.remember(f"User: {user_msg}\\nMIMIR: {response_text}", user_id=user_id)
-                                daily_journal.log_interaction(user_id, "chat", f"MIMIR: {response_text}")
+                                mimir_memory.remember(f"User: {user_msg}\nMIMIR: {response_text}", user_id=user_id, metadata={"type": "conversation"})
+                                spawn_thread("Logging MIMIR response", daily_journal.log_interaction, user_id, "chat", f"MIMIR: {response_text}")
                                 if tools_used:
-                                    daily_journal.log_interaction(user_id, "tool_use", {"tools": tools_used, "results": tool_results})
+                                    spawn_thread("Logging tool use", daily_journal.log_interaction, user_id, "tool_use", {"tools": tools_used, "results": tool_results})
 
                     except Exception as e:
                         print(f"Error in text_processor: {e}")
@@ -352,8 +416,8 @@ async def chat_plan_day(request: Request, body: ChatRequest):
         
         async def event_generator():
             try:
-                # 2. Log Interaction
-                daily_journal.log_interaction(user_id, "action", "Started daily planning session")
+                # 2. Log Interaction (off the critical path)
+                spawn_thread("Logging planning session", daily_journal.log_interaction, user_id, "action", "Started daily planning session")
                 
                 # 3. Generate Response (Reuse logic from /chat)
                 # We don't need memory recall for this specific system prompt, 
@@ -432,7 +496,7 @@ async def chat_plan_day(request: Request, body: ChatRequest):
                                     text_buffer = ""
                                 
                                 # Remember this interaction
-                                mimir_memory.remember(f"MIMIR (Daily Plan): {response_text}", user_id=user_id)
+                                mimir_memory.remember(f"MIMIR (Daily Plan): {response_text}", user_id=user_id, metadata={"type": "daily_plan"})
 
                     except Exception as e:
                         print(f"Error in text_processor: {e}")
@@ -470,36 +534,56 @@ def read_document_content(file_path: str, content: bytes = None) -> str:
         text = ""
         filename = os.path.basename(file_path)
         
-        if filename.endswith('.txt') or filename.endswith('.csv'):
+        # Structure is kept as plain-text markers for the chunker (backend/core/chunking.py):
+        # pages and sheets are separated by a form feed, Word headings become "#" lines
+        if filename.endswith(('.txt', '.csv', '.md')):
             text = content.decode('utf-8')
             
         elif filename.endswith('.pdf'):
+            from PyPDF2 import PdfReader
             pdf_reader = PdfReader(io.BytesIO(content))
-            text = "\\n".join([page.extract_text() for page in pdf_reader.pages])
+            text = PAGE_BREAK.join([page.extract_text() or "" for page in pdf_reader.pages])
             
         elif filename.endswith(('.doc', '.docx')):
+            from docx import Document
             doc = Document(io.BytesIO(content))
-            text = "\\n".join([paragraph.text for paragraph in doc.paragraphs])
+            lines = []
+            for paragraph in doc.paragraphs:
+                style = paragraph.style.name if paragraph.style is not None else ""
+                if style == "Title" or style.startswith("Heading"):
+                    level = int(style.split()[-1]) if style.split()[-1].isdigit() else 1
+                    lines.append("#" * min(level, 6) + " " + paragraph.text)
+                else:
+                    lines.append(paragraph.text)
+            text = "\n".join(lines)
             
         elif filename.endswith(('.xls', '.xlsx')):
-            wb = load_workbook(io.BytesIO(content))
-            text_parts = []
+            from openpyxl import load_workbook
+            wb = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+            sheets = []
             for sheet in wb.worksheets:
-                text_parts.append(f"Sheet: {sheet.title}")
+                text_parts = [f"{SHEET_PREFIX}{sheet.title}"]
                 for row in sheet.iter_rows(values_only=True):
-                    text_parts.append(" | ".join([str(cell) if cell is not None else "" for cell in row]))
-            text = "\\n".join(text_parts)
+                    cells = [str(cell) if cell is not None else "" for cell in row]
+                    while cells and not cells[-1]:
+                        cells.pop() # Formatted but empty trailing columns
+                    text_parts.append(" | ".join(cells))
+                sheets.append("\n".join(text_parts))
+            text = PAGE_BREAK.join(sheets)
             
         elif filename.endswith(('.jpg', '.jpeg', '.png', '.gif', '.bmp')):
             # For direct reading, we might return a description or handle it in AI core
             # But for memory storage, we use Vision
+            import google.generativeai as genai
+            from PIL import Image
+            genai.configure(api_key=GOOGLE_API_KEY)
             model = genai.GenerativeModel('gemini-2.5-pro')
             image = Image.open(io.BytesIO(content))
             response = model.generate_content([
                 "Describe this image in detail, including any text visible in the image:",
                 image
             ])
-            text = f"Image: {filename}\\n{response.text}"
+            text = f"Image: {filename}\n{response.text}"
             
         return text
     except Exception as e:
@@ -653,6 +737,11 @@ async def open_file(path: str = Form(...)):
     except Exception as e:
         return {"error": str(e)}
 
+@app.get("/memory/stats")
+async def get_memory_stats():
+    """Operational metrics for the memory subsystem (cache hit rates, open stores...)."""
+    return mimir_memory.stats()
+
 @app.get("/journal/{date_str}")
 async def get_journal_entry(request: Request, date_str: str):
     """Get the journal entry for a specific date."""
@@ -675,4 +764,5 @@ async def get_journal_entry(request: Request, date_str: str):
         return {"error": f"Failed to load journal: {str(e)}"}
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("backend.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,172 @@
+"""
+Measures what vector compression costs and saves: recall@k against exact search,
+Chroma disk footprint and query latency for full, PCA-reduced and PCA + int8-rescored
+vectors.
+
+    python -m backend.scripts.bench_compression --user alice
+    python -m backend.scripts.bench_compression --synthetic 20000 --dims 64,128,256 --json
+
+With --user it reads that user's stored vectors (nothing is modified; compressed users
+can't be measured, undo first). Without it, a synthetic corpus of normalized vectors
+with low-rank cluster structure is used, which is far kinder to PCA than the noise a
+random corpus would be but no substitute for your own data. --queries of the vectors
+are held out and used as queries; ground truth is exact cosine top-k over the rest.
+Every configuration is loaded into its own Chroma collection in a temporary
+directory and queried through the same code path recall uses.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+from backend.core.compression import VectorSidecar, fit_pca, quantize, dequantize, cosine_scores
+from backend.scripts.bench_memory import disk_usage, percentile
+
+
+def synthetic_vectors(count: int, dim: int, seed: int):
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    # Topics in a 48-dimensional latent space, mapped into `dim` dimensions, plus isotropic noise
+    latent, topics = 48, 200
+    basis = rng.standard_normal((latent, dim)).astype(np.float32)
+    centers = rng.standard_normal((topics, latent)).astype(np.float32)
+    points = centers[rng.integers(0, topics, count)] + 0.6 * rng.standard_normal((count, latent)).astype(np.float32)
+    vectors = points @ basis + 0.35 * np.sqrt(latent) * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def user_vectors(user_id: str):
+    import numpy as np
+    from backend.core.compression import COMPRESSION_KEY
+    from backend.core.memory import mimir_memory
+    from backend.scripts.migrate_memory_layout import read_collection
+
+    with mimir_memory.use_store(user_id) as store:
+        if (store._collection.metadata or {}).get(COMPRESSION_KEY):
+            sys.exit(f"{user_id}'s memory is already compressed; run compress_memory --undo to measure it")
+        pages = [np.asarray(e, dtype=np.float32) for _, e, _, _ in read_collection(store._collection)]
+    mimir_memory.close()
+    if not pages:
+        sys.exit(f"No stored vectors for {user_id}")
+    return np.concatenate(pages)
+
+
+def recall_at_k(found, truth) -> float:
+    return len(set(found) & set(truth)) / len(truth) if truth else 1.0
+
+
+def build(client, name: str, ids, vectors) -> float:
+    start = time.perf_counter()
+    collection = client.create_collection(name)
+    for i in range(0, len(ids), 4096):
+        collection.upsert(ids=ids[i:i + 4096], embeddings=vectors[i:i + 4096].tolist())
+    return time.perf_counter() - start
+
+
+def run(vectors, queries: int, k: int, dims: list, factor: int, seed: int, parent_dir: str) -> dict:
+    import numpy as np
+    import chromadb
+
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vectors))
+    query_vectors, base = vectors[order[:queries]], vectors[order[queries:]]
+    ids = [str(i) for i in range(len(base))]
+    truth = [list(np.argsort(-cosine_scores(base, q))[:k]) for q in query_vectors]
+    truth = [[ids[i] for i in t] for t in truth]
+
+    workdir = tempfile.mkdtemp(prefix="mimir_bench_compression_", dir=parent_dir)
+    results = []
+    try:
+        sidecar = VectorSidecar(os.path.join(workdir, "_compression"))
+        sidecar.put("bench", ids, base)
+        sidecar_mb = disk_usage(sidecar.directory) / (1024 * 1024)
+
+        # Quantization on its own: exact search over the int8 vectors
+        codes, scales = quantize(base)
+        restored = dequantize(codes, scales)
+        found = [[ids[i] for i in np.argsort(-cosine_scores(restored, q))[:k]] for q in query_vectors]
+        int8_recall = float(np.mean([recall_at_k(f, t) for f, t in zip(found, truth)]))
+
+        def measure(label, dim, collection_vectors, project, rescore):
+            path = os.path.join(workdir, label)
+            client = chromadb.PersistentClient(path=path)
+            build_s = build(client, "bench", ids, collection_vectors)
+            collection = client.get_collection("bench")
+            recalls, latencies = [], []
+            for q, t in zip(query_vectors, truth):
+                start = time.perf_counter()
+                fetch = k * factor if rescore else k
+                hit_ids = collection.query(query_embeddings=[project(q).tolist()], n_results=fetch, include=[])["ids"][0]
+                if rescore:
+                    full = sidecar.get("bench", hit_ids)
+                    scores = cosine_scores(np.stack([full[i] for i in hit_ids]), q)
+                    hit_ids = [hit_ids[n] for n in np.argsort(-scores)[:k]]
+                latencies.append((time.perf_counter() - start) * 1000)
+                recalls.append(recall_at_k(hit_ids, t))
+            client._system.stop()
+            chroma_mb = disk_usage(path) / (1024 * 1024)
+            results.append({
+                "config": label,
+                "dims": dim,
+                f"recall@{k}": round(float(np.mean(recalls)), 4),
+                "query_p50_ms": round(percentile(latencies, 50), 2),
+                "query_p95_ms": round(percentile(latencies, 95), 2),
+                "chroma_mb": round(chroma_mb, 2),
+                "sidecar_mb": round(sidecar_mb, 2) if rescore else 0.0,
+                "vector_bytes": dim * 4 + ((base.shape[1] + 4) if rescore else 0),
+                "build_s": round(build_s, 2),
+            })
+            print(f"[BENCH] {label}: recall@{k} {results[-1][f'recall@{k}']}", file=sys.stderr)
+
+        measure("float32", base.shape[1], base, lambda q: q, rescore=False)
+        for dim in dims:
+            projection = fit_pca(base, dim, seed=seed)
+            reduced = projection.project(base)
+            measure(f"pca{dim}", dim, reduced, lambda q: projection.project([q])[0], rescore=False)
+            measure(f"pca{dim}+int8 rescore", dim, reduced, lambda q: projection.project([q])[0], rescore=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {"vectors": len(base), "queries": len(query_vectors), "dimensions": int(base.shape[1]), "k": k,
+            "rescore_factor": factor, "int8_exact_recall": round(int8_recall, 4), "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", help="Measure on this user's stored vectors")
+    parser.add_argument("--synthetic", type=int, default=10000, help="Synthetic corpus size (without --user)")
+    parser.add_argument("--dim", type=int, default=768, help="Synthetic vector dimensions")
+    parser.add_argument("--dims", default="96,192,384", help="Comma-separated PCA sizes to try")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=int(os.getenv("MIMIR_RESCORE_FACTOR", "4")))
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--dir", default=None, help="Where to create the temporary collections")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    vectors = user_vectors(args.user) if args.user else synthetic_vectors(args.synthetic, args.dim, args.seed)
+    dims = [int(d) for d in args.dims.split(",") if d.strip() and int(d) < vectors.shape[1]]
+    report = run(vectors, min(args.queries, len(vectors) // 10), args.k, dims, args.rescore_factor, args.seed, args.dir)
+    report["source"] = f"user:{args.user}" if args.user else "synthetic"
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    k = report["k"]
+    print(f"{report['vectors']} vectors x {report['dimensions']} ({report['source']}), {report['queries']} queries, "
+          f"rescore x{report['rescore_factor']}; int8 alone: recall@{k} {report['int8_exact_recall']}")
+    header = f"{'config':<22} {'recall@' + str(k):>9} {'p50 ms':>8} {'p95 ms':>8} {'chroma MB':>10} {'sidecar MB':>11} {'B/vector':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in report["results"]:
+        print(f"{r['config']:<22} {r[f'recall@{k}']:>9} {r['query_p50_ms']:>8} {r['query_p95_ms']:>8} "
+              f"{r['chroma_mb']:>10} {r['sidecar_mb']:>11} {r['vector_bytes']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Memory subsystem benchmark: how MimirMemory behaves as one user's store grows.
+
+    python -m backend.scripts.bench_memory
+    python -m backend.scripts.bench_memory --sizes 1000,10000 --out bench.json
+    python -m backend.scripts.bench_memory --out new.json --baseline bench.json --fail-over 20
+
+For every size it builds a synthetic user with that many chunks in a fresh temporary
+directory and reports:
+
+  remember      per-call latency of remember() (write-behind) and end-to-end ingest
+                throughput until everything is flushed to the store
+  open          cold store open time and the first recall after it
+  recall        warm recall p50/p99 over --queries distinct queries (recall cache off)
+  disk          total footprint and its split between vectors, keyword index and dedup
+  rss           resident memory after ingest and after the recall run
+
+Each size runs in its own subprocess so RSS isn't inherited from the previous one.
+Fully offline and deterministic: the corpus comes from a seeded generator and vectors
+from HashingEmbeddings (--dim 768 matches the Google model). The store backend follows
+the environment, so MIMIR_FLAT_STORE_MAX_CHUNKS=1000000 measures the flat store. Results are JSON (stdout,
+or --out) so runs can be compared across changes with --baseline.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+SCHEMA = "mimir-bench-memory"
+USER_ID = "bench-user"
+WORDS = """
+account address agenda allergy anniversary appointment bakery balcony band battery bicycle birthday
+blender boiler booking budget cabin camera candle car cat charger chemist cinema client coffee concert
+contract cousin dentist deposit desk dinner doctor dog drawing email engine exam ferry festival flight
+football garage garden gift guitar gym haircut holiday hospital hotel insurance interview invoice jacket
+kettle keyboard kitchen ladder laptop lawyer lease lecture library luggage market meeting mortgage museum
+neighbour notebook office paint parcel passport pension pharmacy piano plumber podcast printer project
+receipt recipe refund rent report roof router salary school scooter seminar shelf shoes sister sofa
+subscription suitcase surgery tax taxi teacher tent ticket tiles train trip tutor vaccine van visa wallet
+wedding window workshop
+""".split()
+VERBS = ["booked", "mentioned", "finished", "forgot", "planned", "moved", "paid", "called", "fixed",
+         "started", "cancelled", "postponed", "ordered", "returned", "discussed", "signed"]
+
+
+def synthetic_chunk(rng: random.Random, i: int) -> str:
+    """A 200-700 character memory; the sequence number and an identifier keep every chunk distinct."""
+    sentences = [f"Note {i}: order {rng.choice('ABCDEFGH')}{rng.randint(10000, 99999)}."]
+    for _ in range(rng.randint(3, 10)):
+        a, b = rng.sample(WORDS, 2)
+        sentences.append(f"User {rng.choice(VERBS)} the {a} on day {rng.randint(1, 28)} "
+                         f"and said the {b} was {rng.choice(['great', 'late', 'expensive', 'done', 'fine'])}.")
+    return " ".join(sentences)
+
+
+def disk_usage(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def run_size(size: int, queries: int, dim: int, seed: int, parent_dir: str) -> dict:
+    """One benchmark case; runs inside the subprocess."""
+    # Write-behind on (that's what remember() does in production), no idle sweeps, no recall cache
+    os.environ["MIMIR_INGEST_WRITE_BEHIND"] = "1"
+    os.environ["MIMIR_MEMORY_STORE_IDLE_SECONDS"] = "0"
+    os.environ["MIMIR_RECALL_CACHE_SIZE"] = "0"
+    from backend.core.embeddings import HashingEmbeddings
+    from backend.core.memory import MimirMemory, LEXICAL_DIRNAME
+    from backend.core.memory_store import process_rss_mb
+
+    rng = random.Random(seed)
+    workdir = tempfile.mkdtemp(prefix=f"mimir_bench_memory_{size}_", dir=parent_dir)
+    try:
+        memory = MimirMemory(base_directory=workdir, embedding_function=HashingEmbeddings(dim), layout="per_user")
+        rss_start = process_rss_mb()
+
+        # remember(): call latency (enqueue) and throughput until the buffer has drained
+        call_us = []
+        start = time.perf_counter()
+        for i in range(size):
+            text = synthetic_chunk(rng, i)
+            t = time.perf_counter()
+            memory.remember(text, user_id=USER_ID)
+            call_us.append((time.perf_counter() - t) * 1e6)
+        memory.flush()
+        ingest_s = time.perf_counter() - start
+        with memory.use_store(USER_ID) as store:
+            stored = store._collection.count()
+        rss_ingested = process_rss_mb()
+
+        # Cold open: a closed store and the first query against it (Chroma loads the index lazily)
+        memory.stores.close_all()
+        start = time.perf_counter()
+        with memory.use_store(USER_ID):
+            open_ms = (time.perf_counter() - start) * 1000
+        memory.stores.close_all()
+        start = time.perf_counter()
+        memory.recall(f"what about the {rng.choice(WORDS)}", user_id=USER_ID)
+        cold_recall_ms = (time.perf_counter() - start) * 1000
+
+        latencies = []
+        for i in range(queries):
+            a, b = rng.sample(WORDS, 2)
+            query = f"when was the {a} {rng.choice(VERBS)} and what about the {b} ({i})"
+            start = time.perf_counter()
+            memory.recall(query, user_id=USER_ID)
+            latencies.append((time.perf_counter() - start) * 1000)
+        rss_recall = process_rss_mb()
+        memory.close()
+
+        mb = 1024 * 1024
+        lexical_bytes = disk_usage(os.path.join(workdir, LEXICAL_DIRNAME))
+        vector_bytes = disk_usage(memory._persist_dir(USER_ID))
+        total_bytes = disk_usage(workdir)
+        return {
+            "size": size,
+            "stored_chunks": stored,
+            "dim": dim,
+            "remember_call_p50_us": round(percentile(call_us, 50), 1),
+            "remember_call_p99_us": round(percentile(call_us, 99), 1),
+            "ingest_s": round(ingest_s, 2),
+            "ingest_chunks_per_s": round(stored / ingest_s, 1) if ingest_s else None,
+            "store_open_ms": round(open_ms, 2),
+            "cold_recall_ms": round(cold_recall_ms, 2),
+            "recall_p50_ms": round(percentile(latencies, 50), 2),
+            "recall_p99_ms": round(percentile(latencies, 99), 2),
+            "disk_mb": round(total_bytes / mb, 2),
+            "disk_vectors_mb": round(vector_bytes / mb, 2),
+            "disk_lexical_mb": round(lexical_bytes / mb, 2),
+            "disk_other_mb": round((total_bytes - vector_bytes - lexical_bytes) / mb, 2),
+            "bytes_per_chunk": round(total_bytes / stored) if stored else None,
+            "rss_start_mb": rss_start,
+            "rss_after_ingest_mb": rss_ingested,
+            "rss_after_recall_mb": rss_recall,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def spawn_size(args, size: int) -> dict:
+    """Runs one size in a fresh interpreter; its chatter goes to stderr, its result through a file."""
+    fd, result_path = tempfile.mkstemp(prefix="mimir_bench_result_", suffix=".json")
+    os.close(fd)
+    command = [sys.executable, "-m", "backend.scripts.bench_memory", "--case", str(size), "--result-file", result_path,
+               "--queries", str(args.queries), "--dim", str(args.dim), "--seed", str(args.seed)]
+    if args.dir:
+        command += ["--dir", args.dir]
+    try:
+        subprocess.run(command, check=True, stdout=sys.stderr)
+        with open(result_path) as f:
+            return json.load(f)
+    finally:
+        os.remove(result_path)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+# Metrics compared against a baseline (remember() call latency is a few microseconds, too noisy to gate on)
+COMPARED = ["ingest_chunks_per_s", "store_open_ms", "cold_recall_ms",
+            "recall_p50_ms", "recall_p99_ms", "disk_mb", "rss_after_recall_mb"]
+HIGHER_IS_BETTER = {"ingest_chunks_per_s"}
+
+
+def compare(results: list, baseline: dict, fail_over: float = None) -> bool:
+    """Prints the change per metric against a previous run. Returns False if any regressed past fail_over %."""
+    previous = {r["size"]: r for r in baseline.get("results", [])}
+    ok = True
+    print(f"\nvs. baseline {baseline.get('git_commit') or '?'} ({baseline.get('created') or '?'})", file=sys.stderr)
+    for r in results:
+        old = previous.get(r["size"])
+        if not old:
+            continue
+        for metric in COMPARED:
+            before, after = old.get(metric), r.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = ""
+            if fail_over is not None and worse > fail_over:
+                flag, ok = "  REGRESSION", False
+            print(f"  {r['size']:>7} {metric:<22} {before:>10} -> {after:<10} {change:+.1f}%{flag}", file=sys.stderr)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated chunk counts")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=768, help="Embedding dimensions")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--dir", default=None, help="Where to create the temporary stores")
+    parser.add_argument("--out", default=None, help="Also write the JSON results to this file")
+    parser.add_argument("--baseline", default=None, help="Previous results file to compare against")
+    parser.add_argument("--fail-over", type=float, default=None,
+                        help="Exit with status 1 if a compared metric is this many percent worse than the baseline")
+    parser.add_argument("--case", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        with open(args.result_file, "w") as f:
+            json.dump(run_size(args.case, args.queries, args.dim, args.seed, args.dir), f)
+        return
+
+    results = []
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        print(f"[BENCH] {size} chunks...", file=sys.stderr)
+        results.append(spawn_size(args, size))
+
+    report = {
+        "schema": SCHEMA,
+        "version": 1,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {"queries": args.queries, "dim": args.dim, "seed": args.seed},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.fail_over):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
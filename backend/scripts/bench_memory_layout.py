@@ -0,0 +1,130 @@
+"""
+Compares memory layouts (MIMIR_MEMORY_LAYOUT) on recall latency and disk footprint.
+
+    python -m backend.scripts.bench_memory_layout
+    python -m backend.scripts.bench_memory_layout --users 10,1000 --layouts per_user,shared --json
+
+For each layout and user count it builds a fresh store in a temporary directory with
+synthetic memories and the offline HashingEmbeddings embedder (no API calls), then
+times recall for randomly chosen users. With more users than MIMIR_MEMORY_MAX_OPEN_STORES
+most recalls hit a closed store, which is the cost the shared layouts avoid.
+Point --dir at the GCS mount to include FUSE overhead.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+# Synchronous writes, and no idle sweeps or cache files skewing the numbers
+os.environ["MIMIR_INGEST_WRITE_BEHIND"] = "0"
+os.environ["MIMIR_MEMORY_STORE_IDLE_SECONDS"] = "0"
+os.environ["MIMIR_RECALL_CACHE_SIZE"] = "0" # Repeated queries would be answered without touching the store
+
+from backend.core.embeddings import HashingEmbeddings
+from backend.core.memory import MimirMemory
+from backend.core.memory_ingest import PendingDocument
+from backend.core.memory_store import MEMORY_LAYOUTS
+
+TOPICS = ["dog", "garden", "tax", "holiday", "dentist", "football", "recipe", "car", "birthday", "project",
+          "piano", "mortgage", "running", "book", "meeting", "flight", "insurance", "sister", "laptop", "coffee"]
+VERBS = ["booked", "mentioned", "finished", "forgot", "planned", "moved", "paid", "called", "fixed", "started"]
+
+
+def synthetic_memory(rng: random.Random) -> str:
+    topic, other = rng.sample(TOPICS, 2)
+    return (f"User {rng.choice(VERBS)} the {topic} on day {rng.randint(1, 28)} "
+            f"and said the {other} was {rng.choice(['great', 'late', 'expensive', 'done', 'cancelled'])}.")
+
+
+def disk_usage(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def run_case(layout: str, users: int, docs_per_user: int, queries: int, parent_dir: str, seed: int) -> dict:
+    rng = random.Random(seed)
+    workdir = tempfile.mkdtemp(prefix=f"mimir_bench_{layout}_{users}_", dir=parent_dir)
+    memory = MimirMemory(base_directory=workdir, embedding_function=HashingEmbeddings(), layout=layout)
+    user_ids = [f"bench-user-{i:05d}" for i in range(users)]
+    try:
+        start = time.perf_counter()
+        batch = []
+        for user_id in user_ids:
+            for _ in range(docs_per_user):
+                batch.append(PendingDocument(user_id, synthetic_memory(rng), {"user_id": user_id}))
+            if len(batch) >= 512:
+                memory._ingest_batch(batch)
+                batch = []
+        if batch:
+            memory._ingest_batch(batch)
+        ingest_s = time.perf_counter() - start
+
+        latencies = []
+        for _ in range(queries):
+            user_id = rng.choice(user_ids)
+            query = f"what about the {rng.choice(TOPICS)}?"
+            start = time.perf_counter()
+            memory.recall(query, user_id=user_id)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        memory.close()
+        return {
+            "layout": layout,
+            "users": users,
+            "documents": users * docs_per_user,
+            "ingest_s": round(ingest_s, 2),
+            "recall_p50_ms": round(percentile(latencies, 50), 2),
+            "recall_p95_ms": round(percentile(latencies, 95), 2),
+            "disk_mb": round(disk_usage(workdir) / (1024 * 1024), 2),
+            "store_opens": memory.stores.stats()["opens"],
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="10,1000,10000", help="Comma-separated user counts")
+    parser.add_argument("--layouts", default=",".join(MEMORY_LAYOUTS), help="Comma-separated layouts")
+    parser.add_argument("--docs-per-user", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dir", default=None, help="Where to create the temporary stores")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for users in [int(u) for u in args.users.split(",") if u.strip()]:
+        for layout in [l.strip() for l in args.layouts.split(",") if l.strip()]:
+            print(f"[BENCH] {layout} with {users} users...", file=sys.stderr)
+            results.append(run_case(layout, users, args.docs_per_user, args.queries, args.dir, args.seed))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    header = f"{'layout':<12} {'users':>7} {'docs':>8} {'ingest s':>9} {'p50 ms':>8} {'p95 ms':>8} {'disk MB':>9} {'opens':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['layout']:<12} {r['users']:>7} {r['documents']:>8} {r['ingest_s']:>9} "
+              f"{r['recall_p50_ms']:>8} {r['recall_p95_ms']:>8} {r['disk_mb']:>9} {r['store_opens']:>7}")
+
+
+if __name__ == "__main__":
+    main()
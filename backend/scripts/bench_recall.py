@@ -0,0 +1,152 @@
+"""
+Recall quality and latency benchmark: vector-only vs. hybrid (BM25 + vector, fused)
+vs. hybrid with the lexical fast path.
+
+    python -m backend.scripts.bench_recall
+    python -m backend.scripts.bench_recall --docs 5000 --embed-latency-ms 120 --json
+
+Builds one synthetic user whose memories mix everyday notes with exact identifiers
+(order numbers, file names, people), then asks a query per target memory and reports
+hit@k, MRR, latency percentiles and how many queries needed an embedding call.
+Embeddings come from the offline HashingEmbeddings, with --embed-latency-ms added to
+each query embedding to stand in for the network round trip to the embedding API.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+os.environ["MIMIR_INGEST_WRITE_BEHIND"] = "0"
+os.environ["MIMIR_RECALL_CACHE_SIZE"] = "0" # Every mode must run its own search, not replay cached candidates
+
+from backend.core.embeddings import HashingEmbeddings
+from backend.core.memory import MimirMemory
+from backend.core.memory_ingest import PendingDocument
+
+USER_ID = "bench-user"
+ITEMS = ["standing desk", "headphones", "kettle", "running shoes", "monitor", "bike lights", "tent", "blender"]
+PEOPLE = ["Priya Raman", "Tomasz Nowak", "Aoife Byrne", "Kwame Mensah", "Lucia Ferraro", "Hiro Tanaka"]
+ROLES = ["accountant", "physio", "landlord", "manager", "plumber", "tutor"]
+TOPICS = ["garden", "holiday", "dentist", "football", "recipe", "car", "birthday", "piano", "mortgage", "book"]
+
+
+class SlowEmbeddings:
+    """Adds a fixed delay to query embeddings, like a remote embedding API would."""
+
+    def __init__(self, inner, latency_ms: float):
+        self.inner = inner
+        self.latency = latency_ms / 1000
+        self.query_calls = 0
+
+    def embed_documents(self, texts):
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text):
+        self.query_calls += 1
+        time.sleep(self.latency)
+        return self.inner.embed_query(text)
+
+
+def build_corpus(rng: random.Random, docs: int):
+    """Returns (memories, [(query, target memory)])."""
+    memories, cases = [], []
+    for i in range(docs):
+        kind = i % 4
+        if kind == 0:
+            order = f"{rng.choice('ABCDEFGH')}{rng.randint(10000, 99999)}"
+            item = rng.choice(ITEMS)
+            text = f"Order {order} for the {item} was dispatched and should arrive on day {rng.randint(1, 28)}."
+            cases.append((f"where is order {order}", text))
+        elif kind == 1:
+            name = f"{rng.choice(TOPICS)}_plan_{rng.randint(100, 999)}.pdf"
+            text = f"Uploaded {name} with notes about the {rng.choice(TOPICS)} budget."
+            cases.append((f"what was in {name}", text))
+        elif kind == 2:
+            person, role = rng.choice(PEOPLE), rng.choice(ROLES)
+            text = f"{person} is the new {role}; meeting them on day {rng.randint(1, 28)} about the {rng.choice(TOPICS)}."
+            cases.append((f"when am I meeting the {role} {person.split()[0]} about it", text))
+        else:
+            topic, other = rng.sample(TOPICS, 2)
+            text = f"Felt good about the {topic} today, though the {other} still needs sorting out ({i})."
+            cases.append((f"how did I feel about the {topic} and the {other}", text))
+        memories.append(text)
+    return memories, cases
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def evaluate(memory: MimirMemory, embedder: SlowEmbeddings, cases, k: int) -> dict:
+    embedder.query_calls = 0
+    hits = 0
+    reciprocal = 0.0
+    latencies = []
+    for query, target in cases:
+        start = time.perf_counter()
+        results = memory.search(query, user_id=USER_ID, k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if target in results[:k]:
+            hits += 1
+            reciprocal += 1.0 / (results.index(target) + 1)
+    return {
+        f"hit@{k}": round(hits / len(cases), 4),
+        "mrr": round(reciprocal / len(cases), 4),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "embed_calls": embedder.query_calls,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--embed-latency-ms", type=float, default=80.0)
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    memories, cases = build_corpus(rng, args.docs)
+    cases = rng.sample(cases, min(args.queries, len(cases)))
+
+    workdir = tempfile.mkdtemp(prefix="mimir_bench_recall_")
+    embedder = SlowEmbeddings(HashingEmbeddings(), args.embed_latency_ms)
+    memory = MimirMemory(base_directory=workdir, embedding_function=embedder)
+    try:
+        print(f"[BENCH] Ingesting {len(memories)} memories...", file=sys.stderr)
+        memory._ingest_batch([PendingDocument(USER_ID, m, {"user_id": USER_ID}) for m in memories])
+
+        lexical = memory.lexical
+        modes = {}
+        memory.lexical = None
+        modes["vector"] = evaluate(memory, embedder, cases, args.k)
+        memory.lexical, memory.lexical_fast_path = lexical, False
+        modes["hybrid"] = evaluate(memory, embedder, cases, args.k)
+        memory.lexical_fast_path = True
+        modes["hybrid+fast_path"] = evaluate(memory, embedder, cases, args.k)
+        memory.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({"docs": len(memories), "queries": len(cases), "modes": modes}, indent=2))
+        return
+
+    print(f"{len(memories)} memories, {len(cases)} queries, +{args.embed_latency_ms:.0f} ms per query embedding")
+    header = f"{'mode':<18} {'hit@' + str(args.k):>7} {'mrr':>7} {'p50 ms':>8} {'p95 ms':>8} {'embeds':>7}"
+    print(header)
+    print("-" * len(header))
+    for mode, r in modes.items():
+        print(f"{mode:<18} {r[f'hit@{args.k}']:>7} {r['mrr']:>7} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['embed_calls']:>7}")
+
+
+if __name__ == "__main__":
+    main()
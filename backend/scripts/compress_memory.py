@@ -0,0 +1,143 @@
+"""
+Stores PCA-reduced vectors in users' memory collections, with int8 full vectors kept
+aside for rescoring (or undoes it).
+
+    python -m backend.scripts.compress_memory --dims 192
+    python -m backend.scripts.compress_memory --user alice --dims 128
+    python -m backend.scripts.compress_memory --user alice --undo
+
+Run with the service stopped. For each user the PCA is fitted on their own vectors,
+the full vectors go to an int8 sidecar (_compression/<user>.sqlite3) and the collection
+is rebuilt with the reduced vectors into a temporary collection that replaces the
+original once complete. Chroma's index and files shrink roughly by 768/dims; recall
+over-fetches MIMIR_RESCORE_FACTOR x k candidates from it and re-ranks them by cosine
+against the sidecar. Measure the trade-off on your data first with
+backend.scripts.bench_compression. Not available for MIMIR_MEMORY_LAYOUT=shared, where
+all users share one collection. --undo restores full vectors from the sidecar (int8
+precision, which ranks practically the same).
+"""
+import sys
+import time
+import argparse
+
+from backend.core.compression import COMPRESSION_KEY, fit_pca
+from backend.core.flat_store import FlatStore
+from backend.core.memory import mimir_memory, GENERATION_NAMESPACE
+from backend.core.state import state_store
+from backend.scripts.migrate_memory_layout import find_user_stores, read_collection
+
+# Fewer chunks than this aren't worth compressing and give a poor PCA fit
+MIN_CHUNKS = 1000
+
+
+def user_ids():
+    if mimir_memory.layout == "per_user":
+        mimir_memory.hydrate_all() # With a local working copy, list every user, not just those already copied
+        return [dir_name for dir_name, _ in find_user_stores(mimir_memory.base_directory)]
+    client = mimir_memory._get_shared_client()
+    users = []
+    for collection in client.list_collections():
+        name = getattr(collection, "name", collection)
+        metadata = client.get_collection(name).metadata or {}
+        if metadata.get("user_id") and not name.endswith(("_compress", "_reindex")):
+            users.append(metadata["user_id"])
+    return users
+
+
+def rebuild(store, metadata: dict, vectors_for):
+    """Rebuilds the store's collection in place (via a temporary copy) with vectors_for(ids, embeddings) and `metadata`."""
+    client, collection = store._client, store._collection
+    name = collection.name
+    temp_name = f"{name}_compress"
+    try:
+        client.delete_collection(temp_name) # Leftover from an interrupted run
+    except Exception:
+        pass
+    target = client.create_collection(temp_name, metadata=metadata)
+    for ids, embeddings, documents, metadatas in read_collection(collection):
+        target.upsert(ids=ids, embeddings=vectors_for(ids, embeddings), documents=documents, metadatas=metadatas)
+    client.delete_collection(name)
+    target.modify(name=name)
+
+
+def compress_user(user_id: str, dims: int) -> str:
+    with mimir_memory.use_store(user_id) as store:
+        if isinstance(store, FlatStore):
+            return "flat store (small user), nothing to compress"
+        mimir_memory.mark_changed(user_id)
+        collection = store._collection
+        metadata = dict(collection.metadata or {})
+        if metadata.get(COMPRESSION_KEY):
+            return f"already {metadata[COMPRESSION_KEY]}"
+        count = collection.count()
+        if count < max(MIN_CHUNKS, 2 * dims):
+            return f"{count} chunks, too few to compress"
+
+        import numpy as np
+        full = np.concatenate([np.asarray(e, dtype=np.float32) for _, e, _, _ in read_collection(collection)])
+        projection = fit_pca(full, dims)
+        explained = projection.explained(full)
+
+        sidecar = mimir_memory.compression
+        sidecar.drop(user_id)
+        sidecar.save_projection(user_id, projection)
+        for ids, embeddings, _, _ in read_collection(collection):
+            sidecar.put(user_id, ids, embeddings)
+        metadata[COMPRESSION_KEY] = projection.label
+        rebuild(store, metadata, lambda ids, embeddings: projection.project(embeddings).tolist())
+    reopen(user_id)
+    return f"{count} chunks, {full.shape[1]} -> {dims} dims, {explained:.1%} of variance kept"
+
+
+def undo_user(user_id: str) -> str:
+    with mimir_memory.use_store(user_id) as store:
+        collection = store._collection
+        metadata = dict(collection.metadata or {})
+        if not metadata.pop(COMPRESSION_KEY, None):
+            return "not compressed"
+        mimir_memory.mark_changed(user_id)
+        sidecar = mimir_memory.compression
+
+        def full_vectors(ids, _):
+            found = sidecar.get(user_id, ids)
+            missing = [i for i in ids if i not in found]
+            if missing:
+                raise RuntimeError(f"{len(missing)} chunks have no full vector in the sidecar")
+            return [found[i].tolist() for i in ids]
+
+        count = collection.count()
+        rebuild(store, metadata, full_vectors)
+    sidecar.drop(user_id)
+    reopen(user_id)
+    return f"{count} chunks restored to full vectors"
+
+
+def reopen(user_id: str):
+    # Open stores (here and in any running worker) must reload the collection and its projection
+    mimir_memory.stores.discard(user_id)
+    state_store.incr(GENERATION_NAMESPACE, user_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", action="append", help="User to process (repeatable; default: all)")
+    parser.add_argument("--dims", type=int, default=192, help="Dimensions to keep")
+    parser.add_argument("--undo", action="store_true", help="Restore full vectors")
+    args = parser.parse_args()
+
+    if mimir_memory.layout == "shared":
+        sys.exit("Compression is per collection; it isn't available with MIMIR_MEMORY_LAYOUT=shared")
+
+    start = time.perf_counter()
+    for user_id in args.user or user_ids():
+        try:
+            result = undo_user(user_id) if args.undo else compress_user(user_id, args.dims)
+        except Exception as e:
+            result = f"failed: {e}"
+        print(f"  {user_id}: {result}")
+    mimir_memory.close()
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
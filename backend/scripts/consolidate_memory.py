@@ -0,0 +1,32 @@
+"""
+Runs one memory consolidation pass and exits.
+
+Folds conversation chunks older than MIMIR_CONSOLIDATION_MIN_AGE_DAYS into one
+summary per day. For deployments that keep MIMIR_CONSOLIDATION=off in the web
+workers and schedule this externally instead, or to preview a first run:
+
+    python -m backend.scripts.consolidate_memory --dry-run
+    python -m backend.scripts.consolidate_memory --user <user_id>
+"""
+import argparse
+
+from backend.core.consolidation import ConsolidationJob
+from backend.core.memory import mimir_memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", action="append", help="Only these users (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be consolidated")
+    args = parser.parse_args()
+
+    results = ConsolidationJob().run_once(user_ids=args.user, dry_run=args.dry_run)
+    mimir_memory.close()
+
+    verb = "would be" if args.dry_run else "were"
+    for user_id, r in results.items():
+        print(f"  {user_id}: {r['candidates']} old conversation chunks, {r['removed']} {verb} folded into {r['summaries']} summaries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Exports or imports one user's memory as vectors.npy + records.jsonl.gz (+ manifest.json).
+
+    python -m backend.scripts.memory_transfer export --user <user_id> --out backups/<user_id>
+    python -m backend.scripts.memory_transfer import --user <user_id> --src backups/<user_id>
+
+Import bulk-loads the stored vectors (no re-embedding) and keeps chunk IDs, so it is
+safe to repeat. Use it for backups, moving a user between deployments or layouts,
+and seeding benchmark stores.
+"""
+import argparse
+
+from backend.core.memory import mimir_memory
+from backend.core.memory_export import export_user, import_user
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="Write a user's memory to a directory")
+    exp.add_argument("--user", required=True)
+    exp.add_argument("--out", required=True)
+    imp = sub.add_parser("import", help="Load an export into a user's memory")
+    imp.add_argument("--user", required=True, help="Target user (may differ from the exporting user)")
+    imp.add_argument("--src", required=True)
+    imp.add_argument("--allow-model-mismatch", action="store_true",
+                     help="Import vectors from another embedding model (run reindex_memory afterwards)")
+    for p in (exp, imp):
+        p.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        result = export_user(mimir_memory, args.user, args.out, batch_size=args.batch_size)
+    else:
+        result = import_user(mimir_memory, args.user, args.src, batch_size=args.batch_size,
+                             allow_model_mismatch=args.allow_model_mismatch)
+    mimir_memory.close()
+
+    rate = result["count"] / result["seconds"] if result["seconds"] else 0
+    print(f"{args.command.capitalize()}ed {result['count']} chunks for {result['user_id']} "
+          f"in {result['seconds']}s ({rate:.0f} chunks/s)")
+
+
+if __name__ == "__main__":
+    main()
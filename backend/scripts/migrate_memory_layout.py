@@ -0,0 +1,158 @@
+"""
+Copies memories from the per-user directory layout into a shared Chroma client.
+
+    python -m backend.scripts.migrate_memory_layout --to collections
+    python -m backend.scripts.migrate_memory_layout --to shared --dry-run
+
+Vectors are copied as stored (nothing is re-embedded) and every record gets a
+`user_id` metadata field. Source directories are left in place; once recall looks
+right with MIMIR_MEMORY_LAYOUT set to the new layout they can be removed (or pass
+--remove-source). Run it with the service stopped, or at least with no writes.
+"""
+import os
+import shutil
+import argparse
+from typing import Optional
+
+from backend.core.compression import COMPRESSION_KEY
+from backend.core.embeddings import DEFAULT_GOOGLE_MODEL
+from backend.core.flat_store import FlatStore
+from backend.core.memory import memory_base_directory
+from backend.core.memory_store import COLLECTION_NAME, SHARED_STORE_DIRNAME, user_collection_name
+
+PAGE_SIZE = 500
+
+
+def find_user_stores(base_directory: str):
+    """Yields (directory, path) for every per-user Chroma directory."""
+    for name in sorted(os.listdir(base_directory)):
+        path = os.path.join(base_directory, name)
+        if name.startswith("_") or not os.path.isdir(path):
+            continue
+        # A flat store next to a Chroma database is an unfinished promotion; the flat store is the live one
+        if os.path.exists(os.path.join(path, "chroma.sqlite3")) and not FlatStore.exists(path):
+            yield name, path
+
+
+def find_flat_stores(base_directory: str):
+    """Yields (directory, path) for every per-user flat store (see MIMIR_FLAT_STORE_MAX_CHUNKS)."""
+    for name in sorted(os.listdir(base_directory)):
+        path = os.path.join(base_directory, name)
+        if not name.startswith("_") and os.path.isdir(path) and FlatStore.exists(path):
+            yield name, path
+
+
+def read_collection(collection):
+    """Pages through a collection, yielding (ids, embeddings, documents, metadatas)."""
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "documents", "metadatas"], limit=PAGE_SIZE, offset=offset)
+        if not page["ids"]:
+            return
+        yield page["ids"], page["embeddings"], page["documents"], page["metadatas"]
+        offset += len(page["ids"])
+
+
+def migrate_user(source_path: str, dir_name: str, target_client, layout: str, dry_run: bool) -> Optional[int]:
+    """
+    Copies one user's records and returns how many; None if the user was skipped or the
+    copy could not be verified (every source record read back from the target), in which
+    case the source must be kept.
+    """
+    import chromadb
+
+    if FlatStore.exists(source_path):
+        source = collection = FlatStore(source_path)
+    else:
+        source = chromadb.PersistentClient(path=source_path)
+        try:
+            collection = source.get_collection(COLLECTION_NAME)
+        except Exception:
+            print(f"  {dir_name}: no '{COLLECTION_NAME}' collection, skipping")
+            source._system.stop()
+            return None
+
+    # Keep recording which model produced the vectors (collections predating that used the Google default)
+    model = {"embedding_model": (collection.metadata or {}).get("embedding_model", DEFAULT_GOOGLE_MODEL)}
+    if (collection.metadata or {}).get(COMPRESSION_KEY):
+        if layout == "shared":
+            print(f"  {dir_name}: holds {collection.metadata[COMPRESSION_KEY]} vectors; run compress_memory --undo first")
+            if isinstance(source, FlatStore):
+                source.close()
+            else:
+                source._system.stop()
+            return None
+        model[COMPRESSION_KEY] = collection.metadata[COMPRESSION_KEY] # The sidecar is keyed by user, it carries over
+    expected = collection.count()
+    copied = 0
+    target = None
+    copied_ids = []
+    for ids, embeddings, documents, metadatas in read_collection(collection):
+        metadatas = [dict(m or {}) for m in metadatas]
+        # remember() has always stored user_id; the directory name is the fallback for older records
+        user_id = next((m["user_id"] for m in metadatas if m.get("user_id")), dir_name)
+        for m in metadatas:
+            m.setdefault("user_id", user_id)
+
+        if not dry_run:
+            if target is None:
+                if layout == "collections":
+                    target = target_client.get_or_create_collection(
+                        user_collection_name(user_id), metadata={**model, "user_id": user_id}
+                    )
+                else:
+                    target = target_client.get_or_create_collection(COLLECTION_NAME, metadata=model)
+            target.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+            copied_ids.append(ids)
+        copied += len(ids)
+
+    if isinstance(source, FlatStore):
+        source.close()
+    else:
+        source._system.stop()
+    if dry_run:
+        return copied
+    found = sum(len(target.get(ids=ids, include=[])["ids"]) for ids in copied_ids) if target is not None else 0
+    if copied != expected or found != expected:
+        print(f"[ERROR] {dir_name}: source has {expected} records, copied {copied}, found {found} in the target")
+        return None
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--to", choices=["collections", "shared"], required=True, help="Target layout")
+    parser.add_argument("--base-dir", default=None, help="Memory directory (default: MIMIR_DATA_DIR based)")
+    parser.add_argument("--dry-run", action="store_true", help="Count records without writing")
+    parser.add_argument("--remove-source", action="store_true", help="Delete each user directory after copying it")
+    args = parser.parse_args()
+
+    import chromadb
+
+    base_directory = args.base_dir or memory_base_directory()
+    target_client = None
+    if not args.dry_run:
+        target_client = chromadb.PersistentClient(path=os.path.join(base_directory, SHARED_STORE_DIRNAME))
+
+    users = records = skipped = 0
+    for dir_name, path in sorted([*find_user_stores(base_directory), *find_flat_stores(base_directory)]):
+        copied = migrate_user(path, dir_name, target_client, args.to, args.dry_run)
+        if copied is None:
+            skipped += 1
+            continue # Never remove a source that wasn't copied in full
+        print(f"  {dir_name}: {copied} records")
+        users += 1
+        records += copied
+        if args.remove_source and not args.dry_run:
+            shutil.rmtree(path)
+
+    action = "Would copy" if args.dry_run else "Copied"
+    print(f"{action} {records} records for {users} users into the '{args.to}' layout")
+    if skipped:
+        print(f"[WARN] {skipped} users were not migrated (see above); their directories were left in place")
+    if not args.dry_run:
+        print(f"Set MIMIR_MEMORY_LAYOUT={args.to} to use it.")
+
+
+if __name__ == "__main__":
+    main()
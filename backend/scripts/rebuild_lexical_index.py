@@ -0,0 +1,42 @@
+"""
+Backfills the per-user keyword (BM25) index from the vector store.
+
+New memories are indexed as they are written; run this once after enabling the
+index to cover memories stored before it existed, or to rebuild a damaged index:
+
+    python -m backend.scripts.rebuild_lexical_index
+    python -m backend.scripts.rebuild_lexical_index --user <user_id>
+"""
+import os
+import argparse
+
+from backend.core.memory import mimir_memory
+
+
+def known_users():
+    from backend.core.user_manager import user_manager
+    users = set(user_manager.profiles)
+    if mimir_memory.layout == "per_user":
+        mimir_memory.hydrate_all() # With a local working copy, list every user, not just those already copied
+        # Directories are named after the (sanitized) user ID
+        base = mimir_memory.base_directory
+        users.update(n for n in os.listdir(base) if not n.startswith("_") and os.path.isdir(os.path.join(base, n)))
+    return sorted(users)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", action="append", help="Only rebuild these users (repeatable)")
+    args = parser.parse_args()
+
+    total = 0
+    for user_id in args.user or known_users():
+        indexed = mimir_memory.rebuild_lexical(user_id)
+        print(f"  {user_id}: {indexed} chunks")
+        total += indexed
+    mimir_memory.close()
+    print(f"Indexed {total} chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Re-embeds stored memories with the currently configured embedding backend.
+
+Vectors from different models (or dimensions) can't be searched together, so after
+changing MIMIR_EMBEDDING_BACKEND / MIMIR_LOCAL_EMBED_MODEL run, with the service stopped:
+
+    python -m backend.scripts.reindex_memory
+    python -m backend.scripts.reindex_memory --force --batch-size 128
+
+Each collection is rebuilt into a temporary `<name>_reindex` collection (same IDs,
+documents and metadata, new vectors). Only once it is complete is the original renamed
+aside to `<name>_replaced`, the new one renamed into place and the original deleted, so
+at every point one of them holds the data; a run interrupted mid-swap is completed by
+the next run (flat stores are rewritten the same way, into new files). Collections
+already embedded with the configured model are skipped unless --force is given.
+"""
+import time
+import argparse
+
+from backend.core.compression import COMPRESSION_KEY
+from backend.core.embeddings import DEFAULT_GOOGLE_MODEL
+from backend.core.flat_store import FlatStore
+from backend.core.memory import mimir_memory
+from backend.core.memory_store import COLLECTION_NAME
+from backend.scripts.migrate_memory_layout import find_user_stores, find_flat_stores, read_collection
+
+
+def _collection(client, name: str):
+    try:
+        return client.get_collection(name)
+    except Exception:
+        return None
+
+
+def recover_swap(label: str, client, name: str):
+    """
+    Finishes a swap an earlier run was interrupted in. `<name>_replaced` only exists once
+    `<name>_reindex` is complete, so the new collection is put in place if the live name is
+    missing (or holds only an empty collection the service recreated meanwhile).
+    """
+    replaced = _collection(client, f"{name}_replaced")
+    if replaced is None:
+        return
+    live, rebuilt = _collection(client, name), _collection(client, f"{name}_reindex")
+    if live is not None and rebuilt is not None:
+        if live.count():
+            print(f"[WARN] {label}: '{name}', '{name}_reindex' and '{name}_replaced' all exist; resolve by hand")
+            return
+        client.delete_collection(name)
+        live = None
+    if live is None:
+        (rebuilt or replaced).modify(name=name) # Without a rebuilt copy, the original goes back
+        print(f"  {label}: completed an interrupted swap")
+    if _collection(client, f"{name}_replaced") is not None:
+        client.delete_collection(f"{name}_replaced")
+
+
+def reindex_collection(label: str, client, name: str, batch_size: int, force: bool) -> int:
+    recover_swap(label, client, name)
+    source = client.get_collection(name)
+    metadata = dict(source.metadata or {})
+    if not force and metadata.get("embedding_model", DEFAULT_GOOGLE_MODEL) == mimir_memory.embedding_model:
+        return 0
+
+    temp_name = f"{name}_reindex"
+    try:
+        client.delete_collection(temp_name) # Leftover from an interrupted run
+    except Exception:
+        pass
+    metadata["embedding_model"] = mimir_memory.embedding_model
+    # New vectors are full-size: a compressed collection comes back uncompressed (see compress_memory)
+    compressed = metadata.pop(COMPRESSION_KEY, None)
+    target = client.create_collection(temp_name, metadata=metadata)
+
+    count = 0
+    for ids, _, documents, metadatas in read_collection(source):
+        for i in range(0, len(ids), batch_size):
+            texts = documents[i:i + batch_size]
+            vectors = mimir_memory.embedding_function.embed_documents(texts)
+            target.upsert(ids=ids[i:i + batch_size], embeddings=vectors, documents=texts, metadatas=metadatas[i:i + batch_size])
+            count += len(texts)
+
+    # Never leave the live name unset: move the original aside, put the new one in place, then delete
+    source.modify(name=f"{name}_replaced")
+    target.modify(name=name)
+    client.delete_collection(f"{name}_replaced")
+    if compressed:
+        mimir_memory.compression.drop(metadata.get("user_id") or label)
+        print(f"  {label}: was {compressed}; run compress_memory again to re-compress")
+    return count
+
+
+def reindex_flat(path: str, batch_size: int, force: bool) -> int:
+    """Re-embeds a per-user flat store; FlatStore.rewrite swaps the files in once they are complete."""
+    store = FlatStore(path)
+    metadata = store.metadata
+    if not force and metadata.get("embedding_model", DEFAULT_GOOGLE_MODEL) == mimir_memory.embedding_model:
+        store.close()
+        return 0
+    metadata["embedding_model"] = mimir_memory.embedding_model
+    count = 0
+
+    def pages():
+        nonlocal count
+        for ids, _, documents, metadatas in store.pages(batch_size):
+            count += len(ids)
+            yield ids, mimir_memory.embedding_function.embed_documents(documents), documents, metadatas
+
+    store.rewrite(pages(), metadata)
+    store.close()
+    return count
+
+
+def targets():
+    """Yields (label, client, collection name) for every stored collection."""
+    import chromadb
+
+    if mimir_memory.layout == "per_user":
+        for dir_name, path in find_user_stores(mimir_memory.base_directory):
+            client = chromadb.PersistentClient(path=path)
+            yield dir_name, client, COLLECTION_NAME
+            client._system.stop() # Runs once the caller has finished with this user
+        return
+    client = mimir_memory._get_shared_client()
+    names = set()
+    for collection in client.list_collections():
+        name = getattr(collection, "name", collection) # Older chromadb returns Collection objects
+        if name.endswith("_replaced"):
+            names.add(name[:-len("_replaced")]) # Its live name may be missing after an interrupted swap
+        elif not name.endswith("_reindex"):
+            names.add(name)
+    for name in sorted(names):
+        yield name, client, name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=64, help="Texts per embedding call")
+    parser.add_argument("--force", action="store_true", help="Re-embed even collections already on this model")
+    args = parser.parse_args()
+
+    print(f"Re-embedding with {mimir_memory.embedding_model} ({mimir_memory.layout} layout)")
+    start = time.perf_counter()
+    mimir_memory.hydrate_all() # With a local working copy, reindex every user, not just those already copied
+    total = 0
+    for label, client, name in targets():
+        if mimir_memory.snapshots:
+            mimir_memory.snapshots.mark_dirty(label) # per_user: the label is the user's directory
+        count = reindex_collection(label, client, name, args.batch_size, args.force)
+        print(f"  {label}: {count} chunks" if count else f"  {label}: already on this model")
+        total += count
+    if mimir_memory.layout == "per_user":
+        for label, path in find_flat_stores(mimir_memory.base_directory):
+            if mimir_memory.snapshots:
+                mimir_memory.snapshots.mark_dirty(label)
+            count = reindex_flat(path, args.batch_size, args.force)
+            print(f"  {label}: {count} chunks (flat store)" if count else f"  {label}: already on this model")
+            total += count
+    elapsed = time.perf_counter() - start
+    mimir_memory.close()
+    print(f"Re-embedded {total} chunks in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} chunks/s)")
+
+
+if __name__ == "__main__":
+    main()
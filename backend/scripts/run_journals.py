@@ -0,0 +1,20 @@
+"""
+Runs one end-of-day journal pass over all users and exits.
+
+For deployments that set MIMIR_JOURNAL_SCHEDULER=off and trigger journal
+generation from an external job instead of inside the web workers:
+
+    python -m backend.scripts.run_journals
+"""
+import asyncio
+
+from backend.core.scheduler import JournalScheduler
+
+
+def main():
+    generated = asyncio.run(JournalScheduler().run_once())
+    print(f"Generated {generated} journal entries")
+
+
+if __name__ == "__main__":
+    main()
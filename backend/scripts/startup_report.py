@@ -0,0 +1,145 @@
+"""
+Startup-time report for the backend.
+
+Imports `backend.main` in a fresh interpreter under `python -X importtime` and prints
+a breakdown of where import time goes, grouped by top-level package. It also checks
+that the heavy client libraries stay out of the import path (they should only load on
+first use), so it can be run as a repeatable cold-start check:
+
+    python -m backend.scripts.startup_report
+    python -m backend.scripts.startup_report --budget-ms 1500 --json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Modules that must only be imported lazily, on first use
+HEAVY_MODULES = [
+    "langchain_google_genai",
+    "langchain_chroma",
+    "chromadb",
+    "google.cloud.texttospeech",
+    "googleapiclient",
+    "PyPDF2",
+    "docx",
+    "openpyxl",
+    "PIL",
+    "bs4",
+]
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_importtime(target: str) -> tuple:
+    """Imports `target` in a subprocess and returns (wall_ms, raw importtime lines)."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = PROJECT_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        tail = "\n".join(proc.stderr.strip().splitlines()[-15:])
+        raise RuntimeError(f"Importing {target} failed:\n{tail}")
+    lines = [l for l in proc.stderr.splitlines() if l.startswith("import time:")]
+    return wall_ms, lines
+
+
+def parse_importtime(lines: list) -> list:
+    """Parses `import time: self | cumulative | name` lines into dicts (times in ms)."""
+    entries = []
+    for line in lines:
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        self_us, cumulative_us, name = parts
+        if not self_us.strip().isdigit():
+            continue  # Header line
+        entries.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    return entries
+
+
+def build_report(target: str = "backend.main", top: int = 15) -> dict:
+    wall_ms, lines = run_importtime(target)
+    entries = parse_importtime(lines)
+
+    by_package = {}
+    for entry in entries:
+        package = entry["module"].split(".")[0]
+        by_package[package] = by_package.get(package, 0.0) + entry["self_ms"]
+
+    imported = {entry["module"] for entry in entries}
+    heavy_loaded = [
+        m for m in HEAVY_MODULES
+        if any(name == m or name.startswith(m + ".") for name in imported)
+    ]
+
+    return {
+        "target": target,
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(sum(e["self_ms"] for e in entries), 1),
+        "modules": len(entries),
+        "packages": [
+            {"package": p, "self_ms": round(ms, 1)}
+            for p, ms in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:top]
+        ],
+        "slowest": [
+            {"module": e["module"], "cumulative_ms": round(e["cumulative_ms"], 1)}
+            for e in sorted(entries, key=lambda e: e["cumulative_ms"], reverse=True)[:top]
+        ],
+        "heavy_modules_loaded": heavy_loaded,
+    }
+
+
+def print_report(report: dict):
+    print(f"Startup report for {report['target']}")
+    print(f"  Interpreter wall time: {report['wall_ms']:.1f} ms")
+    print(f"  Import time:           {report['import_ms']:.1f} ms across {report['modules']} modules")
+    print("\nSelf time by top-level package:")
+    for row in report["packages"]:
+        print(f"  {row['self_ms']:>9.1f} ms  {row['package']}")
+    print("\nSlowest imports (cumulative):")
+    for row in report["slowest"]:
+        print(f"  {row['cumulative_ms']:>9.1f} ms  {row['module']}")
+    if report["heavy_modules_loaded"]:
+        print(f"\n[WARN] Heavy modules imported at startup: {', '.join(report['heavy_modules_loaded'])}")
+    else:
+        print("\nNo heavy client libraries imported at startup.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report backend import/startup time.")
+    parser.add_argument("--target", default="backend.main", help="Module to import")
+    parser.add_argument("--top", type=int, default=15, help="Rows per section")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if import time exceeds this")
+    parser.add_argument("--json", action="store_true", help="Emit the report as JSON")
+    args = parser.parse_args()
+
+    report = build_report(args.target, args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    failed = bool(report["heavy_modules_loaded"])
+    if args.budget_ms is not None and report["import_ms"] > args.budget_ms:
+        print(f"[FAIL] Import time {report['import_ms']:.1f} ms exceeds budget of {args.budget_ms:.1f} ms", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()